@@ -0,0 +1,139 @@
+"""Пакетный расчет метрик и рекомендаций для нескольких портфелей в одном процессе.
+
+Портфели читаются из JSON или CSV файла. Рыночные данные загружаются один раз для объединения тикеров всех портфелей,
+после чего каждый портфель рассчитывается на общем снимке данных:
+
+    python -m portfolio_optimizer.batch portfolios.json [--output results.json] [--workers 8]
+
+JSON файл содержит список портфелей:
+
+    [{"NAME": "IIS", "DATE": "2018-03-19", "CASH": 1000.21, "POSITIONS": {"GAZP": 682, "VSMO": 145}}, ...]
+
+CSV файл содержит по строке на позицию со столбцами NAME, DATE, CASH, TICKER и LOTS - дата и денежные средства
+повторяются в каждой строке портфеля.
+
+Результаты записываются в JSON - по словарю на портфель с ключевыми метриками, рекомендуемой сделкой или сообщением
+об ошибке, если портфель не удалось рассчитать.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from portfolio_optimizer.optimizer import Optimizer
+from portfolio_optimizer.portfolio import Portfolio
+from portfolio_optimizer.prefetch import prefetch, MAX_WORKERS
+from portfolio_optimizer.settings import CASH, DATE, LOTS, PORTFOLIO, TICKER, VALUE, WEIGHT
+
+# Ключи описания портфеля во входном файле и результатов расчета
+NAME = 'NAME'
+POSITIONS = 'POSITIONS'
+DECAY = 'DECAY'
+T_GROWTH = 'T_GROWTH'
+TRADE = 'TRADE'
+METRICS = 'METRICS'
+ERROR = 'ERROR'
+
+
+def read_portfolios(path):
+    """Читает описания портфелей из JSON или CSV файла.
+
+    Parameters
+    ----------
+    path
+        Путь к файлу - формат определяется по расширению.
+
+    Returns
+    -------
+    list of dict
+        Описания портфелей с ключами NAME, DATE, CASH и POSITIONS.
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        df = pd.read_csv(path, dtype={NAME: str, TICKER: str})
+        portfolios = []
+        for name, rows in df.groupby(NAME, sort=False):
+            portfolios.append({NAME: name,
+                               DATE: rows[DATE].iloc[0],
+                               CASH: float(rows[CASH].iloc[0]),
+                               POSITIONS: dict(zip(rows[TICKER], rows[LOTS].astype(int)))})
+        return portfolios
+    with path.open(encoding='utf-8') as file:
+        return json.load(file)
+
+
+def evaluate(portfolio: Portfolio, decay: float = None):
+    """Рассчитывает ключевые метрики и рекомендуемую сделку для портфеля.
+
+    Если константа сглаживания не передана, то она подбирается методом максимального правдоподобия.
+    """
+    optimizer = Optimizer(portfolio, decay)
+    metrics = pd.concat([portfolio.value,
+                         portfolio.weight,
+                         optimizer.dividends.gradient,
+                         optimizer.returns.gradient,
+                         optimizer.dominated], axis=1)
+    metrics.columns = [VALUE, WEIGHT, 'D_GRADIENT', 'R_GRADIENT', 'DOMINATED']
+    return {DECAY: optimizer.returns.decay,
+            T_GROWTH: optimizer.t_growth,
+            TRADE: optimizer.trade,
+            METRICS: json.loads(metrics.to_json(orient='index'))}
+
+
+def run(portfolios: list, max_workers: int = MAX_WORKERS):
+    """
+    Рассчитывает все портфели на общем снимке рыночных данных.
+
+    Ошибки расчета отдельных портфелей не прерывают расчет остальных, а попадают в результаты.
+
+    Parameters
+    ----------
+    portfolios
+        Описания портфелей с ключами NAME, DATE, CASH и POSITIONS.
+    max_workers
+        Количество параллельных загрузок данных.
+
+    Returns
+    -------
+    list of dict
+        Результаты расчета в порядке следования портфелей.
+    """
+    tickers = sorted(set().union(*[description[POSITIONS] for description in portfolios]))
+    data = prefetch(tickers, max_workers)
+    results = []
+    for description in portfolios:
+        result = {NAME: description[NAME], DATE: str(pd.to_datetime(description[DATE]).date())}
+        try:
+            portfolio = Portfolio(date=description[DATE],
+                                  cash=description[CASH],
+                                  positions=description[POSITIONS],
+                                  data=data)
+            result[VALUE] = portfolio.value[PORTFOLIO]
+            result.update(evaluate(portfolio))
+        except Exception as error:
+            # Любая ошибка отдельного портфеля не должна прерывать расчет остальных
+            result[ERROR] = f'{type(error).__name__}: {error}'
+        results.append(result)
+    return results
+
+
+def main(args=None):
+    """Запускает пакетный расчет из командной строки."""
+    parser = argparse.ArgumentParser(description='Пакетный расчет метрик и рекомендаций для нескольких портфелей.')
+    parser.add_argument('portfolios', help='JSON или CSV файл с описанием портфелей')
+    parser.add_argument('--output', help='JSON файл для результатов - по умолчанию стандартный вывод')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='количество параллельных загрузок')
+    args = parser.parse_args(args)
+    results = run(read_portfolios(args.portfolios), args.workers)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    else:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
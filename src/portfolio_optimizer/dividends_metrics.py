@@ -2,7 +2,7 @@
 
 import pandas as pd
 
-from portfolio_optimizer import getter
+from portfolio_optimizer import lazy
 from portfolio_optimizer.portfolio import Portfolio
 from portfolio_optimizer.settings import PORTFOLIO, AFTER_TAX, T_SCORE, CASH
 
@@ -12,11 +12,17 @@ class DividendsMetrics:
 
     За основу берутся legacy dividends, которые переводятся в
     реальные посленалоговые величины и используются для расчета разнообразных метрик
+
+    Метрики читают текущее состояние портфеля при каждом обращении. Дивиденды отдельных позиций и инфляция
+    загружаются один раз и кэшируются до изменения данных портфеля, поэтому после изменения портфеля пересчитываются
+    только показатели, зависящие от количества акций, цен и весов
     """
 
     def __init__(self, portfolio: Portfolio):
         self._portfolio = portfolio
-        self._index = portfolio.index
+        self._data_version = None
+        self._ticker_dividends = dict()
+        self._cum_cpi = None
 
     def __str__(self):
         expected_dividends = self.mean[PORTFOLIO] * self._portfolio.value[PORTFOLIO]
@@ -34,19 +40,48 @@ class DividendsMetrics:
                 f'Минимальные дивиденды дивиденды - {minimal_dividends:.0f}\n\n'
                 f'{df}')
 
+    def input_version(self, name: str):
+        """Версия входа графа метрик - версии данных портфеля"""
+        return self._portfolio.version(name)
+
     @property
+    def _index(self):
+        """Тикеры, кэш и портфель"""
+        return self._portfolio.index
+
+    def _check_data_version(self):
+        """Сбрасывает кэши дивидендов и инфляции при изменении данных портфеля"""
+        version = self._portfolio.version(lazy.DATA)
+        if self._data_version != version:
+            self._data_version = version
+            self._ticker_dividends = dict()
+            self._cum_cpi = None
+
+    def _cached_dividends(self, tickers):
+        """Дивиденды отдельных позиций - загружаются только для тикеров, отсутствующих в кэше"""
+        self._check_data_version()
+        missing = [ticker for ticker in tickers if ticker not in self._ticker_dividends]
+        if missing:
+            df = self._portfolio.data.legacy_dividends(missing)
+            for ticker in missing:
+                self._ticker_dividends[ticker] = df[ticker]
+        df = pd.concat([self._ticker_dividends[ticker] for ticker in tickers], axis=1)
+        df.columns = tickers
+        return df
+
+    @lazy.node(lazy.POSITIONS, lazy.DATA)
     def nominal_pretax(self):
         """Дивиденды в номинальном выражении"""
         index = self._index
         tickers = index[:-2]
-        df = getter.legacy_dividends(tickers).transpose()
+        df = self._cached_dividends(tickers).transpose()
         df.reindex(index=index)
         df.loc[CASH] = 0
         amount = self._portfolio.amount
         df.loc[PORTFOLIO] = df.multiply(amount, axis='index').sum(axis=0)
         return df
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATA)
     def real_after_tax(self):
         """Дивиденды после уплаты налогов в реальном выражении (в ценах последнего года)
 
@@ -55,25 +90,28 @@ class DividendsMetrics:
         """
         nominal_pretax_dividends = self.nominal_pretax
         columns = nominal_pretax_dividends.columns
-        cum_cpi = getter.cpi().cumprod()
+        self._check_data_version()
+        if self._cum_cpi is None:
+            self._cum_cpi = self._portfolio.data.cpi().cumprod()
+        cum_cpi = self._cum_cpi
         years = [pd.to_datetime(f'{year}-12-31') for year in columns]
         last_year_cpi_values = (cum_cpi[years[-1]] / cum_cpi[years]).values
         real_pretax_dividends = nominal_pretax_dividends.multiply(last_year_cpi_values, axis='columns')
         return real_pretax_dividends * AFTER_TAX
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def yields(self):
         """Дивидендная доходность"""
         dividends = self.real_after_tax
         inverse_prices = 1 / self._portfolio.price
         return dividends.multiply(inverse_prices, axis='index')
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def mean(self):
         """Матожидание дивидендной доходности"""
         return self.yields.mean(axis='columns', skipna=False)
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def std(self):
         """СКО дивидендной доходности
 
@@ -87,7 +125,7 @@ class DividendsMetrics:
         std[PORTFOLIO] = (weighted_std ** 2).sum(axis='index') ** 0.5
         return std
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def beta(self):
         """Беты дивидендных доходностей
 
@@ -100,7 +138,7 @@ class DividendsMetrics:
         var = self.std ** 2
         return (self._portfolio.weight * var) / (var[PORTFOLIO])
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def lower_bound(self):
         """Рассчитывает нижнюю границу доверительного интервала для дивидендной доходности
 
@@ -110,7 +148,7 @@ class DividendsMetrics:
         """
         return self.mean - T_SCORE * self.std
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def gradient(self):
         """Рассчитывает производную нижней границы по доле актива в портфеле
 
@@ -9,9 +9,8 @@ import urllib.error
 import urllib.request
 
 import pandas as pd
-from bs4 import BeautifulSoup
 
-from portfolio_optimizer.settings import DATE, DIVIDENDS
+from portfolio_optimizer.settings import DATE, DIVIDENDS, REQUEST_TIMEOUT
 
 # Номер таблицы с дивидендами в документе
 TABLE_INDEX = 2
@@ -31,7 +30,7 @@ def make_url(ticker: str):
 def get_html(url):
     """Получает html - *requests* fails on SSL, using *urllib.request."""
     try:
-        with urllib.request.urlopen(url) as response:
+        with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as response:
             return response.read().decode('utf-8')
     except urllib.error.HTTPError as error:
         if error.code == 404:
@@ -42,6 +41,8 @@ def get_html(url):
 
 def pick_table(url, html: str, n: int = TABLE_INDEX):
     """Выбирает таблицу с дивидендами на странице."""
+    # Импорт при первом запросе, чтобы не замедлять загрузку пакета
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, 'lxml')
     try:
         return soup.find_all('table')[n]
@@ -12,14 +12,15 @@
 import datetime
 
 import pandas as pd
-import requests
 
-from portfolio_optimizer.settings import DATE, CLOSE_PRICE, VOLUME
+from portfolio_optimizer.settings import DATE, CLOSE_PRICE, VOLUME, REQUEST_TIMEOUT
 
 
 def get_json(url: str):
     """Return json found at *url*."""
-    response = requests.get(url)
+    # Импорт при первом запросе, чтобы не замедлять загрузку пакета
+    import requests
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
     return response.json()
 
 
@@ -6,9 +6,8 @@
 """
 
 import pandas as pd
-import requests
 
-from portfolio_optimizer.settings import LAST_PRICE, LOT_SIZE, COMPANY_NAME, REG_NUMBER, TICKER
+from portfolio_optimizer.settings import LAST_PRICE, LOT_SIZE, COMPANY_NAME, REG_NUMBER, TICKER, REQUEST_TIMEOUT
 
 
 def make_url(tickers):
@@ -19,7 +18,9 @@ def make_url(tickers):
 
 def get_raw_json(tickers):
     url = make_url(tickers)
-    r = requests.get(url)
+    # Импорт при первом запросе, чтобы не замедлять загрузку пакета
+    import requests
+    r = requests.get(url, timeout=REQUEST_TIMEOUT)
     result = r.json()
     validate_response(result, tickers)
     return result
@@ -3,12 +3,14 @@
     get_reg_number_tickers(reg_number)
 """
 
-import requests
+from portfolio_optimizer.settings import REQUEST_TIMEOUT
 
 
 def get_json(reg_number):
     url = f'http://iss.moex.com/iss/securities.json?q={reg_number}'
-    respond = requests.get(url)
+    # Импорт при первом запросе, чтобы не замедлять загрузку пакета
+    import requests
+    respond = requests.get(url, timeout=REQUEST_TIMEOUT)
     json = respond.json()
     return json
 
@@ -0,0 +1,409 @@
+"""Векторизованное экспоненциальное сглаживание для набора констант сглаживания.
+
+Рекурсия экспоненциально сглаженных среднего и дисперсии повторяет pandas.DataFrame.ewm(alpha=1 - decay) с
+параметрами по умолчанию (adjust=True, bias=False), но выполняется за один проход по времени сразу для всего
+массива констант сглаживания. Результаты имеют форму (константы, время, ...), где остальные оси соответствуют осям
+исходных данных после оси времени:
+
+    mean, std = moments(returns, decays)
+    profile = neg_llh(returns, decays, start)
+
+Это позволяет подбирать константу сглаживания по сетке значений и строить профиль правдоподобия без многократного
+пересчета сглаживания средствами pandas.
+
+OnlineMoments хранит достаточные статистики сглаживания для одной константы и обновляется по мере поступления новых
+наблюдений.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Точность подбора констант сглаживания для рядов
+TOLERANCE = 1e-6
+# Доля интервала, остающаяся после шага метода золотого сечения
+GOLDEN_RATIO = (5 ** 0.5 - 1) / 2
+
+
+def moments(x: np.ndarray, decays):
+    """
+    Экспоненциально сглаженные среднее и СКО для каждой константы сглаживания.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков, первая ось которого соответствует времени.
+    decays
+        Константа или массив констант сглаживания из интервала (0, 1). Массив формы (константы, ...) задает
+        отдельные константы для рядов по остальным осям данных.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Среднее и СКО формы (константы, время, ...). Для первого периода СКО не определено и равно nan.
+    """
+    x = np.asarray(x, dtype=float)
+    decays = np.asarray(decays, dtype=float)
+    if decays.ndim < 2:
+        decays = np.atleast_1d(decays)
+        decays = decays.reshape(decays.shape + (1,) * (x.ndim - 1))
+    shape = (len(decays),) + x.shape
+    mean = np.empty(shape)
+    var = np.empty(shape)
+    mean_t = np.broadcast_to(x[0], shape[:1] + x.shape[1:]).copy()
+    var_t = np.zeros_like(mean_t)
+    # Сумма весов и сумма квадратов весов для поправки на смещение
+    sum_wt = np.ones_like(decays)
+    sum_wt2 = np.ones_like(decays)
+    mean[:, 0] = mean_t
+    var[:, 0] = np.nan
+    for t in range(1, len(x)):
+        old_wt = sum_wt * decays
+        sum_wt = old_wt + 1
+        sum_wt2 = sum_wt2 * decays ** 2 + 1
+        old_mean = mean_t
+        mean_t = (old_wt * old_mean + x[t]) / sum_wt
+        var_t = (old_wt * (var_t + (old_mean - mean_t) ** 2) + (x[t] - mean_t) ** 2) / sum_wt
+        mean[:, t] = mean_t
+        var[:, t] = var_t * sum_wt ** 2 / (sum_wt ** 2 - sum_wt2)
+    return mean, np.sqrt(var)
+
+
+def neg_llh(x: np.ndarray, decays, start):
+    """
+    -llh нормального распределения следующего значения при экспоненциально сглаженных среднем и СКО.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков, первая ось которого соответствует времени.
+    decays
+        Константа или массив констант сглаживания из интервала (0, 1) - аналогично moments.
+    start
+        Количество первых периодов, отбрасываемых для стабилизации сглаживания, - общее или массив для рядов по
+        остальным осям данных.
+
+    Returns
+    -------
+    numpy.ndarray
+        Значения -llh формы (константы, ...).
+    """
+    x = np.asarray(x, dtype=float)
+    start = np.asarray(start)
+    first = int(start.min())
+    mean, std = moments(x, decays)
+    mean = mean[:, first:-1]
+    std = std[:, first:-1]
+    kept = True
+    if start.ndim:
+        periods = np.arange(first, len(x) - 1).reshape((-1,) + (1,) * (x.ndim - 1))
+        kept = periods >= start
+        # Отброшенные периоды рядов могут иметь нулевое СКО, поэтому исключаются до расчета llh
+        std = np.where(kept, std, np.nan)
+    # Для последнего значения нет следующего, поэтому нет и llh
+    x_next = x[first + 1:]
+    llh = -0.5 * np.log(2 * np.pi) - np.log(std) - 0.5 * ((x_next - mean) / std) ** 2
+    return -np.where(kept, llh, 0).sum(axis=1)
+
+
+def fit_decays(x: np.ndarray, start, grid: np.ndarray, tolerance: float = TOLERANCE):
+    """
+    Константы сглаживания, минимизирующие -llh, отдельно для каждого ряда.
+
+    Сначала -llh всех рядов рассчитывается для сетки значений, а затем минимум каждого ряда уточняется методом
+    золотого сечения в интервале между соседними с лучшим узлами. Шаги метода выполняются одновременно для всех
+    рядов, поэтому на каждом шаге сглаживание рассчитывается одним проходом по времени.
+
+    Если лучшим является крайний узел сетки, то -llh убывает к границе сетки, и внутренний минимум не найден - такой
+    узел не является оптимумом, поэтому для ряда возвращается nan.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков формы (время, ряды).
+    start
+        Количество первых периодов, отбрасываемых для стабилизации сглаживания, - общее или массив для рядов.
+    grid
+        Возрастающая сетка констант сглаживания из интервала (0, 1).
+    tolerance
+        Точность определения констант сглаживания.
+
+    Returns
+    -------
+    numpy.ndarray
+        Константы сглаживания формы (ряды,). Для рядов с неопределенным -llh, например, с нулевой дисперсией, и
+        рядов, минимум которых на сетке достигается в крайнем узле, значения равны nan.
+    """
+    x = np.asarray(x, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    # -llh рядов с нулевой дисперсией не определен, а их константы заменяются nan в конце
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _fit_decays(x, start, grid, tolerance)
+
+
+def _fit_decays(x: np.ndarray, start, grid: np.ndarray, tolerance: float):
+    """Подбор констант сглаживания рядов по сетке и методом золотого сечения"""
+    profile = neg_llh(x, grid, start)
+    best = np.where(np.isnan(profile), np.inf, profile).argmin(axis=0)
+    found = ~np.isnan(profile).all(axis=0) & (best > 0) & (best < len(grid) - 1)
+    # Ряды без внутреннего минимума уточняются вместе с остальными, но их результаты заменяются nan
+    low = grid[np.maximum(best - 1, 0)]
+    high = grid[np.minimum(best + 1, len(grid) - 1)]
+
+    def llh(decays):
+        return neg_llh(x, decays[np.newaxis], start)[0]
+
+    left = high - GOLDEN_RATIO * (high - low)
+    right = low + GOLDEN_RATIO * (high - low)
+    llh_left = llh(left)
+    llh_right = llh(right)
+    while np.any(high - low > tolerance):
+        # Если минимум в левой части, то правая точка становится границей, а левая - новой правой точкой
+        to_left = llh_left < llh_right
+        high = np.where(to_left, right, high)
+        low = np.where(to_left, low, left)
+        left, right = (np.where(to_left, high - GOLDEN_RATIO * (high - low), right),
+                       np.where(to_left, left, low + GOLDEN_RATIO * (high - low)))
+        values = llh(np.where(to_left, left, right))
+        llh_left, llh_right = (np.where(to_left, values, llh_right),
+                               np.where(to_left, llh_left, values))
+    return np.where(found, (low + high) / 2, np.nan)
+
+
+def _moments_derivatives(x: np.ndarray, decays: np.ndarray):
+    """Среднее и дисперсия вместе с их первыми и вторыми производными по константе сглаживания.
+
+    Расчет выполняется одним проходом по времени, как и в moments. Для весов decay ** (t - i) и их первой и второй
+    производных по константе сглаживания рекурсивно обновляются суммы весов, а так же взвешенные суммы отклонений и их
+    квадратов от текущего среднего. После добавления наблюдения суммы переносятся к новому среднему, поэтому большие
+    близкие величины не вычитаются друг из друга.
+    """
+    decays = decays.reshape(decays.shape + (1,) * (x.ndim - 1))
+    shape = (len(decays),) + x.shape
+    result = {name: np.empty(shape) for name in ('mean', 'mean_1', 'mean_2', 'var', 'var_1', 'var_2')}
+    # Суммы весов и их производных, суммы квадратов весов и их производных
+    sum_wt = [np.ones_like(decays), np.zeros_like(decays), np.zeros_like(decays)]
+    sum_wt2 = [np.ones_like(decays), np.zeros_like(decays), np.zeros_like(decays)]
+    mean = np.broadcast_to(x[0], shape[:1] + x.shape[1:]).copy()
+    # Взвешенные весами и их производными суммы отклонений и квадратов отклонений от среднего
+    errors = [np.zeros_like(mean) for _ in range(3)]
+    squares = [np.zeros_like(mean) for _ in range(3)]
+    for t in range(len(x)):
+        if t:
+            # Веса прошлых наблюдений умножаются на decay, что меняет и их производные
+            sum_wt = [decays * sum_wt[0] + 1,
+                      sum_wt[0] + decays * sum_wt[1],
+                      2 * sum_wt[1] + decays * sum_wt[2]]
+            sum_wt2 = [decays ** 2 * sum_wt2[0] + 1,
+                       2 * decays * sum_wt2[0] + decays ** 2 * sum_wt2[1],
+                       2 * sum_wt2[0] + 4 * decays * sum_wt2[1] + decays ** 2 * sum_wt2[2]]
+            errors = [decays * errors[0] + x[t] - mean,
+                      errors[0] + decays * errors[1],
+                      2 * errors[1] + decays * errors[2]]
+            squares = [decays * squares[0] + (x[t] - mean) ** 2,
+                       squares[0] + decays * squares[1],
+                       2 * squares[1] + decays * squares[2]]
+            # Перенос сумм к новому среднему
+            shift = -errors[0] / sum_wt[0]
+            mean = mean - shift
+            squares = [square + 2 * shift * error + shift ** 2 * weight
+                       for square, error, weight in zip(squares, errors, sum_wt)]
+            errors = [error + shift * weight for error, weight in zip(errors, sum_wt)]
+        result['mean'][:, t] = mean
+        mean_1 = errors[1] / sum_wt[0]
+        result['mean_1'][:, t] = mean_1
+        result['mean_2'][:, t] = (errors[2] - 2 * mean_1 * sum_wt[1]) / sum_wt[0]
+        # Смещенная дисперсия - взвешенная сумма квадратов отклонений, производная которой по среднему равна нулю
+        var = squares[0] / sum_wt[0]
+        var_1 = (squares[1] - var * sum_wt[1]) / sum_wt[0]
+        var_2 = (squares[2] - 2 * mean_1 * errors[1] - 2 * var_1 * sum_wt[1] - var * sum_wt[2]) / sum_wt[0]
+        # Поправка на смещение sum_wt ** 2 / (sum_wt ** 2 - sum_wt2)
+        square = sum_wt[0] ** 2
+        square_1 = 2 * sum_wt[0] * sum_wt[1]
+        square_2 = 2 * sum_wt[1] ** 2 + 2 * sum_wt[0] * sum_wt[2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Для первого периода поправка и дисперсия не определены
+            inverse = 1 / (square - sum_wt2[0])
+            denominator_1 = square_1 - sum_wt2[1]
+            denominator_2 = square_2 - sum_wt2[2]
+            inverse_1 = -denominator_1 * inverse ** 2
+            inverse_2 = (2 * denominator_1 ** 2 * inverse - denominator_2) * inverse ** 2
+            bias = square * inverse
+            bias_1 = square_1 * inverse + square * inverse_1
+            bias_2 = square_2 * inverse + 2 * square_1 * inverse_1 + square * inverse_2
+            result['var'][:, t] = var * bias
+            result['var_1'][:, t] = var_1 * bias + var * bias_1
+            result['var_2'][:, t] = var_2 * bias + 2 * var_1 * bias_1 + var * bias_2
+    return result
+
+
+def neg_llh_derivatives(x: np.ndarray, decays, start: int):
+    """
+    -llh вместе с первой и второй производными по константе сглаживания.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков, первая ось которого соответствует времени.
+    decays
+        Константа или массив констант сглаживания из интервала (0, 1).
+    start
+        Количество первых периодов, отбрасываемых для стабилизации сглаживания.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Значения -llh, его первой и второй производных формы (константы, ...).
+    """
+    x = np.asarray(x, dtype=float)
+    decays = np.atleast_1d(np.asarray(decays, dtype=float))
+    derivatives = {name: value[:, start:-1] for name, value in _moments_derivatives(x, decays).items()}
+    var, var_1, var_2 = derivatives['var'], derivatives['var_1'], derivatives['var_2']
+    # Для последнего значения нет следующего, поэтому нет и llh
+    error = x[start + 1:] - derivatives['mean']
+    error_1, error_2 = -derivatives['mean_1'], -derivatives['mean_2']
+    llh = -0.5 * np.log(2 * np.pi) - 0.5 * np.log(var) - 0.5 * error ** 2 / var
+    llh_1 = -0.5 * var_1 / var - error * error_1 / var + 0.5 * error ** 2 * var_1 / var ** 2
+    llh_2 = (-0.5 * var_2 / var + 0.5 * var_1 ** 2 / var ** 2
+             - (error_1 ** 2 + error * error_2) / var + 2 * error * error_1 * var_1 / var ** 2
+             + 0.5 * error ** 2 * var_2 / var ** 2 - error ** 2 * var_1 ** 2 / var ** 3)
+    return -llh.sum(axis=1), -llh_1.sum(axis=1), -llh_2.sum(axis=1)
+
+
+def _cov_recursion(x: np.ndarray, decay: float):
+    """Последовательные сглаженные средние и ковариационные матрицы с поправкой на смещение для всех дат."""
+    mean = x[0].copy()
+    cov = np.zeros(x.shape[1:] + x.shape[-1:])
+    sum_wt = 1.0
+    sum_wt2 = 1.0
+    yield mean, cov * np.nan
+    for t in range(1, len(x)):
+        old_wt = sum_wt * decay
+        sum_wt = old_wt + 1
+        sum_wt2 = sum_wt2 * decay ** 2 + 1
+        old_mean = mean
+        mean = (old_wt * old_mean + x[t]) / sum_wt
+        shift = old_mean - mean
+        error = x[t] - mean
+        cov = (old_wt * (cov + shift[..., :, None] * shift[..., None, :])
+               + error[..., :, None] * error[..., None, :]) / sum_wt
+        yield mean, cov * sum_wt ** 2 / (sum_wt ** 2 - sum_wt2)
+
+
+def last_moments(x: np.ndarray, decay: float):
+    """
+    Экспоненциально сглаженные средние и ковариационные матрицы рядов на последнюю дату.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков формы (время, ..., ряды) - промежуточные оси обрабатываются независимо.
+    decay
+        Константа сглаживания из интервала (0, 1).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Средние формы (..., ряды) и ковариационные матрицы с поправкой на смещение формы (..., ряды, ряды).
+    """
+    moments = None
+    for moments in _cov_recursion(np.asarray(x, dtype=float), decay):
+        pass
+    return moments
+
+
+def moments_history(x: np.ndarray, decay: float):
+    """
+    Экспоненциально сглаженные средние и ковариационные матрицы рядов для всех дат.
+
+    Parameters
+    ----------
+    x
+        Массив без пропусков формы (время, ..., ряды) - промежуточные оси обрабатываются независимо.
+    decay
+        Константа сглаживания из интервала (0, 1).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Средние формы (время, ..., ряды) и ковариационные матрицы с поправкой на смещение формы
+        (время, ..., ряды, ряды). Для первой даты ковариации не определены и равны nan.
+    """
+    means, covs = zip(*_cov_recursion(np.asarray(x, dtype=float), decay))
+    return np.stack(means), np.stack(covs)
+
+
+class OnlineMoments:
+    """Достаточные статистики экспоненциального сглаживания для набора рядов.
+
+    Хранит сглаженные средние, ковариации всех пар рядов, суммы весов и последнюю обработанную дату, поэтому новые
+    наблюдения добавляются за O(рядов ** 2) без пересчета всей истории. Рекурсия повторяет pandas.DataFrame.ewm с
+    параметрами по умолчанию. Объект может быть сохранен и загружен с помощью pickle.
+
+    Совпадение обработанной истории с новыми рядами проверяется за O(рядов) по названиям рядов, количеству
+    обработанных наблюдений до последней даты и значениям последнего наблюдения, поэтому изменения более ранних
+    значений без изменения количества наблюдений не обнаруживаются.
+    """
+
+    def __init__(self, decay: float, columns: list):
+        self.decay = decay
+        self.columns = list(columns)
+        self.last_date = None
+        self.last_row = None
+        self._count = 0
+        self._sum_wt = 0.0
+        self._sum_wt2 = 0.0
+        self._mean = np.zeros(len(self.columns))
+        self._cov = np.zeros((len(self.columns), len(self.columns)))
+
+    def update(self, x: np.ndarray):
+        """Добавляет наблюдение всех рядов."""
+        x = np.asarray(x, dtype=float)
+        if self._count == 0:
+            self._mean = x.copy()
+            self._sum_wt = 1.0
+            self._sum_wt2 = 1.0
+        else:
+            old_wt = self._sum_wt * self.decay
+            self._sum_wt = old_wt + 1
+            self._sum_wt2 = self._sum_wt2 * self.decay ** 2 + 1
+            old_mean = self._mean
+            self._mean = (old_wt * old_mean + x) / self._sum_wt
+            shift = old_mean - self._mean
+            error = x - self._mean
+            self._cov = (old_wt * (self._cov + np.outer(shift, shift)) + np.outer(error, error)) / self._sum_wt
+        self._count += 1
+
+    def matches(self, df: pd.DataFrame):
+        """Совпадает ли обработанная история с началом рядов df."""
+        if list(df.columns) != self.columns:
+            return False
+        if self.last_date is None:
+            return True
+        if self.last_date not in df.index:
+            return False
+        position = df.index.get_loc(self.last_date)
+        return position == self._count - 1 and np.allclose(df.iloc[position].values, self.last_row,
+                                                           rtol=0, atol=0, equal_nan=True)
+
+    def fold(self, df: pd.DataFrame):
+        """Добавляет наблюдения df после последней обработанной даты - начало истории должно совпадать."""
+        if not self.matches(df):
+            raise ValueError('История рядов не совпадает с обработанной ранее')
+        new = df if self.last_date is None else df.loc[df.index > self.last_date]
+        for x in new.values:
+            self.update(x)
+        if len(new):
+            self.last_date = df.index[-1]
+            self.last_row = np.asarray(df.iloc[-1].values, dtype=float)
+
+    @property
+    def mean(self):
+        """Сглаженные средние"""
+        return pd.Series(self._mean, index=self.columns)
+
+    @property
+    def cov(self):
+        """Сглаженная ковариационная матрица с поправкой на смещение"""
+        denominator = self._sum_wt ** 2 - self._sum_wt2
+        bias = self._sum_wt ** 2 / denominator if denominator > 0 else np.nan
+        return pd.DataFrame(self._cov * bias, index=self.columns, columns=self.columns)
@@ -8,3 +8,5 @@ from portfolio_optimizer.getter.local_quotes import get_prices_history as prices
 from portfolio_optimizer.getter.local_quotes import get_volumes_history as volumes_history
 from portfolio_optimizer.getter.local_securities_info import get_last_prices as last_prices
 from portfolio_optimizer.getter.local_securities_info import get_security_info as security_info
+from portfolio_optimizer.getter.trading_calendar import get_trading_calendar as trading_calendar
+from portfolio_optimizer.getter.versions import get_data_version as data_version
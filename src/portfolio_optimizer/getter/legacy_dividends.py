@@ -1,6 +1,7 @@
 """Load local data for legacy dividends history and returns pandas DataFrames.
 
     get_legacy_dividends(tickers)
+    get_legacy_tickers()
 """
 
 import pandas as pd
@@ -35,5 +36,11 @@ def get_legacy_dividends(tickers: list):
     return df.transpose()[tickers]
 
 
+def get_legacy_tickers():
+    """Возвращает отсортированный список тикеров, для которых есть данные о дивидендах в xlsx файле."""
+    df = pd.read_excel(DATA_PATH, sheet_name=LEGACY_SHEET_NAME, header=0, index_col=0)
+    return sorted(df.index)
+
+
 if __name__ == '__main__':
     print(get_legacy_dividends(['AKRN']))
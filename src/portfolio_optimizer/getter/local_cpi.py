@@ -7,19 +7,20 @@ import numpy as np
 import pandas as pd
 
 from portfolio_optimizer import download
+from portfolio_optimizer.getter import offline, update_policy
 from portfolio_optimizer.getter.storage import LocalFile
 from portfolio_optimizer.settings import DATE, CPI
 
 CPI_FOLDER = 'macro'
 CPI_FILE = 'cpi.csv'
-UPDATE_PERIOD_IN_DAYS = 1
+CPI_NAME = f'{CPI_FOLDER}/cpi'
+# Росстат публикует CPI за месяц в первой половине следующего месяца - проверка начинается с 5 числа
+UPDATE_POLICY = update_policy.MonthlyRelease(release_day=5)
 
 
-def need_update(file: LocalFile):
-    """Обновление нужно, если прошло установленное число дней с момента обновления."""
-    if file.updated_days_ago() > UPDATE_PERIOD_IN_DAYS:
-        return True
-    return False
+def need_update(file: LocalFile, df):
+    """Обновление нужно, если наступила ожидаемая дата публикации данных за следующий месяц."""
+    return UPDATE_POLICY.need_update(file.updated(), df.index[-1])
 
 
 def validate(df_old, df_updated):
@@ -31,16 +32,16 @@ def validate(df_old, df_updated):
 def update_cpi(file: LocalFile):
     """Обновляет файл с данными, проверяя совпадение со старыми."""
     df = file.read()
-    if need_update(file):
-        df_updated = download.cpi()
-        validate(df, df_updated)
-        df = df_updated
-        file.save(df)
+    if need_update(file, df):
+        df_updated = offline.fetch(offline.GKS, CPI_NAME, df.index[-1], download.cpi)
+        if df_updated is not None:
+            validate(df, df_updated)
+            file.save(df_updated)
 
 
 def create_cpi(file: LocalFile):
     """Создает с нуля файл с данными."""
-    df = download.cpi()
+    df = offline.fetch(offline.GKS, CPI_NAME, None, download.cpi)
     file.save(df)
 
 
@@ -3,18 +3,20 @@
     get_dividends(tickers)
 """
 
-import time
-from os import path
+from os import path, utime
 
+import arrow
 import numpy as np
 import pandas as pd
 
 import portfolio_optimizer.getter.storage
 from portfolio_optimizer import download
+from portfolio_optimizer.getter import offline, update_policy
 from portfolio_optimizer.settings import DATE, DIVIDENDS
 
 DIVIDENDS_FOLDER = 'nominal_retax_dividends'
-UPDATE_PERIOD_IN_DAYS = 1
+# Дивиденды по отдельному тикеру меняются несколько раз в год
+UPDATE_POLICY = update_policy.MinInterval(days=7)
 
 
 class LocalDividends:
@@ -22,6 +24,8 @@ class LocalDividends:
     _data_folder = DIVIDENDS_FOLDER
     _load_converter = {DATE: pd.to_datetime, DIVIDENDS: pd.to_numeric}
     _data_columns = DIVIDENDS
+    _update_policy = UPDATE_POLICY
+    _source = offline.DOHOD
 
     def __init__(self, ticker: str):
         self.ticker = ticker
@@ -33,13 +37,14 @@ class LocalDividends:
 
     @property
     def local_data_path(self):
-        """Возвращает и при необходимости создает путь к файлу с котировками."""
+        """Возвращает путь к файлу с котировками."""
         return portfolio_optimizer.getter.storage.make_data_path(self._data_folder, f'{self.ticker}.csv')
 
     def _save_history(self):
         """Сохраняет локальную версию данных в csv-файл с именем тикера.
 
         Флаги заголовков необходимы для поддержки сохранения серий, а не только датафреймов."""
+        portfolio_optimizer.getter.storage.make_folder(self.local_data_path)
         self.df.to_csv(self.local_data_path, index=True, header=True)
 
     def load_local_history(self):
@@ -56,10 +61,14 @@ class LocalDividends:
         return self.df[self._data_columns]
 
     def need_update(self):
-        """Обновление требуется по прошествии фиксированного количества дней."""
-        if time.time() - path.getmtime(self.local_data_path) > UPDATE_PERIOD_IN_DAYS * 60 * 60 * 24:
-            return True
-        return False
+        """Необходимость обновления определяется политикой обновления для данного набора данных."""
+        updated = arrow.get(path.getmtime(self.local_data_path))
+        return self._update_policy.need_update(updated, self.df.index[-1])
+
+    def _fetch(self, loader, *args):
+        """Загружает данные с учетом режима работы с сетью - если сервер недоступен, то возвращает None."""
+        last_date = None if self.df is None else self.df.index[-1]
+        return offline.fetch(self._source, f'{self._data_folder}/{self.ticker}', last_date, loader, *args)
 
     def _validate_new_data(self, df_new):
         """Проверяем, что старые данные совпадают с новыми."""
@@ -71,17 +80,21 @@ class LocalDividends:
         """Обновляет локальные данные данными из интернета и возвращает полную историю дивидендных выплат."""
         self.df = self.load_local_history()
         if self.need_update():
-            df_update = download.dividends(self.ticker)
-            self._validate_new_data(df_update)
-            new_rows = list(set(df_update.index) - set(self.df.index))
-            if new_rows:
-                df = pd.concat([self.df, df_update[new_rows]])
-                self.df = df.sort_index()
-                self._save_history()
+            df_update = self._fetch(download.dividends, self.ticker)
+            if df_update is not None:
+                self._validate_new_data(df_update)
+                new_rows = list(set(df_update.index) - set(self.df.index))
+                if new_rows:
+                    df = pd.concat([self.df, df_update[new_rows]])
+                    self.df = df.sort_index()
+                    self._save_history()
+                else:
+                    # Время изменения файла отмечает проверку для политики обновления, даже если новых данных нет
+                    utime(str(self.local_data_path))
 
     def create_local_history(self):
         """Формирует, сохраняет и возвращает локальную версию истории дивидендных выплат."""
-        self.df = download.dividends(self.ticker)
+        self.df = self._fetch(download.dividends, self.ticker)
         self._save_history()
 
 
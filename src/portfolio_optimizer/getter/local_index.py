@@ -35,14 +35,15 @@ class LocalIndex(LocalQuotes):
         """Обновляет локальные данные данными из интернета и возвращает полную историю котировок индекса."""
         self.df = self.load_local_history()
         if self.need_update():
-            df_update = download.index_history(self.df_last_date)
-            self._validate_new_data(df_update)
-            self.df = pd.concat([self.df, df_update.iloc[1:]])
-            self._save_history()
+            df_update = self._fetch(download.index_history, self.df_last_date)
+            if df_update is not None:
+                self._validate_new_data(df_update)
+                self.df = pd.concat([self.df, df_update.iloc[1:]])
+                self._save_history()
 
     def create_local_history(self):
         """Формирует, сохраняет и возвращает локальную версию историю котировок индекса."""
-        self.df = download.index_history()
+        self.df = self._fetch(download.index_history)
         self._save_history()
 
 
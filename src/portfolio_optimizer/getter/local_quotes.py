@@ -14,31 +14,21 @@
         get_index_history()
 """
 
-from os import path
-
-import arrow
 import numpy as np
 import pandas as pd
 
 from portfolio_optimizer import download
-from portfolio_optimizer.getter import local_securities_info
+from portfolio_optimizer.getter import local_securities_info, offline, update_policy
 from portfolio_optimizer.getter.local_dividends import LocalDividends
+from portfolio_optimizer.getter.trading_calendar import get_trading_calendar
 from portfolio_optimizer.settings import DATE, CLOSE_PRICE, VOLUME
 
-MARKET_TIME_ZONE = 'Europe/Moscow'
-# Реально торги заканчиваются в 19.00, но данные транслируются с задержкой в 15 минут
-END_OF_CURRENT_TRADING_DAY = arrow.get().to(MARKET_TIME_ZONE).replace(hour=19,
-                                                                      minute=15,
-                                                                      second=0,
-                                                                      microsecond=0)
 QUOTES_FOLDER = 'quotes'
 
 
 def end_of_last_trading_day():
-    """Возвращает дату последнего завершившегося торгового дня."""
-    if arrow.get().to(MARKET_TIME_ZONE) > END_OF_CURRENT_TRADING_DAY:
-        return END_OF_CURRENT_TRADING_DAY
-    return END_OF_CURRENT_TRADING_DAY.shift(days=-1)
+    """Возвращает время окончания последнего завершившегося торгового дня с учетом выходных и праздников."""
+    return get_trading_calendar().end_of_last_trading_day()
 
 
 class LocalQuotes(LocalDividends):
@@ -46,14 +36,9 @@ class LocalQuotes(LocalDividends):
     _data_folder = QUOTES_FOLDER
     _load_converter = {DATE: pd.to_datetime, CLOSE_PRICE: pd.to_numeric, VOLUME: pd.to_numeric}
     _data_columns = [CLOSE_PRICE, VOLUME]
-
-    def need_update(self):
-        """Проверяет по дате изменения файла и времени окончания торгов, нужно ли обновлять локальные данные."""
-        file_date = arrow.get(path.getmtime(self.local_data_path)).to(MARKET_TIME_ZONE)
-        # Если файл обновлялся после завершения последнего торгового дня, то он не должен обновляться
-        if file_date > end_of_last_trading_day():
-            return False
-        return True
+    # Если файл обновлялся после завершения последнего торгового дня, то он не должен обновляться
+    _update_policy = update_policy.AfterEvent(end_of_last_trading_day)
+    _source = offline.MOEX
 
     @property
     def df_last_date(self):
@@ -74,10 +59,11 @@ class LocalQuotes(LocalDividends):
         """Обновляет локальные данные данными из интернета и возвращает полную историю котировок и объемов."""
         self.df = self.load_local_history()
         if self.need_update():
-            df_update = download.quotes_history(self.ticker, self.df_last_date)
-            self._validate_new_data(df_update)
-            self.df = pd.concat([self.df, df_update.iloc[1:]])
-            self._save_history()
+            df_update = self._fetch(download.quotes_history, self.ticker, self.df_last_date)
+            if df_update is not None:
+                self._validate_new_data(df_update)
+                self.df = pd.concat([self.df, df_update.iloc[1:]])
+                self._save_history()
 
     def _yield_aliases_quotes_history(self):
         """Генерирует истории котировок для все тикеров аналогов заданного тикера."""
@@ -86,10 +72,13 @@ class LocalQuotes(LocalDividends):
         for ticker in aliases:
             yield download.quotes_history(ticker)
 
+    def _download_aliases_quotes_history(self):
+        """Загружает и склеивает истории котировок для всех тикеров аналогов."""
+        return pd.concat(self._yield_aliases_quotes_history())
+
     def create_local_history(self):
         """Формирует, сохраняет локальную версию и возвращает склеенную из всех тикеров аналогов историю котировок."""
-        aliases = self._yield_aliases_quotes_history()
-        df = pd.concat(aliases)
+        df = self._fetch(self._download_aliases_quotes_history)
         # Для каждой даты выбирается тикер с максимальным оборотом
         df = df.loc[df.groupby(DATE)[VOLUME].idxmax()]
         self.df = df.sort_index()
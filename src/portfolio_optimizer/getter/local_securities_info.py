@@ -13,13 +13,22 @@
         get_aliases_tickers(tickers)
 """
 
+import threading
+from os import path
+
+import arrow
 import pandas as pd
 
 from portfolio_optimizer import download
-from portfolio_optimizer.getter import storage
+from portfolio_optimizer.getter import offline, storage, update_policy
 from portfolio_optimizer.settings import LAST_PRICE, LOT_SIZE, COMPANY_NAME, REG_NUMBER, TICKER, TICKER_ALIASES
 
 DATA_PATH = storage.make_data_path('securities_info', 'securities_info.csv')
+SECURITIES_INFO_NAME = 'securities_info'
+# Все тикеры хранятся в одном файле - блокировка исключает одновременную запись из разных потоков
+LOCK = threading.RLock()
+# Размеры лотов и регистрационные номера меняются редко, а свежие последние цены загружаются get_last_prices
+UPDATE_POLICY = update_policy.MinInterval(days=1)
 
 
 def load_securities_info():
@@ -38,6 +47,7 @@ def download_securities_info(tickers):
 
 def save_security_info(df: pd.DataFrame):
     """Сохраняет фрейм с данными в директорию с данными."""
+    storage.make_folder(DATA_PATH)
     df.sort_index().to_csv(DATA_PATH)
 
 
@@ -63,6 +73,13 @@ def fill_aliases_column(df):
             df.loc[ticker, TICKER_ALIASES] = tickers
 
 
+def need_update(df, tickers):
+    """Обновление нужно, если каких-то тикеров нет в локальных данных или этого требует политика обновления."""
+    if not set(df.index).issuperset(tickers):
+        return True
+    return UPDATE_POLICY.need_update(arrow.get(path.getmtime(DATA_PATH)))
+
+
 def update_local_securities_info(tickers):
     """Обновляет существующую локальную версию данных и проверяет соответствие новых данных старым."""
     df = load_securities_info()
@@ -75,14 +92,33 @@ def update_local_securities_info(tickers):
     return df.loc[tickers]
 
 
-def create_local_security_info(tickers):
-    """Создает с нуля локальную версию данных, загружая их из интернета."""
+def download_local_security_info(tickers):
+    """Загружает из интернета данные по тикерам и сохраняет их в качестве локальной версии."""
     df = download_securities_info(tickers)
     fill_aliases_column(df)
     save_security_info(df)
     return df
 
 
+def create_local_security_info(tickers):
+    """Создает с нуля локальную версию данных, загружая их из интернета."""
+    return offline.fetch(offline.MOEX, SECURITIES_INFO_NAME, None, download_local_security_info, tickers)
+
+
+def fetch_local_securities_info(df, tickers):
+    """Обновляет локальную версию данных с учетом режима работы с сетью.
+
+    Если сервер недоступен, а все тикеры есть в локальной версии данных, то используется локальная версия.
+    """
+    last_date = None
+    if set(df.index).issuperset(tickers):
+        last_date = arrow.get(path.getmtime(DATA_PATH)).date()
+    df_update = offline.fetch(offline.MOEX, SECURITIES_INFO_NAME, last_date, update_local_securities_info, tickers)
+    if df_update is None:
+        return df.loc[tickers]
+    return df_update
+
+
 def get_security_info(tickers: list):
     """
     Возвращает данные по тикерам из списка и при необходимости обновляет локальные данные
@@ -99,11 +135,15 @@ def get_security_info(tickers: list):
         В столбцах данные по размеру лота, регистрационному номеру, краткому наименованию, последней цене и тикерам,
         которые соответствуют такому же регистрационному номеру (обычно устаревшие ранее использовавшиеся тикеры).
     """
-    # Общий запрос содержит последние цены, которые регулярно обновляются, поэтому требует обновления
-    if DATA_PATH.exists():
-        df = update_local_securities_info(tickers)
-    else:
-        df = create_local_security_info(tickers)
+    with LOCK:
+        if DATA_PATH.exists():
+            df = load_securities_info()
+            if need_update(df, tickers):
+                df = fetch_local_securities_info(df, tickers)
+            else:
+                df = df.loc[tickers]
+        else:
+            df = create_local_security_info(tickers)
     return df
 
 
@@ -121,13 +161,14 @@ def get_aliases_tickers(tickers: list):
     pd.Series
         В строках тикеры и тикеры аналоги для них.
     """
-    if DATA_PATH.exists():
-        df = load_securities_info()
-        # Если тикеры в локальной версии, то обновлять данные нет необходимости
-        if not set(df.index).issuperset(tickers):
-            df = update_local_securities_info(tickers)
-    else:
-        df = create_local_security_info(tickers)
+    with LOCK:
+        if DATA_PATH.exists():
+            df = load_securities_info()
+            # Если тикеры в локальной версии, то обновлять данные нет необходимости
+            if not set(df.index).issuperset(tickers):
+                df = fetch_local_securities_info(df, tickers)
+        else:
+            df = create_local_security_info(tickers)
     return df.loc[tickers, TICKER_ALIASES]
 
 
@@ -145,8 +186,12 @@ def get_last_prices(tickers: list):
     pandas.Series
         В строках тикеры и последние цены для них.
     """
-    # Цены обновляются постоянно - поэтому можно вызывать функцию, требующую обновления данных
-    df = get_security_info(tickers)
+    # Цены обновляются постоянно - поэтому локальные данные обновляются независимо от политики обновления
+    with LOCK:
+        if DATA_PATH.exists():
+            df = fetch_local_securities_info(load_securities_info(), tickers)
+        else:
+            df = create_local_security_info(tickers)
     return df.loc[tickers, LAST_PRICE]
 
 
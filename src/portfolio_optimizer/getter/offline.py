@@ -0,0 +1,127 @@
+"""Режимы работы с сетью и автономная работа на локальных данных.
+
+Режим задается для всего процесса:
+
+    ONLINE - локальные данные обновляются в соответствии с политиками обновления, ошибки сети возбуждают исключения;
+    OFFLINE - сеть не используется, все данные загружаются из локальной версии;
+    AUTO - после MAX_FAILURES неудачных обращений подряд сервер считается недоступным до конца работы процесса, а при
+    ошибках сети используются локальные данные.
+
+    set_mode(mode)
+    fetch(source, name, last_date, loader, *args)
+    stale_data()
+"""
+
+import threading
+import warnings
+from collections import Counter
+
+import arrow
+import pandas as pd
+
+from portfolio_optimizer.settings import LAST_DATE, STALE_DAYS
+
+ONLINE = 'ONLINE'
+OFFLINE = 'OFFLINE'
+AUTO = 'AUTO'
+
+# Источники данных
+MOEX = 'iss.moex.com'
+DOHOD = 'www.dohod.ru'
+GKS = 'www.gks.ru'
+
+# Количество неудачных обращений подряд, после которого в режиме AUTO сервер считается недоступным
+MAX_FAILURES = 2
+
+_STATE = dict(mode=ONLINE)
+_FAILURES = Counter()
+_STALE = {}
+# Загрузчики вызываются из нескольких потоков, поэтому статистика изменяется под блокировкой
+_LOCK = threading.Lock()
+
+
+def set_mode(mode: str):
+    """Устанавливает режим работы с сетью для всего процесса и сбрасывает накопленную статистику."""
+    if mode not in (ONLINE, OFFLINE, AUTO):
+        raise ValueError(f'Неизвестный режим работы с сетью {mode}')
+    with _LOCK:
+        _STATE['mode'] = mode
+        _FAILURES.clear()
+        _STALE.clear()
+
+
+def get_mode():
+    """Текущий режим работы с сетью."""
+    return _STATE['mode']
+
+
+def is_offline(source: str):
+    """Проверяет, нужно ли отказаться от обращения к источнику данных."""
+    with _LOCK:
+        mode = _STATE['mode']
+        return mode == OFFLINE or (mode == AUTO and _FAILURES[source] >= MAX_FAILURES)
+
+
+def register_stale(name: str, last_date):
+    """Регистрирует ряд, который нуждался в обновлении, но был загружен из локальных данных."""
+    last_date = pd.Timestamp(last_date).normalize()
+    with _LOCK:
+        _STALE[name] = last_date
+
+
+def stale_data():
+    """
+    Возвращает перечень рядов, которые нуждались в обновлении, но были загружены из локальных данных.
+
+    Returns
+    -------
+    pandas.DataFrame
+        В строках наименования рядов.
+        В столбцах последняя дата в локальных данных и количество дней с этой даты.
+    """
+    df = pd.DataFrame(columns=[LAST_DATE, STALE_DAYS])
+    today = pd.Timestamp(arrow.get().date())
+    with _LOCK:
+        stale = sorted(_STALE.items())
+    for name, last_date in stale:
+        df.loc[name] = [last_date, (today - last_date).days]
+    return df
+
+
+def fetch(source: str, name: str, last_date, loader, *args):
+    """
+    Загружает данные с помощью функции loader с учетом режима работы с сетью.
+
+    Parameters
+    ----------
+    source
+        Сервер, с которого загружаются данные.
+    name
+        Наименование ряда для отчета об устаревших данных.
+    last_date
+        Последняя дата в локальных данных или None, если их нет.
+    loader
+        Функция загрузки данных, которая вызывается с аргументами args.
+
+    Returns
+    -------
+    Результат loader или None, если сервер недоступен и нужно использовать локальные данные. Если локальных данных нет,
+    то при недоступности сервера возбуждается ConnectionError.
+    """
+    if not is_offline(source):
+        try:
+            data = loader(*args)
+        except OSError as error:
+            with _LOCK:
+                _FAILURES[source] += 1
+            if _STATE['mode'] == ONLINE or last_date is None:
+                raise
+            warnings.warn(f'\n\nОшибка загрузки {name} с {source} - будут использованы локальные данные.\n{error}\n')
+        else:
+            with _LOCK:
+                _FAILURES[source] = 0
+            return data
+    if last_date is None:
+        raise ConnectionError(f'Сервер {source} недоступен, а локальные данные {name} отсутствуют')
+    register_stale(name, last_date)
+    return None
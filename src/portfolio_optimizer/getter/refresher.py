@@ -0,0 +1,139 @@
+"""Фоновое обновление локальных данных после окончания торгов.
+
+После завершения каждого торгового дня параллельно обновляются котировки, индекс, дивиденды, CPI и информация о
+бумагах для заданного набора тикеров. Обновление идет через обычные функции загрузки локальных данных с их политиками
+обновления, поэтому интерактивные расчеты после этого используют только локальные данные:
+
+    refresh(tickers)
+    run(tickers)
+
+Запуск из командной строки:
+
+    python -m portfolio_optimizer.getter.refresher [--once] [TICKER ...]
+
+Если тикеры не указаны, то обновляются все тикеры из локальной версии информации о бумагах.
+"""
+
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import arrow
+import pandas as pd
+
+from portfolio_optimizer.getter import local_cpi, local_dividends, local_index, local_quotes, local_securities_info
+
+# Количество параллельных загрузок
+MAX_WORKERS = 8
+# Период проверки окончания торгового дня
+CHECK_PERIOD_IN_SECONDS = 60
+# Период повторного обновления, если при предыдущем возникли ошибки
+RETRY_PERIOD_IN_SECONDS = 15 * 60
+# Столбцы отчета об обновлении
+STATUS = 'STATUS'
+SECONDS = 'SECONDS'
+MESSAGE = 'MESSAGE'
+OK = 'OK'
+ERROR = 'ERROR'
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _yield_stages(tickers):
+    """Формирует этапы обновления в виде списков задач (наименование, функция, аргументы).
+
+    Сначала обновляются индекс, по которому строится календарь торгов, и информация о бумагах, содержащая тикеры
+    аналоги, необходимые для создания истории котировок. Остальные данные обновляются после них.
+    """
+    yield [('index', local_index.get_index_history, ()),
+           ('securities_info', local_securities_info.get_last_prices, (tickers,))]
+    tasks = [('cpi', local_cpi.get_cpi, ())]
+    for ticker in tickers:
+        tasks.append((f'quotes/{ticker}', local_quotes.get_quotes_history, (ticker,)))
+        tasks.append((f'dividends/{ticker}', local_dividends.get_dividends, ([ticker],)))
+    yield tasks
+
+
+def _run_task(func, args):
+    """Выполняет задачу и возвращает время ее выполнения."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def refresh(tickers: list, max_workers: int = MAX_WORKERS):
+    """
+    Параллельно обновляет все локальные данные для набора тикеров.
+
+    Ошибки отдельных загрузок не прерывают обновление остальных данных, а попадают в отчет.
+
+    Parameters
+    ----------
+    tickers
+        Список тикеров.
+    max_workers
+        Количество параллельных загрузок.
+
+    Returns
+    -------
+    pandas.DataFrame
+        В строках наименования обновляемых рядов.
+        В столбцах статус обновления, время выполнения в секундах и сообщение об ошибке.
+    """
+    report = pd.DataFrame(columns=[STATUS, SECONDS, MESSAGE])
+    stages = list(_yield_stages(tickers))
+    total = sum(len(tasks) for tasks in stages)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for tasks in stages:
+            futures = {executor.submit(_run_task, func, args): name for name, func, args in tasks}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    report.loc[name] = [OK, future.result(), '']
+                except Exception as error:
+                    report.loc[name] = [ERROR, None, f'{type(error).__name__}: {error}']
+                    LOGGER.error('%s/%s %s - ошибка обновления: %s', len(report), total, name, error)
+                else:
+                    LOGGER.info('%s/%s %s - обновлено за %.1f с', len(report), total, name, report.loc[name, SECONDS])
+    return report
+
+
+def run(tickers: list, max_workers: int = MAX_WORKERS):
+    """Бесконечный цикл обновления данных после окончания каждого торгового дня.
+
+    Если при обновлении возникли ошибки, то оно повторяется через RETRY_PERIOD_IN_SECONDS.
+    """
+    refreshed = None
+    next_attempt = arrow.get()
+    while True:
+        end_of_day = local_quotes.end_of_last_trading_day()
+        if (refreshed is None or refreshed < end_of_day) and arrow.get() >= next_attempt:
+            LOGGER.info('Обновление данных после окончания торгов %s', end_of_day)
+            report = refresh(tickers, max_workers)
+            errors = report[report[STATUS] == ERROR]
+            if errors.empty:
+                refreshed = end_of_day
+            else:
+                next_attempt = arrow.get().shift(seconds=RETRY_PERIOD_IN_SECONDS)
+                LOGGER.warning('Ошибки обновления %s из %s рядов - повтор в %s', len(errors), len(report), next_attempt)
+        time.sleep(CHECK_PERIOD_IN_SECONDS)
+
+
+def main(args=None):
+    """Запускает обновление данных из командной строки."""
+    parser = argparse.ArgumentParser(description='Обновление локальных данных после окончания торгов.')
+    parser.add_argument('tickers', nargs='*', help='тикеры - по умолчанию все тикеры из локальных данных')
+    parser.add_argument('--once', action='store_true', help='однократное обновление без ожидания окончания торгов')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='количество параллельных загрузок')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    tickers = args.tickers or list(local_securities_info.load_securities_info().index)
+    if args.once:
+        print(refresh(tickers, args.workers))
+    else:
+        run(tickers, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,23 @@
 """Local file storage for pandas DataFrames."""
 
-import time
 from pathlib import Path
 
+import arrow
 import pandas as pd
 
 from portfolio_optimizer import settings
 
 
 def make_data_path(subfolder: str, file_name: str):
-    """Создает подкаталог *subfolder* в директории данных и
-       возвращает путь к файлу *file_name* в нем."""
-    folder = settings.DATA_PATH / subfolder
-    if not folder.exists():
-        folder.mkdir(parents=True)
-    return folder / file_name
+    """Возвращает путь к файлу *file_name* в подкаталоге *subfolder* директории данных.
+
+       Обращения к файловой системе нет - подкаталог создается только при сохранении данных функцией make_folder."""
+    return settings.DATA_PATH / subfolder / file_name
+
+
+def make_folder(path: Path):
+    """Создает при необходимости подкаталог для сохранения файла *path*."""
+    path.parent.mkdir(parents=True, exist_ok=True)
 
 
 class LocalFile:
@@ -43,17 +46,13 @@ class LocalFile:
         """Проверка существования файла."""
         return self.path.exists()
 
-    def updated_days_ago(self):
-        """Количество дней с последнего обновления файла.
-
-        https://docs.python.org/3/library/os.html#os.stat_result.st_mtime
-        """
-        time_updated = Path(self.path).stat().st_mtime
-        lag_sec = time.time() - time_updated
-        return lag_sec / (60 * 60 * 24)
+    def updated(self):
+        """Время последнего обновления файла."""
+        return arrow.get(Path(self.path).stat().st_mtime)
 
     def save(self, df):
         """Сохраняет DataFrame или Series с заголовками."""
+        make_folder(self.path)
         df.to_csv(self.path, index=True, header=True)
 
     def read(self):
@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import portfolio_optimizer
+
+# Зависимости, которые нужны только для загрузки данных из интернета
+HEAVY_MODULES = ['bs4', 'lxml', 'requests', 'scipy']
+# Ограничение времени холодного старта с большим запасом - основную часть занимает загрузка pandas
+COLD_START_LIMIT_IN_SECONDS = 5.0
+
+SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from portfolio_optimizer import settings
+settings.DATA_PATH = settings.Path(r'{data_path}')
+import portfolio_optimizer.getter
+import portfolio_optimizer.download
+seconds = time.perf_counter() - start
+result = dict(seconds=seconds,
+              modules=[name for name in {modules} if name in sys.modules],
+              data_path_created=settings.DATA_PATH.exists())
+with open(r'{result_path}', 'w') as file:
+    json.dump(result, file)
+'''
+
+
+def test_cold_start(tmpdir):
+    src = Path(portfolio_optimizer.__file__).parents[1]
+    result_path = Path(tmpdir) / 'result.json'
+    script = SCRIPT.format(data_path=Path(tmpdir) / 'data', modules=HEAVY_MODULES, result_path=result_path)
+    subprocess.check_call([sys.executable, '-c', script], cwd=str(src))
+    with result_path.open() as file:
+        result = json.load(file)
+    assert result['modules'] == []
+    assert not result['data_path_created']
+    assert 0 < result['seconds'] < COLD_START_LIMIT_IN_SECONDS, f"Холодный старт занял {result['seconds']:.3f} с"
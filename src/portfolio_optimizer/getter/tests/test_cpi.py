@@ -5,7 +5,7 @@ import pandas as pd
 import pytest
 
 from portfolio_optimizer import settings
-from portfolio_optimizer.getter import local_cpi
+from portfolio_optimizer.getter import local_cpi, update_policy
 from portfolio_optimizer.settings import CPI
 
 
@@ -35,7 +35,7 @@ def test_get_cpi_create():
 
 def test_get_cpi_need_update(monkeypatch):
     time.sleep(1)
-    monkeypatch.setattr(local_cpi, 'UPDATE_PERIOD_IN_DAYS', 1 / (60 * 60 * 24))
+    monkeypatch.setattr(local_cpi, 'UPDATE_POLICY', update_policy.MinInterval(1 / (60 * 60 * 24)))
     check_results()
 
 
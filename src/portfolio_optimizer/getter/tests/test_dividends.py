@@ -1,10 +1,13 @@
+import os
 import time
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
 from portfolio_optimizer import settings
-from portfolio_optimizer.getter import local_dividends
+from portfolio_optimizer.getter import local_dividends, offline, update_policy
+from portfolio_optimizer.settings import DATE, DIVIDENDS
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -28,7 +31,7 @@ def test_get_dividends_first_time():
 def test_forced_update_fake_new_rows(monkeypatch):
     dividends_object = local_dividends.LocalDividends('GAZP')
     dividends_object.df = dividends_object.df.reindex(dividends_object.df.index[:-1])
-    monkeypatch.setattr(local_dividends, 'UPDATE_PERIOD_IN_DAYS', 1 / (60 * 60 * 24))
+    monkeypatch.setattr(local_dividends.LocalDividends, '_update_policy', update_policy.MinInterval(1 / (60 * 60 * 24)))
     time.sleep(1)
     dividends_object.update_local_history()
     df = dividends_object.df
@@ -39,10 +42,34 @@ def test_forced_update_fake_new_rows(monkeypatch):
 
 
 def test_forced_update_now_new_rows(monkeypatch):
-    monkeypatch.setattr(local_dividends, 'UPDATE_PERIOD_IN_DAYS', 1 / (60 * 60 * 24))
+    monkeypatch.setattr(local_dividends.LocalDividends, '_update_policy', update_policy.MinInterval(1 / (60 * 60 * 24)))
     time.sleep(1)
     test_get_dividends_first_time()
 
 
 def test_get_dividends_no_update():
     test_get_dividends_first_time()
+
+
+def test_update_without_new_rows_marks_check(tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, 'DATA_PATH', Path(tmpdir))
+    df = pd.Series([1.0, 2.0], index=pd.DatetimeIndex(['2017-05-10', '2018-05-10'], name=DATE), name=DIVIDENDS)
+    calls = []
+
+    def fake_download(ticker):
+        calls.append(ticker)
+        return df
+
+    monkeypatch.setattr(local_dividends.download, 'dividends', fake_download)
+    monkeypatch.setattr(offline, 'is_offline', lambda source: False)
+    local_dividends.LocalDividends('TEST')
+    path = local_dividends.LocalDividends('TEST').local_data_path
+    assert calls == ['TEST']
+    # Политика обновления требует загрузки, если файл не изменялся больше недели
+    old_time = time.time() - 8 * 24 * 60 * 60
+    os.utime(str(path), (old_time, old_time))
+    local_dividends.LocalDividends('TEST')
+    assert calls == ['TEST', 'TEST']
+    assert path.stat().st_mtime > old_time
+    local_dividends.LocalDividends('TEST')
+    assert calls == ['TEST', 'TEST']
@@ -13,11 +13,10 @@ from portfolio_optimizer.settings import VOLUME, CLOSE_PRICE
 
 
 def updated_df():
-    saved_date = local_quotes.END_OF_CURRENT_TRADING_DAY
-    local_quotes.END_OF_CURRENT_TRADING_DAY = arrow.get().shift(months=1)
-    df2 = get_quotes_history('MSTT')
-    local_quotes.END_OF_CURRENT_TRADING_DAY = saved_date
-    return df2
+    quotes = LocalQuotes('MSTT')
+    quotes.need_update = lambda: True
+    quotes.update_local_history()
+    return quotes.df
 
 
 @pytest.fixture(scope='module', name='dfs', autouse=True)
@@ -93,7 +92,9 @@ def test_get_prices_history():
     assert df.loc['2018-03-13', 'RTKMP'] == 62
 
 
-def test_end_of_last_trading_day(monkeypatch):
-    monkeypatch.setattr(local_quotes, "END_OF_CURRENT_TRADING_DAY",
-                        arrow.get().to(local_quotes.MARKET_TIME_ZONE).replace(minute=0, second=0, microsecond=0))
-    assert local_quotes.end_of_last_trading_day() == local_quotes.END_OF_CURRENT_TRADING_DAY
+def test_end_of_last_trading_day():
+    end_of_day = local_quotes.end_of_last_trading_day()
+    assert end_of_day < arrow.get()
+    assert end_of_day > arrow.get().shift(days=-5)
+    assert (end_of_day.hour, end_of_day.minute) == (19, 15)
+    assert end_of_day.weekday() < 5
@@ -2,6 +2,7 @@ import pandas as pd
 import pytest
 
 import portfolio_optimizer.getter.legacy_dividends
+from portfolio_optimizer.getter.legacy_dividends import get_legacy_tickers
 
 
 def test_get_legacy_dividends():
@@ -13,3 +14,9 @@ def test_get_legacy_dividends():
     assert df.loc[2014, 'MSTT'] == pytest.approx(7.09)
     assert df.loc[2015, 'MAGN'] == pytest.approx(0.89)
     assert df.loc[2016, 'LSRG'] == pytest.approx(78)
+
+
+def test_get_legacy_tickers():
+    tickers = get_legacy_tickers()
+    assert tickers == sorted(tickers)
+    assert {'UPRO', 'RTKMP', 'MSTT', 'MAGN', 'LSRG'} <= set(tickers)
@@ -0,0 +1,99 @@
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import settings
+from portfolio_optimizer.getter import offline
+from portfolio_optimizer.getter.local_quotes import LocalQuotes
+from portfolio_optimizer.settings import LAST_DATE, STALE_DAYS
+
+
+def fail_loader(*args):
+    raise ConnectionError(f'Нет сети {args}')
+
+
+def ok_loader(*args):
+    return args
+
+
+@pytest.fixture(autouse=True)
+def restore_mode():
+    yield
+    offline.set_mode(offline.ONLINE)
+
+
+def test_set_wrong_mode():
+    with pytest.raises(ValueError):
+        offline.set_mode('TEST')
+
+
+def test_online_raises():
+    with pytest.raises(ConnectionError):
+        offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader)
+    assert offline.fetch(offline.MOEX, 'test', '2018-03-19', ok_loader, 1, 2) == (1, 2)
+
+
+def test_offline_never_calls_loader():
+    offline.set_mode(offline.OFFLINE)
+    assert offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader) is None
+    df = offline.stale_data()
+    assert list(df.columns) == [LAST_DATE, STALE_DAYS]
+    assert df.loc['test', LAST_DATE] == pd.Timestamp('2018-03-19')
+    assert df.loc['test', STALE_DAYS] > 0
+
+
+def test_offline_without_local_data():
+    offline.set_mode(offline.OFFLINE)
+    with pytest.raises(ConnectionError) as error:
+        offline.fetch(offline.MOEX, 'test', None, ok_loader)
+    assert 'локальные данные test отсутствуют' in str(error.value)
+
+
+def test_auto_switch_after_failures():
+    offline.set_mode(offline.AUTO)
+    for _ in range(offline.MAX_FAILURES):
+        assert not offline.is_offline(offline.MOEX)
+        with pytest.warns(UserWarning, match='Ошибка загрузки test'):
+            assert offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader) is None
+    assert offline.is_offline(offline.MOEX)
+    assert not offline.is_offline(offline.DOHOD)
+    assert offline.fetch(offline.DOHOD, 'test', '2018-03-19', ok_loader, 1) == (1,)
+
+
+def test_auto_success_resets_failures():
+    offline.set_mode(offline.AUTO)
+    with pytest.warns(UserWarning):
+        offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader)
+    offline.fetch(offline.MOEX, 'test', '2018-03-19', ok_loader)
+    with pytest.warns(UserWarning):
+        offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader)
+    assert not offline.is_offline(offline.MOEX)
+
+
+def test_failures_counted_from_threads():
+    def fail_many():
+        for _ in range(200):
+            with pytest.raises(ConnectionError):
+                offline.fetch(offline.MOEX, 'test', '2018-03-19', fail_loader)
+
+    threads = [threading.Thread(target=fail_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert offline._FAILURES[offline.MOEX] == 8 * 200
+
+
+def test_offline_local_quotes(tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, 'DATA_PATH', Path(tmpdir))
+    offline.set_mode(offline.OFFLINE)
+    df = pd.DataFrame({'CLOSE_PRICE': [1.0, 2.0], 'VOLUME': [10, 20]},
+                      index=pd.Index(pd.to_datetime(['2018-03-16', '2018-03-19']), name='DATE'))
+    (Path(tmpdir) / 'quotes').mkdir()
+    df.to_csv(Path(tmpdir) / 'quotes' / 'TEST.csv')
+    monkeypatch.setattr(LocalQuotes, 'need_update', lambda self: True)
+    quotes = LocalQuotes('TEST')
+    assert quotes.df.loc['2018-03-19', 'CLOSE_PRICE'] == 2.0
+    assert offline.stale_data().loc['quotes/TEST', LAST_DATE] == pd.Timestamp('2018-03-19')
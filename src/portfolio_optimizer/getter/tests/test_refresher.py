@@ -0,0 +1,42 @@
+import pytest
+
+from portfolio_optimizer.getter import refresher
+from portfolio_optimizer.getter.refresher import STATUS, MESSAGE, OK, ERROR
+
+
+@pytest.fixture(name='calls')
+def fake_getters(monkeypatch):
+    calls = []
+
+    def fake_getter(name):
+        def getter(*args):
+            calls.append(name)
+        return getter
+
+    def fail_dividends(tickers):
+        calls.append('dividends')
+        raise IndexError(f'Нет таблицы с дивидендами {tickers[0]}')
+
+    monkeypatch.setattr(refresher.local_index, 'get_index_history', fake_getter('index'))
+    monkeypatch.setattr(refresher.local_securities_info, 'get_last_prices', fake_getter('securities_info'))
+    monkeypatch.setattr(refresher.local_cpi, 'get_cpi', fake_getter('cpi'))
+    monkeypatch.setattr(refresher.local_quotes, 'get_quotes_history', fake_getter('quotes'))
+    monkeypatch.setattr(refresher.local_dividends, 'get_dividends', fail_dividends)
+    return calls
+
+
+def test_refresh(calls):
+    report = refresher.refresh(['GAZP', 'MSRS'], max_workers=4)
+    assert len(report) == 7
+    assert set(calls[:2]) == {'index', 'securities_info'}
+    assert calls.count('quotes') == 2
+    assert report.loc['quotes/GAZP', STATUS] == OK
+    assert report.loc['cpi', STATUS] == OK
+    assert report.loc['dividends/MSRS', STATUS] == ERROR
+    assert 'Нет таблицы с дивидендами MSRS' in report.loc['dividends/MSRS', MESSAGE]
+
+
+def test_main_once(calls, capsys):
+    refresher.main(['--once', 'GAZP'])
+    assert 'quotes/GAZP' in capsys.readouterr().out
+    assert len(calls) == 5
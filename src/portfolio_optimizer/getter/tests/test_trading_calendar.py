@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import arrow
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import settings
+from portfolio_optimizer.getter.trading_calendar import TradingCalendar, get_trading_calendar
+
+# 2018-03-08 - праздник, 2018-03-10 и 2018-03-11 - выходные
+DATES = ['2018-03-05', '2018-03-06', '2018-03-07', '2018-03-09', '2018-03-12', '2018-03-13']
+
+
+@pytest.fixture(name='calendar')
+def make_calendar():
+    return TradingCalendar(pd.to_datetime(DATES))
+
+
+def test_last_trading_date(calendar):
+    assert calendar.last_trading_date('2018-03-07') == pd.Timestamp('2018-03-07')
+    assert calendar.last_trading_date('2018-03-08') == pd.Timestamp('2018-03-07')
+    assert calendar.last_trading_date(pd.to_datetime('2018-03-11').date()) == pd.Timestamp('2018-03-09')
+    assert calendar.last_trading_date('2018-04-01') == pd.Timestamp('2018-03-13')
+
+
+def test_last_trading_date_before_calendar(calendar):
+    with pytest.raises(KeyError):
+        calendar.last_trading_date('2018-03-04')
+
+
+def test_is_trading_day(calendar):
+    assert calendar.is_trading_day('2018-03-09')
+    assert not calendar.is_trading_day('2018-03-08')
+    assert not calendar.is_trading_day('2018-03-10')
+    # За пределами календаря торговые дни - будни
+    assert calendar.is_trading_day('2018-03-14')
+    assert not calendar.is_trading_day('2018-03-17')
+
+
+def test_end_of_last_trading_day(calendar):
+    now = arrow.get('2018-03-09T20:00:00+03:00')
+    assert calendar.end_of_last_trading_day(now) == arrow.get('2018-03-09T19:15:00+03:00')
+    now = arrow.get('2018-03-09T12:00:00+03:00')
+    assert calendar.end_of_last_trading_day(now) == arrow.get('2018-03-07T19:15:00+03:00')
+    now = arrow.get('2018-03-11T20:00:00+03:00')
+    assert calendar.end_of_last_trading_day(now) == arrow.get('2018-03-09T19:15:00+03:00')
+
+
+def test_empty_calendar():
+    calendar = TradingCalendar([])
+    assert calendar.is_trading_day('2018-03-08')
+    assert not calendar.is_trading_day('2018-03-10')
+    now = arrow.get('2018-03-12T12:00:00+03:00')
+    assert calendar.end_of_last_trading_day(now) == arrow.get('2018-03-09T19:15:00+03:00')
+
+
+def test_get_trading_calendar(tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, 'DATA_PATH', Path(tmpdir))
+    assert len(get_trading_calendar()) == 0
+    index = pd.Index(pd.to_datetime(DATES), name='DATE')
+    (Path(tmpdir) / 'index').mkdir()
+    pd.Series(1.0, index=index, name='CLOSE_PRICE').to_csv(Path(tmpdir) / 'index' / 'MCFTRR.csv', header=True)
+    calendar = get_trading_calendar()
+    assert len(calendar) == len(DATES)
+    assert calendar is get_trading_calendar()
+    assert not calendar.is_trading_day('2018-03-08')
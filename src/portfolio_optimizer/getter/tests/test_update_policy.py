@@ -0,0 +1,36 @@
+import arrow
+import pandas as pd
+
+from portfolio_optimizer.getter import update_policy
+
+
+def test_min_interval():
+    policy = update_policy.MinInterval(days=7)
+    assert not policy.need_update(arrow.get().shift(days=-6))
+    assert policy.need_update(arrow.get().shift(days=-8))
+
+
+def test_monthly_release_date():
+    policy = update_policy.MonthlyRelease(release_day=5)
+    release = policy.next_release(pd.to_datetime('2018-02-28'))
+    assert release.to(update_policy.MARKET_TIME_ZONE).date() == pd.to_datetime('2018-04-05').date()
+
+
+def test_monthly_release_not_published():
+    policy = update_policy.MonthlyRelease(release_day=5)
+    last_month = arrow.get().shift(months=-1).ceil('month').datetime
+    assert not policy.need_update(arrow.get().shift(days=-20), last_month)
+
+
+def test_monthly_release_published():
+    policy = update_policy.MonthlyRelease(release_day=5, retry_days=1)
+    old_month = arrow.get().shift(months=-3).ceil('month').datetime
+    assert policy.need_update(arrow.get().shift(days=-2), old_month)
+    assert not policy.need_update(arrow.get().shift(hours=-1), old_month)
+
+
+def test_after_event():
+    event = arrow.get().shift(hours=-1)
+    policy = update_policy.AfterEvent(lambda: event)
+    assert policy.need_update(event.shift(minutes=-1))
+    assert not policy.need_update(event.shift(minutes=1))
@@ -0,0 +1,114 @@
+"""Календарь торговых дней MOEX.
+
+Календарь строится по локальной истории индекса MCFTRR, которая обновляется с ISS при загрузке индекса, и позволяет
+за O(1) определять, является ли дата торговой, и находить последнюю торговую дату не позже заданной:
+
+    get_trading_calendar()
+
+Ограничения - календарь не является расписанием торгов биржи. Он точен только для прошедших дат, история индекса для
+которых уже загружена. Для дат после последней даты истории торговыми считаются все будние дни, поэтому будущие
+праздники MOEX и перенесенные рабочие дни не учитываются. Расписание торгов с ISS не загружается - календарь
+обновляется только вместе с историей индекса.
+"""
+
+import arrow
+import numpy as np
+import pandas as pd
+
+from portfolio_optimizer.getter.storage import LocalFile
+from portfolio_optimizer.getter.update_policy import MARKET_TIME_ZONE
+
+# Реально торги заканчиваются в 19.00, но данные транслируются с задержкой в 15 минут
+END_OF_TRADING_DAY = dict(hour=19, minute=15, second=0, microsecond=0)
+# Номера выходных дней недели
+WEEKEND = (5, 6)
+
+# Календарь кэшируется в памяти до изменения файла с историей индекса
+_CACHE = dict(key=None, calendar=None)
+
+
+class TradingCalendar:
+    """Календарь торговых дней, построенный по набору дат торгов.
+
+    Для каждого календарного дня в диапазоне дат торгов заранее рассчитывается позиция последней торговой даты не
+    позже него, поэтому все запросы выполняются за O(1). Для дат после последней известной торговой даты торговыми
+    считаются будние дни.
+    """
+
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(dates).normalize().unique().sort_values()
+        if len(self.dates):
+            offsets = (self.dates - self.dates[0]).days
+            self._positions = np.searchsorted(offsets, np.arange(offsets[-1] + 1), side='right') - 1
+        else:
+            self._positions = np.array([], dtype=int)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _offset(self, date):
+        """Количество дней от первой даты календаря."""
+        return (pd.Timestamp(date).normalize() - self.dates[0]).days
+
+    def last_trading_date(self, date):
+        """Последняя торговая дата не позже заданной.
+
+        Для дат после окончания календаря возвращается последняя известная торговая дата.
+        """
+        if not len(self) or self._offset(date) < 0:
+            raise KeyError(f'Нет торговых дат до {date}')
+        offset = min(self._offset(date), len(self._positions) - 1)
+        return self.dates[self._positions[offset]]
+
+    def is_trading_day(self, date):
+        """Является ли дата торговой.
+
+        Для дат за пределами календаря торговыми считаются будние дни.
+        """
+        if len(self):
+            offset = self._offset(date)
+            if 0 <= offset < len(self._positions):
+                return self.dates[self._positions[offset]] == pd.Timestamp(date).normalize()
+        return pd.Timestamp(date).weekday() not in WEEKEND
+
+    def end_of_last_trading_day(self, now=None):
+        """Время окончания последнего завершившегося торгового дня.
+
+        Выходные и праздничные дни, известные по истории торгов, пропускаются.
+        """
+        now = arrow.get(now or arrow.get()).to(MARKET_TIME_ZONE)
+        end_of_day = now.replace(**END_OF_TRADING_DAY)
+        if now <= end_of_day:
+            end_of_day = end_of_day.shift(days=-1)
+        while not self.is_trading_day(end_of_day.date()):
+            end_of_day = end_of_day.shift(days=-1)
+        return end_of_day
+
+
+def get_trading_calendar():
+    """
+    Возвращает календарь торговых дней MOEX по локальной истории индекса MCFTRR.
+
+    Календарь не обращается к интернету - он использует локальную версию истории индекса, которая обновляется с ISS
+    при ее загрузке, и перестраивается после каждого изменения файла. При отсутствии локальных данных торговыми
+    считаются все будние дни.
+
+    Returns
+    -------
+    TradingCalendar
+        Календарь торговых дней.
+    """
+    # Импорт внутри функции, так как загрузка индекса сама использует календарь для проверки актуальности данных
+    from portfolio_optimizer.getter.local_index import LocalIndex, INDEX_FOLDER, INDEX_TICKER
+    file = LocalFile(INDEX_FOLDER, f'{INDEX_TICKER}.csv', LocalIndex._load_converter)
+    if not file.exists():
+        return TradingCalendar([])
+    key = file.path, file.updated()
+    if _CACHE['key'] != key:
+        _CACHE['calendar'] = TradingCalendar(file.read().index)
+        _CACHE['key'] = key
+    return _CACHE['calendar']
+
+
+if __name__ == '__main__':
+    print(get_trading_calendar().end_of_last_trading_day())
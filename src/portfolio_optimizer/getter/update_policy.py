@@ -0,0 +1,65 @@
+"""Политики обновления локальных данных.
+
+Каждый набор данных декларирует свою политику обновления, которая по времени последнего обновления локального файла и
+последней дате в данных определяет, нужно ли загружать новые данные из интернета:
+
+    MinInterval(days) - обновление не чаще заданного количества дней;
+    MonthlyRelease(release_day) - месячные данные, которые публикуются в заданный день следующего месяца;
+    AfterEvent(last_event) - обновление после наступления события, например, окончания торгов.
+"""
+
+import arrow
+
+MARKET_TIME_ZONE = 'Europe/Moscow'
+SECONDS_IN_DAY = 60 * 60 * 24
+
+
+class MinInterval:
+    """Обновление требуется, если с момента последнего обновления прошло заданное количество дней."""
+
+    def __init__(self, days: float):
+        self.days = days
+
+    def need_update(self, updated: arrow.Arrow, last_date=None):
+        """Проверяет, прошел ли минимальный интервал с момента последнего обновления."""
+        lag_sec = (arrow.get() - updated).total_seconds()
+        return lag_sec > self.days * SECONDS_IN_DAY
+
+
+class MonthlyRelease:
+    """Месячные данные, которые публикуются в определенный день следующего за отчетным месяца.
+
+    До ожидаемой даты публикации данных за месяц, следующий за последним в локальных данных, обновление не требуется.
+    После ее наступления данные обновляются не чаще, чем раз в retry_days дней, пока не появятся новые данные - это
+    защищает от задержек публикации без риска использовать устаревшие данные.
+    """
+
+    def __init__(self, release_day: int, retry_days: float = 1):
+        self.release_day = release_day
+        self.retry = MinInterval(retry_days)
+
+    def next_release(self, last_date):
+        """Ожидаемая дата публикации данных за месяц, следующий за последней датой в данных."""
+        month = arrow.get(last_date).replace(tzinfo=MARKET_TIME_ZONE).floor('month')
+        return month.shift(months=2, days=self.release_day - 1)
+
+    def need_update(self, updated: arrow.Arrow, last_date=None):
+        """Обновление требуется после ожидаемой даты публикации новых данных."""
+        if last_date is not None and arrow.get() < self.next_release(last_date):
+            return False
+        return self.retry.need_update(updated)
+
+
+class AfterEvent:
+    """Обновление требуется, если файл обновлялся до наступления последнего события.
+
+    Событие задается функцией, которая возвращает время последнего события, например, окончания последнего торгового
+    дня.
+    """
+
+    def __init__(self, last_event):
+        self.last_event = last_event
+
+    def need_update(self, updated: arrow.Arrow, last_date=None):
+        """Проверяет, обновлялся ли файл после последнего события."""
+        return updated < self.last_event()
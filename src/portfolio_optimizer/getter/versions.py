@@ -0,0 +1,42 @@
+"""Версии локальных данных без их загрузки.
+
+Версия определяется по времени изменения и размеру локальных файлов, поэтому меняется при любом обновлении данных
+функциями пакета getter или фоновым обновлением:
+
+    get_data_version(tickers)
+"""
+
+import os
+
+from portfolio_optimizer.getter import local_cpi, local_quotes, local_securities_info, storage
+from portfolio_optimizer.getter.legacy_dividends import DATA_PATH as LEGACY_DIVIDENDS_PATH
+
+
+def _file_version(path):
+    """Время изменения и размер файла или None, если файл отсутствует."""
+    try:
+        stat = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_data_version(tickers: list):
+    """
+    Версия локальных данных для набора тикеров.
+
+    Parameters
+    ----------
+    tickers
+        Тикеры портфеля.
+
+    Returns
+    -------
+    tuple
+        Пути, время изменения и размер файлов с котировками тикеров, информацией о бумагах, дивидендами и инфляцией.
+    """
+    paths = [storage.make_data_path(local_quotes.QUOTES_FOLDER, f'{ticker}.csv') for ticker in sorted(tickers)]
+    paths.extend([local_securities_info.DATA_PATH,
+                  LEGACY_DIVIDENDS_PATH,
+                  storage.make_data_path(local_cpi.CPI_FOLDER, local_cpi.CPI_FILE)])
+    return tuple((str(path), _file_version(path)) for path in paths)
@@ -0,0 +1,51 @@
+"""Ленивый граф вычислений для метрик портфеля.
+
+Каждая метрика объявляется узлом графа с явным перечнем входов, от которых она зависит напрямую или через другие
+узлы. Значение узла вычисляется при первом обращении и хранится до изменения версии хотя бы одного из входов:
+
+    class Metrics:
+        @node(POSITIONS, DATE)
+        def mean(self):
+            ...
+
+Объект с узлами должен реализовывать метод input_version(name), возвращающий текущую версию входа. Обращение к
+метрике вычисляет только ее предков, которые отсутствуют в кэше или устарели.
+
+Кэшированные значения возвращаются без копирования, поэтому их нельзя изменять на месте.
+"""
+
+# Входы графа
+DATE = 'date'
+POSITIONS = 'positions'
+DATA = 'data'
+DECAY = 'decay'
+
+
+class Node:
+    """Узел графа - свойство, значение которого кэшируется до изменения версий входов."""
+
+    def __init__(self, func, inputs):
+        self.func = func
+        self.name = func.__name__
+        self.inputs = inputs
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        key = tuple(instance.input_version(name) for name in self.inputs)
+        cache = instance.__dict__.setdefault('_graph_cache', dict())
+        if self.name in cache:
+            cached_key, value = cache[self.name]
+            if cached_key == key:
+                return value
+        value = self.func(instance)
+        cache[self.name] = key, value
+        return value
+
+
+def node(*inputs):
+    """Декоратор, превращающий метод в узел графа, зависящий от перечисленных входов."""
+    def decorator(func):
+        return Node(func, inputs)
+    return decorator
@@ -1,9 +1,15 @@
 """Класс проводит оптимизацию по Парето на основе метрик доходности и дивидендов"""
 
+import warnings
+
+import numpy as np
 import pandas as pd
 
+from portfolio_optimizer import lazy
 from portfolio_optimizer.dividends_metrics import DividendsMetrics
+from portfolio_optimizer.getter.legacy_dividends import get_legacy_tickers
 from portfolio_optimizer.portfolio import Portfolio
+from portfolio_optimizer.prefetch import prefetch, MAX_WORKERS
 from portfolio_optimizer.returns_metrics import ReturnsMetrics
 from portfolio_optimizer.settings import PORTFOLIO, T_SCORE, CASH
 
@@ -19,12 +25,19 @@ class Optimizer:
 
     Дополнительно производится оценка возможности значимо (на T_SCORE СКО) минимальную величину дивидендов -
     используется не точный расчет, а линейное приближение
+
+    Для проверки гипотетических сделок портфель можно изменять методами set_lots, set_cash, add_ticker и
+    remove_ticker - метрики пересчитываются при следующем обращении с использованием кэшированных рядов доходностей и
+    дивидендов отдельных позиций. Константа сглаживания при этом уточняется только вызовом returns.fit()
+
+    Ранее подобранная константа сглаживания может быть передана при создании, чтобы не подбирать ее повторно. Флаги
+    persist и refit передаются ReturnsMetrics
     """
 
-    def __init__(self, portfolio: Portfolio):
+    def __init__(self, portfolio: Portfolio, decay: float = None, persist: bool = False, refit: bool = False):
         self._portfolio = portfolio
         self._dividends = DividendsMetrics(portfolio)
-        self._returns = ReturnsMetrics(portfolio)
+        self._returns = ReturnsMetrics(portfolio, decay, persist, refit)
 
     def __str__(self):
         t_growth = self.t_growth
@@ -47,6 +60,10 @@ class Optimizer:
         return (f'{need_optimization}\n\nКлючевые метрики оптимальности по Парето'
                 f'\n\n{df}\n\n{self.best_trade}')
 
+    def input_version(self, name: str):
+        """Версия входа графа метрик - совпадает с версией для метрик доходности"""
+        return self._returns.input_version(name)
+
     @property
     def portfolio(self):
         """Оптимизируемый портфель"""
@@ -80,7 +97,7 @@ class Optimizer:
             if not pareto_dominance.empty:
                 yield position, dividends_gradient[pareto_dominance].idxmax()
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def dominated(self):
         """Для каждой позиции выдает доминирующую ее по Парето
 
@@ -91,7 +108,7 @@ class Optimizer:
             df[position] = dominated
         return df
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def gradient_growth(self):
         """Для каждой позиции выдает прирост градиента при покупке доминирующей
 
@@ -103,7 +120,7 @@ class Optimizer:
             df[position] = dividends_gradient[dominated] - dividends_gradient[position]
         return df
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def t_growth(self):
         """Приблизительная оценка потенциального улучшения дивидендов
 
@@ -113,9 +130,64 @@ class Optimizer:
         weighted_growth = (self.portfolio.weight * self.gradient_growth).sum()
         return weighted_growth / self.dividends.std[PORTFOLIO]
 
-    @property
-    def best_trade(self):
-        """Возвращает строчку с рекомендацией по сделкам
+    def scan(self, universe: list = None, max_workers: int = MAX_WORKERS):
+        """Ранжирует кандидатов на покупку из числа бумаг, отсутствующих в портфеле
+
+        Кандидаты добавляются в копию портфеля с нулевым количеством лотов, поэтому не меняют его стоимость, веса и
+        метрики. Данные для всех бумаг загружаются одной волной, градиенты рассчитываются сразу для всех кандидатов при
+        константе сглаживания исходного портфеля, а доминирование по Парето над позициями портфеля с ненулевым весом
+        проверяется одним сравнением массивов
+
+        Кандидаты без legacy dividends пропускаются с предупреждением, так как для них нельзя рассчитать метрики
+        дивидендов
+
+        Parameters
+        ----------
+        universe
+            Тикеры кандидатов - по умолчанию все тикеры, для которых есть legacy dividends.
+        max_workers
+            Количество параллельных загрузок.
+
+        Returns
+        -------
+        pandas.DataFrame
+            В строках кандидаты, упорядоченные по убыванию количества доминируемых позиций и градиента дивидендов.
+            В столбцах градиенты дивидендов и доходности и количество доминируемых позиций портфеля.
+        """
+        portfolio = self.portfolio
+        legacy_tickers = get_legacy_tickers()
+        if universe is None:
+            universe = legacy_tickers
+        candidates = sorted(set(universe) - set(portfolio.tickers))
+        skipped = sorted(set(candidates) - set(legacy_tickers))
+        if skipped:
+            warnings.warn(f'\n\nНет данных о дивидендах - кандидаты пропущены: {", ".join(skipped)}\n')
+            candidates = [ticker for ticker in candidates if ticker not in skipped]
+        columns = ['D_GRADIENT', 'R_GRADIENT', 'DOMINATES']
+        if not candidates:
+            return pd.DataFrame(columns=columns)
+        positions = dict(zip(portfolio.tickers, portfolio.lots[portfolio.tickers]))
+        positions.update(dict.fromkeys(candidates, 0))
+        scan_portfolio = Portfolio(date=portfolio.date,
+                                   cash=portfolio.lots[CASH],
+                                   positions=positions,
+                                   data=prefetch(list(positions), max_workers))
+        dividends_gradient = DividendsMetrics(scan_portfolio).gradient
+        returns_gradient = ReturnsMetrics(scan_portfolio, self.returns.decay).gradient
+        holdings = portfolio.index[portfolio.weight.values != 0]
+        greater_dividend_gradient = (dividends_gradient[candidates].values[:, np.newaxis] >
+                                     dividends_gradient[holdings].values)
+        greater_return_gradient = returns_gradient[candidates].values[:, np.newaxis] > returns_gradient[holdings].values
+        dominates = (greater_dividend_gradient & greater_return_gradient).sum(axis=1)
+        df = pd.DataFrame(dict(zip(columns, [dividends_gradient[candidates], returns_gradient[candidates], dominates])),
+                          index=candidates, columns=columns)
+        return df.sort_values(['DOMINATES', 'D_GRADIENT'], ascending=False)
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def trade(self):
+        """Рекомендуемая сделка в виде словаря
+
+        SELL и BUY - тикеры для продажи и покупки, SELL_LOTS и BUY_LOTS - количество лотов в каждой из 5 сделок
 
         Лучшая позиция на продажу сокращается до нуля, но не более чем на MAX_TRADE от объема портфеля
         Продажа бьется на 5 сделок с округлением в большую сторону
@@ -130,9 +202,15 @@ class Optimizer:
         sell_5_lots = int(sell_value / portfolio.lot_size[best_sell] / portfolio.price[best_sell] / 5 + 0.5)
         best_buy = self.dominated[best_sell]
         buy_5_lots = int(portfolio.value[CASH] / portfolio.lot_size[best_buy] / portfolio.price[best_buy] / 5)
+        return dict(SELL=best_sell, SELL_LOTS=sell_5_lots, BUY=best_buy, BUY_LOTS=buy_5_lots)
+
+    @property
+    def best_trade(self):
+        """Возвращает строчку с рекомендацией по сделкам"""
+        trade = self.trade
         return (f'РЕКОМЕНДУЕТСЯ:\n'
-                f'Продать {best_sell} - 5 сделок по {sell_5_lots} лотов\n'
-                f'Купить {best_buy} - 5 сделок по {buy_5_lots} лотов')
+                f'Продать {trade["SELL"]} - 5 сделок по {trade["SELL_LOTS"]} лотов\n'
+                f'Купить {trade["BUY"]} - 5 сделок по {trade["BUY_LOTS"]} лотов')
 
 
 if __name__ == '__main__':
@@ -161,6 +239,7 @@ if __name__ == '__main__':
                KBTK=9)
     port = Portfolio(date='2018-04-05',
                      cash=0 + 2749.64 + 4330.3,
-                     positions=pos)
+                     positions=pos,
+                     data=prefetch(pos))
     optimizer = Optimizer(port)
     print(optimizer)
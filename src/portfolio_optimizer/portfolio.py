@@ -5,9 +5,10 @@ import warnings
 import numpy as np
 import pandas as pd
 
-from portfolio_optimizer import getter
+from portfolio_optimizer import getter, lazy
+from portfolio_optimizer.getter.trading_calendar import TradingCalendar
 from portfolio_optimizer.settings import LOTS
-from portfolio_optimizer.settings import PORTFOLIO, CASH, PRICE, WEIGHT, VALUE, LOT_SIZE
+from portfolio_optimizer.settings import PORTFOLIO, CASH, PRICE, WEIGHT, VALUE, LOT_SIZE, TRADING_DATE
 
 
 class Portfolio:
@@ -19,6 +20,9 @@ class Portfolio:
 
     Рассчитывает стоимость портфеля и отдельных позиций, а так же доли позиций в портфеле.
 
+    Данные хранятся в непрерывных массивах NumPy, упорядоченных как index: тикеры, CASH и PORTFOLIO. Свойства
+    возвращают pandas.Series, а DataFrame со всеми метриками формируется только по запросу.
+
     Атрибуты:
 
     date: datetime.datetime
@@ -30,120 +34,341 @@ class Portfolio:
     prices: pandas.DataFrame
         Ряды цен для тикеров портфеля. Отсутствующие значения заменены последними предыдущими.
 
+    data: модуль getter или prefetch.MarketData
+        Источник данных для портфеля и его метрик. По умолчанию данные загружаются функциями пакета getter, но можно
+        передать заранее загруженный снимок данных. При замене источника размеры лотов и цены загружаются заново.
+
     Методы:
 
     change_date(date: str):
         Изменяет дату портфеля, цены и пересчитывает все остальные параметры.
+
+    version(name: str):
+        Версия входа графа метрик - меняется при каждом изменении даты, состава портфеля или источника данных, а так же
+        при загрузке обновленных данных методом reload.
+
+    reload():
+        Загружает данные заново, если они изменились после создания портфеля, например, обновлены локальные файлы.
+
+    prices_at(dates: list):
+        Цены на набор дат с отчетом о датах, для которых использованы котировки предыдущих торговых дат.
+
+    set_lots(ticker: str, lots: int), set_cash(cash: float):
+        Изменяют количество лотов или денежные средства и пересчитывают стоимость и веса.
+
+    add_ticker(ticker: str, lots: int = 0), remove_ticker(ticker: str):
+        Добавляют или удаляют позицию - загружаются данные только для добавляемого тикера.
+
+    value_history(start: str = None, end: str = None):
+        История стоимости отдельных позиций и портфеля при неизменном составе.
+
+    weight_history(start: str = None, end: str = None):
+        История долей отдельных позиций в портфеле при неизменном составе.
     """
+    __slots__ = ['_data', '_data_state', 'date', 'tickers', 'cash_and_tickers', 'prices', '_calendar', '_versions',
+                 '_index', '_lot_size', '_lots', '_price', '_value', '_weight']
     _COLUMNS = [LOT_SIZE, LOTS, PRICE, VALUE, WEIGHT]
 
-    def __init__(self, date: str, cash: float, positions: dict, value: float = None):
+    def __init__(self, date: str, cash: float, positions: dict, value: float = None, data=None):
+        self._versions = {lazy.DATE: 0, lazy.POSITIONS: 0, lazy.DATA: 0}
+        self._data = getter if data is None else data
         self.date = pd.to_datetime(date).date()
         self.tickers = sorted(positions.keys())
         self.cash_and_tickers = self.tickers + [CASH]
-        self._create_df(cash)
+        self._create_arrays(cash, self.data.security_info(self.tickers)[LOT_SIZE])
         self._fill_lots(positions)
         self.prices = None
+        self._calendar = None
         self._fill_price()
         self._fill_value()
+        self._data_state = self._current_data_state()
         if value:
-            if not np.isclose(self._df.loc[PORTFOLIO, VALUE], value):
+            if not np.isclose(self._value[-1], value):
                 raise ValueError(f'Введенная стоимость портфеля {value} '
-                                 f'не равна расчетной {self._df.loc[PORTFOLIO, VALUE]}.')
+                                 f'не равна расчетной {self._value[-1]}.')
 
     def __str__(self):
-        return f'\n\nДата портфеля - {self.date}\n\n{self._df}'
+        return f'\n\nДата портфеля - {self.date}\n\n{self.df}'
 
-    def _create_df(self, cash):
-        """Создает DataFrame:
+    def _create_arrays(self, cash, lot_size):
+        """Создает индекс и массивы данных:
 
         Строки - тикеры, CASH и PORTFOLIO.
-        Столбцы - размер лота, количество лотов, цена, стоимость и вес.
+        Массивы - размер лота, количество лотов, цена, стоимость и вес.
 
         Размер лота, количество лотов и цена:
         CASH - 1, денежные средства и 1.
         PORTFOLIO - 1, 1, а цена может быть заполнена только после расчета стоимости отдельных позиций.
         """
-        df = getter.security_info(self.tickers)
-        rows = df.index.append(pd.Index([CASH, PORTFOLIO]))
-        self._df = df.reindex(index=rows, columns=self._COLUMNS, fill_value=0)
-        self._df.loc[CASH, [LOT_SIZE, LOTS, PRICE]] = [1, cash, 1]
-        self._df.loc[PORTFOLIO, [LOT_SIZE, LOTS]] = [1, 1]
+        self._index = pd.Index(self.tickers + [CASH, PORTFOLIO])
+        size = len(self._index)
+        self._lot_size = np.ones(size, dtype=lot_size.dtype)
+        self._lot_size[:-2] = lot_size.values
+        self._lots = np.ones(size)
+        self._lots[-2] = cash
+        self._price = np.ones(size)
+        self._price[-1] = 0
+        self._value = np.zeros(size)
+        self._weight = np.zeros(size)
 
     def _fill_lots(self, positions):
         """Заполняет данные по количеству лотов для тикеров."""
-        self._df.loc[self.tickers, LOTS] = [positions[ticker] for ticker in self.tickers]
+        self._lots[:-2] = [positions[ticker] for ticker in self.tickers]
 
     def _fill_price(self):
         """Заполняет цены на отчетную дату или предыдущую торговую."""
         if self.prices is None:
-            prices = getter.prices_history(self.tickers)
+            prices = self.data.prices_history(self.tickers)
             self.prices = prices.fillna(method='ffill')
-        date = self.date
-        index = self.prices.index
-        if date not in index:
-            date = index[index.get_loc(date, method='ffill')].date()
+            self._calendar = TradingCalendar(self.prices.index)
+        date = self._calendar.last_trading_date(self.date)
+        if date != pd.Timestamp(self.date):
             non_trading_date = (f'\n\nТорги не проводились {self.date} - '
-                                f'будут использованы котировки предыдущей торговой даты {date}.\n')
+                                f'будут использованы котировки предыдущей торговой даты {date.date()}.\n')
             warnings.warn(non_trading_date)
-        self._df.loc[self.tickers, PRICE] = self.prices.loc[date]
+        self._price[:-2] = self.prices.loc[date].values
 
     def _fill_value(self):
         """Рассчитывает стоимость отдельных позиций и вызывает метод расчета стоимости портфеля."""
-        value_components = self._df.loc[self.cash_and_tickers, [LOT_SIZE, LOTS, PRICE]]
-        self._df.loc[self.cash_and_tickers, VALUE] = value_components.prod(axis=1)
+        self._value[:-1] = self._lot_size[:-1] * self._lots[:-1] * self._price[:-1]
         self._fill_portfolio_value()
 
     def _fill_portfolio_value(self):
         """Рассчитывает стоимость портфеля и запускает расчет весов отдельных позиций."""
-        portfolio_value = self._df.loc[self.cash_and_tickers, VALUE].sum(axis=0)
-        self._df.loc[PORTFOLIO, [PRICE, VALUE]] = [portfolio_value, portfolio_value]
+        portfolio_value = self._value[:-1].sum()
+        self._price[-1] = self._value[-1] = portfolio_value
         self._fill_weight()
 
     def _fill_weight(self):
         """Рассчитывает веса отдельных позиций."""
-        self._df.loc[:, WEIGHT] = self._df[VALUE] / self._df.loc[PORTFOLIO, VALUE]
+        np.divide(self._value, self._value[-1], out=self._weight)
 
     def change_date(self, date: str):
         """Изменяет дату портфеля и пересчитывает значения всех показателей."""
         self.date = pd.to_datetime(date).date()
+        self._versions[lazy.DATE] += 1
+        self._fill_price()
+        self._fill_value()
+
+    def version(self, name: str):
+        """Версия входа графа метрик - даты, состава портфеля или источника данных.
+
+        Состояние данных фиксируется при создании портфеля, поэтому версия не обращается к файлам и не меняется в
+        процессе расчетов. Обновленные данные загружаются только явным вызовом reload.
+        """
+        return self._versions[name]
+
+    def reload(self):
+        """Загружает размеры лотов и историю цен заново, если данные изменились после их загрузки.
+
+        Returns
+        -------
+        bool
+            Были ли данные загружены заново - в этом случае меняется версия данных и метрики будут пересчитаны.
+        """
+        if self._current_data_state() == self._data_state:
+            return False
+        self._reload_data()
+        return True
+
+    def _current_data_state(self):
+        """Состояние данных - хэш снимка или время изменения и размер локальных файлов для тикеров портфеля."""
+        if self._data is getter:
+            return getter.data_version(self.tickers)
+        return self._data.version
+
+    @property
+    def data(self):
+        """Источник данных для портфеля и его метрик"""
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._reload_data()
+
+    def _reload_data(self):
+        """Загружает размеры лотов и историю цен из источника данных и пересчитывает все показатели."""
+        self._lot_size[:-2] = self.data.security_info(self.tickers)[LOT_SIZE].values
+        self.prices = None
+        self._fill_price()
+        self._fill_value()
+        self._data_state = self._current_data_state()
+        self._versions[lazy.DATA] += 1
+
+    def _positions(self):
+        """Словарь с количеством лотов для тикеров."""
+        return dict(zip(self.tickers, self._lots[:-2]))
+
+    def _check_ticker(self, ticker):
+        """Проверяет наличие тикера в портфеле."""
+        if ticker not in self.tickers:
+            raise ValueError(f'Тикера {ticker} нет в портфеле')
+
+    def set_lots(self, ticker: str, lots: int):
+        """Изменяет количество лотов для тикера и пересчитывает стоимость и веса."""
+        self._check_ticker(ticker)
+        self._lots[self.tickers.index(ticker)] = lots
+        self._versions[lazy.POSITIONS] += 1
+        self._fill_value()
+
+    def set_cash(self, cash: float):
+        """Изменяет количество денежных средств и пересчитывает стоимость и веса."""
+        self._lots[-2] = cash
+        self._versions[lazy.POSITIONS] += 1
+        self._fill_value()
+
+    def add_ticker(self, ticker: str, lots: int = 0):
+        """Добавляет позицию в портфель.
+
+        Информация о бумаге и история цен загружаются только для нового тикера, данные остальных позиций
+        используются повторно.
+        """
+        if ticker in self.tickers:
+            raise ValueError(f'Тикер {ticker} уже есть в портфеле')
+        positions = self._positions()
+        positions[ticker] = lots
+        lot_size = pd.concat([self.lot_size[self.tickers], self.data.security_info([ticker])[LOT_SIZE]])
+        prices = pd.concat([self.prices, self.data.prices_history([ticker])], axis=1)
+        self._change_tickers(positions, lot_size, prices)
+
+    def remove_ticker(self, ticker: str):
+        """Удаляет позицию из портфеля.
+
+        Из истории цен удаляется только столбец тикера - даты истории и цены остальных позиций не меняются.
+        """
+        self._check_ticker(ticker)
+        positions = self._positions()
+        del positions[ticker]
+        prices = self.prices.drop(columns=ticker)
+        self._change_tickers(positions, self.lot_size.drop(ticker), prices)
+
+    def _change_tickers(self, positions, lot_size, prices):
+        """Перестраивает массивы данных для нового набора тикеров и пересчитывает все показатели."""
+        cash = self._lots[-2]
+        self._versions[lazy.POSITIONS] += 1
+        self.tickers = sorted(positions.keys())
+        self.cash_and_tickers = self.tickers + [CASH]
+        self._create_arrays(cash, lot_size[self.tickers])
+        self._fill_lots(positions)
+        self.prices = prices[self.tickers].fillna(method='ffill')
+        self._calendar = TradingCalendar(self.prices.index)
         self._fill_price()
         self._fill_value()
+        self._data_state = self._current_data_state()
+
+    def prices_at(self, dates):
+        """Цены на набор дат или предыдущие торговые даты.
+
+        Все даты разрешаются одним проходом searchsorted по отсортированному индексу истории цен. Вместо
+        предупреждения для каждой неторговой даты формируется компактный отчет.
+
+        Parameters
+        ----------
+        dates
+            Массив или список дат.
+
+        Returns
+        -------
+        tuple of pandas.DataFrame and pandas.Series
+            Цены - в строках запрошенные даты, в столбцах тикеры.
+            Отчет - запрошенные даты, для которых использованы цены предыдущей торговой даты, и эти торговые даты.
+
+        Raises
+        ------
+        KeyError
+            Если какая-либо дата предшествует началу истории цен.
+        """
+        dates = pd.DatetimeIndex(dates).normalize()
+        trading_dates = self.prices.index.values
+        positions = np.searchsorted(trading_dates, dates.values, side='right') - 1
+        if len(positions) and positions.min() < 0:
+            raise KeyError(f'Нет котировок до {dates[positions < 0][0].date()}')
+        resolved = pd.DatetimeIndex(trading_dates[positions])
+        prices = pd.DataFrame(self.prices.values[positions], index=dates, columns=self.prices.columns)
+        rolled_back = resolved != dates
+        report = pd.Series(resolved[rolled_back], index=dates[rolled_back], name=TRADING_DATE)
+        return prices, report
+
+    def value_history(self, start: str = None, end: str = None):
+        """История стоимости отдельных позиций и портфеля при неизменном количестве лотов и денежных средств.
+
+        Рассчитывается одним матричным произведением ряда цен, в котором пропуски заменены последними предыдущими
+        значениями, на количество акций. До начала торгов какой-либо из бумаг стоимость портфеля не определена.
+
+        Parameters
+        ----------
+        start
+            Начальная дата - по умолчанию с начала истории котировок.
+        end
+            Конечная дата - по умолчанию до конца истории котировок.
+
+        Returns
+        -------
+        pandas.DataFrame
+            В строках торговые даты, в столбцах тикеры, CASH и PORTFOLIO.
+        """
+        prices = self.prices.loc[start:end]
+        amount = self._lot_size[:-2] * self._lots[:-2]
+        cash = self._lots[-2]
+        values = np.empty((len(prices), len(self._index)))
+        values[:, :-2] = prices.values * amount
+        values[:, -2] = cash
+        values[:, -1] = prices.values @ amount + cash
+        return pd.DataFrame(values, index=prices.index, columns=self._index)
+
+    def weight_history(self, start: str = None, end: str = None):
+        """История долей отдельных позиций в портфеле при неизменном количестве лотов и денежных средств.
+
+        Параметры и формат результата аналогичны value_history.
+        """
+        values = self.value_history(start, end)
+        return values.div(values[PORTFOLIO], axis='index')
+
+    def _series(self, values, name=None):
+        """Формирует pandas.Series с копией данных массива."""
+        return pd.Series(values, index=self._index, name=name, copy=True)
+
+    @property
+    def df(self):
+        """Все метрики портфеля - DataFrame формируется по запросу"""
+        data = dict(zip(self._COLUMNS, [self._lot_size, self._lots, self._price, self._value, self._weight]))
+        return pd.DataFrame(data, index=self._index, columns=self._COLUMNS)
 
     @property
     def index(self):
         """Тикеров, кэш и портфель"""
-        return self._df.index
+        return self._index
 
     @property
     def lot_size(self):
         """Размер лотов"""
-        return self._df[LOT_SIZE]
+        return self._series(self._lot_size, LOT_SIZE)
 
     @property
     def lots(self):
         """Количество лотов"""
-        return self._df[LOTS]
+        return self._series(self._lots, LOTS)
 
     @property
     def amount(self):
         """Количество акций"""
-        return self._df[[LOT_SIZE, LOTS]].prod(axis=1)
+        return self._series(self._lot_size * self._lots)
 
     @property
     def price(self):
         """Цены акций на отчетную дату"""
-        return self._df[PRICE]
+        return self._series(self._price, PRICE)
 
     @property
     def value(self):
         """Стоимость отдельных позиций"""
-        return self._df[VALUE]
+        return self._series(self._value, VALUE)
 
     @property
     def weight(self):
         """Доля в стоимости портфеля отдельных позиций"""
-        return self._df[WEIGHT]
+        return self._series(self._weight, WEIGHT)
 
 
 if __name__ == '__main__':
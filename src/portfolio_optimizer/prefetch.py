@@ -0,0 +1,142 @@
+"""Предварительная загрузка всех данных, необходимых для расчета метрик и оптимизации портфеля.
+
+Построение Optimizer загружает данные последовательно по мере необходимости: информацию о бумагах и котировки в
+Portfolio, legacy dividends и CPI в DividendsMetrics. Планировщик заранее определяет все необходимые наборы данных,
+параллельно загружает их одной волной и возвращает снимок данных в памяти, который передается в Portfolio:
+
+    data = prefetch(tickers)
+    portfolio = Portfolio(date, cash, positions, data=data)
+    optimizer = Optimizer(portfolio)
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from portfolio_optimizer import getter
+from portfolio_optimizer.getter import local_quotes
+from portfolio_optimizer.settings import CLOSE_PRICE
+
+# Количество параллельных загрузок
+MAX_WORKERS = 8
+
+SECURITY_INFO = 'security_info'
+QUOTES = 'quotes'
+LEGACY_DIVIDENDS = 'legacy_dividends'
+CPI = 'cpi'
+
+
+class MarketData:
+    """Снимок рыночных данных в памяти с интерфейсом функций пакета getter.
+
+    Используется вместо пакета getter в Portfolio и метриках портфеля, поэтому возвращает данные в точно таком же виде,
+    как соответствующие функции getter, но без обращения к файлам и интернету.
+    """
+
+    def __init__(self, security_info: pd.DataFrame, prices: dict, legacy_dividends: pd.DataFrame, cpi: pd.Series):
+        self._security_info = security_info
+        self._prices = prices
+        self._legacy_dividends = legacy_dividends
+        self._cpi = cpi
+        self._version = None
+
+    @property
+    def tickers(self):
+        """Тикеры, для которых загружены данные"""
+        return sorted(self._prices)
+
+    @property
+    def version(self):
+        """Хэш содержимого снимка - меняется при любом изменении данных"""
+        if self._version is None:
+            frames = [self._security_info, self._legacy_dividends, self._cpi]
+            frames.extend(self._prices[ticker] for ticker in self.tickers)
+            digest = hashlib.sha256(repr(self.tickers).encode())
+            for frame in frames:
+                if isinstance(frame, pd.DataFrame):
+                    digest.update(repr(list(frame.columns)).encode())
+                digest.update(pd.util.hash_pandas_object(frame).values.tobytes())
+            self._version = digest.hexdigest()
+        return self._version
+
+    def extend(self, other):
+        """Новый снимок с данными этого снимка, дополненными тикерами другого снимка, которых в нем нет.
+
+        Данные уже загруженных тикеров, а так же CPI берутся из этого снимка.
+        """
+        new = [ticker for ticker in other.tickers if ticker not in self._prices]
+        prices = dict(self._prices)
+        prices.update((ticker, other._prices[ticker]) for ticker in new)
+        return MarketData(security_info=pd.concat([self._security_info, other._security_info.loc[new]]),
+                          prices=prices,
+                          legacy_dividends=pd.concat([self._legacy_dividends, other._legacy_dividends[new]], axis=1),
+                          cpi=self._cpi)
+
+    def security_info(self, tickers: list):
+        """Информация о бумагах - аналог getter.security_info"""
+        return self._security_info.loc[tickers]
+
+    def prices_history(self, tickers: list):
+        """История цен закрытия - аналог getter.prices_history"""
+        df = pd.concat([self._prices[ticker] for ticker in tickers], axis=1)
+        df.columns = tickers
+        return df
+
+    def legacy_dividends(self, tickers: list):
+        """Годовые дивиденды - аналог getter.legacy_dividends"""
+        return self._legacy_dividends[tickers]
+
+    def cpi(self):
+        """Месячная инфляция - аналог getter.cpi"""
+        return self._cpi
+
+
+def plan(tickers: list):
+    """
+    Формирует перечень наборов данных, необходимых для построения Optimizer для портфеля из заданных тикеров.
+
+    Parameters
+    ----------
+    tickers
+        Тикеры портфеля.
+
+    Returns
+    -------
+    list of tuple
+        Задачи загрузки - набор данных, тикер или None, функция загрузки и ее аргументы.
+    """
+    tickers = sorted(tickers)
+    tasks = [(SECURITY_INFO, None, getter.security_info, (tickers,)),
+             (LEGACY_DIVIDENDS, None, getter.legacy_dividends, (tickers,)),
+             (CPI, None, getter.cpi, ())]
+    for ticker in tickers:
+        tasks.append((QUOTES, ticker, local_quotes.get_quotes_history, (ticker,)))
+    return tasks
+
+
+def prefetch(tickers: list, max_workers: int = MAX_WORKERS):
+    """
+    Параллельно загружает все данные, необходимые для построения Optimizer для портфеля из заданных тикеров.
+
+    Parameters
+    ----------
+    tickers
+        Тикеры портфеля.
+    max_workers
+        Количество параллельных загрузок.
+
+    Returns
+    -------
+    MarketData
+        Снимок данных в памяти, который можно передать в Portfolio.
+    """
+    tasks = plan(tickers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(dataset, ticker, executor.submit(func, *args)) for dataset, ticker, func, args in tasks]
+        results = {(dataset, ticker): future.result() for dataset, ticker, future in futures}
+    prices = {ticker: results[QUOTES, ticker][CLOSE_PRICE] for ticker in sorted(tickers)}
+    return MarketData(security_info=results[SECURITY_INFO, None],
+                      prices=prices,
+                      legacy_dividends=results[LEGACY_DIVIDENDS, None],
+                      cpi=results[CPI, None])
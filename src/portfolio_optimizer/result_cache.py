@@ -0,0 +1,149 @@
+"""Дисковый кэш результатов оптимизации портфеля.
+
+Optimizer со всеми рассчитанными метриками портфеля, доходности и дивидендов сохраняется в двоичном формате pickle
+под ключом - хэшем позиций, денежных средств, даты, параметров модели и версий входных данных. Повторный запрос с
+теми же параметрами загружает готовые результаты, а любое обновление данных автоматически меняет ключ:
+
+    optimizer = get_optimizer(date, cash, positions)
+
+Версии данных для пакета getter определяются по времени изменения и размеру локальных файлов, поэтому для
+формирования ключа данные не загружаются. Для снимка prefetch.MarketData используется хэш его содержимого.
+
+Размер кэша ограничен MAX_CACHE_SIZE - при превышении удаляются давно не использовавшиеся результаты.
+"""
+
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+from portfolio_optimizer import getter, optimizer, returns_metrics, settings
+from portfolio_optimizer.getter import storage
+from portfolio_optimizer.optimizer import Optimizer
+from portfolio_optimizer.portfolio import Portfolio
+
+CACHE_FOLDER = 'cache'
+CACHE_SUFFIX = '.pickle'
+# Максимальный размер кэша в байтах
+MAX_CACHE_SIZE = 200 * 2 ** 20
+
+# Идентификатор источника данных в pickle - сам источник не сохраняется и подставляется при загрузке
+DATA_ID = 'data'
+
+
+def _parameters():
+    """Параметры модели, влияющие на результаты расчетов."""
+    return (settings.T_SCORE,
+            settings.AFTER_TAX,
+            returns_metrics.BOUNDS,
+            returns_metrics.BRACKET,
+            returns_metrics.SAMPLE_DROP_OUT,
+            optimizer.MAX_TRADE)
+
+
+def data_version(data, tickers: list):
+    """Версия входных данных для набора тикеров.
+
+    Parameters
+    ----------
+    data
+        Модуль getter или снимок prefetch.MarketData.
+    tickers
+        Тикеры портфеля.
+
+    Returns
+    -------
+    tuple or str
+        Для getter - время изменения и размер локальных файлов с данными, для снимка - хэш его содержимого.
+    """
+    if data is not getter:
+        return data.version
+    return getter.data_version(tickers)
+
+
+def make_key(date, cash: float, positions: dict, data=getter):
+    """Ключ кэша - хэш позиций, денежных средств, даты, параметров модели и версий входных данных."""
+    lots = tuple(sorted((ticker, float(value)) for ticker, value in positions.items()))
+    key = (str(pd.to_datetime(date).date()), float(cash), lots, _parameters(), data_version(data, list(positions)))
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+class _Pickler(pickle.Pickler):
+    """Сохраняет ссылку на источник данных вместо самих данных."""
+
+    def __init__(self, file, data):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._data = data
+
+    def persistent_id(self, obj):
+        if obj is self._data:
+            return DATA_ID
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """Подставляет текущий источник данных."""
+
+    def __init__(self, file, data):
+        super().__init__(file)
+        self._data = data
+
+    def persistent_load(self, pid):
+        if pid == DATA_ID:
+            return self._data
+        raise pickle.UnpicklingError(f'Неизвестная ссылка {pid}')
+
+
+def _trim(folder, max_size):
+    """Удаляет давно не использовавшиеся результаты, пока размер кэша превышает max_size."""
+    files = [(path.stat().st_mtime, path.stat().st_size, path) for path in folder.glob(f'*{CACHE_SUFFIX}')]
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files, key=lambda x: x[0]):
+        if total <= max_size:
+            break
+        path.unlink()
+        total -= size
+
+
+def get_optimizer(date, cash: float, positions: dict, data=None, max_size: int = MAX_CACHE_SIZE):
+    """
+    Возвращает Optimizer с рассчитанными метриками из кэша или рассчитывает и сохраняет его.
+
+    Parameters
+    ----------
+    date
+        Дата портфеля.
+    cash
+        Денежные средства.
+    positions
+        Словарь с количеством лотов для тикеров.
+    data
+        Источник данных - по умолчанию пакет getter.
+    max_size
+        Максимальный размер кэша в байтах.
+
+    Returns
+    -------
+    Optimizer
+        Оптимизатор, метрики портфеля, доходности и дивидендов которого уже рассчитаны.
+    """
+    data = getter if data is None else data
+    path = storage.make_data_path(CACHE_FOLDER, f'{make_key(date, cash, positions, data)}{CACHE_SUFFIX}')
+    if path.exists():
+        # Обновление времени изменения отмечает использование результата для вытеснения давно не использовавшихся
+        os.utime(str(path))
+        with path.open('rb') as file:
+            return _Unpickler(file, data).load()
+    result = Optimizer(Portfolio(date=date, cash=cash, positions=positions, data=data))
+    for item in (result, result.returns, result.dividends):
+        str(item)
+    # Загрузка данных может обновить локальные файлы, поэтому результат сохраняется под ключом их новых версий
+    path = storage.make_data_path(CACHE_FOLDER, f'{make_key(date, cash, positions, data)}{CACHE_SUFFIX}')
+    storage.make_folder(path)
+    temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with temp_path.open('wb') as file:
+        _Pickler(file, data).dump(result)
+    os.replace(str(temp_path), str(path))
+    _trim(path.parent, max_size)
+    return result
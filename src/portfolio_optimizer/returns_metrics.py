@@ -1,8 +1,17 @@
 """Реализация основных метрик доходности"""
 
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-from scipy import optimize, stats
+from scipy import optimize
 
+from portfolio_optimizer import ewm, lazy
+from portfolio_optimizer.getter import storage
 from portfolio_optimizer.portfolio import Portfolio
 from portfolio_optimizer.settings import PORTFOLIO, T_SCORE, CASH
 
@@ -12,16 +21,226 @@ BOUNDS = (0.0, 1.0)
 BRACKET = (0.86, 0.88)
 # Сколько процентов данных отбрасывается при оптимизации llh, чтобы экспоненциальное сглаживание стабилизировалось
 SAMPLE_DROP_OUT = 0.20
+# Количество значений константы сглаживания в сетке для грубого поиска максимума llh
+GRID_SIZE = 99
+# Точность и максимальное количество итераций метода Ньютона при подборе константы сглаживания
+NEWTON_TOLERANCE = 1e-10
+MAX_ITERATIONS = 20
+# Подкаталог для сохраняемого состояния экспоненциального сглаживания
+EWM_STATE_FOLDER = 'ewm_state'
+# Префикс файлов состояния сглаживания и их максимальное количество - хранится по файлу на набор тикеров
+MOMENTS_PREFIX = 'moments_'
+MAX_MOMENTS_FILES = 100
+# Файл с подобранными константами сглаживания и их максимальное количество
+DECAY_CACHE_FILE = 'decays.pickle'
+MAX_CACHED_DECAYS = 1000
+# Ожидаемый прирост llh от уточнения, при котором сохраненная константа сглаживания используется без подбора
+LLH_TOLERANCE = 1e-3
+# Файлы состояния сглаживания и констант общие для всех портфелей - блокировка исключает потерю записей при
+# одновременном чтении, изменении и сохранении из разных потоков
+_LOCK = threading.Lock()
+# Основные метрики доходности
+METRICS = ['MEAN', 'STD', 'BETA', 'DRAW_DOWN', 'GRADIENT']
+
+
+def monthly_positions(index: pd.DatetimeIndex, date: pd.Timestamp):
+    """Номера дат индекса с шагом в месяц, заканчивающихся датой портфеля
+
+    Для каждого месяца, начиная с даты портфеля и двигаясь назад, выбирается последняя дата не позже того же дня
+    месяца. Если в течение месяца нет торгов, то выбирается первая более ранняя дата, а дальнейший отсчет продолжается
+    от нее, поэтому даты не повторяются. Номер дня сохраняется даже для более коротких месяцев - 31 число означает
+    конец любого месяца.
+
+    Даты сравниваются как числа вида ГГГГММДД, поэтому все месяцы находятся одним searchsorted
+
+    Parameters
+    ----------
+    index
+        Упорядоченный по возрастанию индекс дат.
+    date
+        Дата портфеля.
+
+    Returns
+    -------
+    numpy.ndarray
+        Возрастающие номера выбранных дат.
+    """
+    if len(index) == 0:
+        return np.array([], dtype=int)
+    keys = np.asarray(index.year * 10000 + index.month * 100 + index.day)
+    first = index[0]
+    last_month = date.year * 12 + date.month - 1
+    count = max(last_month - (first.year * 12 + first.month - 1) + 1, 0)
+    months = last_month - np.arange(count)
+    anchors = (months // 12) * 10000 + (months % 12 + 1) * 100 + date.day
+    positions = np.searchsorted(keys, anchors, side='right') - 1
+    # Каждая следующая дата должна быть раньше предыдущей - q[k] = min(p[k], q[k - 1] - 1)
+    steps = np.arange(count)
+    positions = np.minimum.accumulate(positions + steps) - steps
+    return positions[positions >= 0][::-1]
+
+
+def _moments_path(columns: list):
+    """Путь к сохраненному состоянию сглаживания для набора тикеров"""
+    key = hashlib.sha256(repr(list(columns)).encode()).hexdigest()
+    return storage.make_data_path(EWM_STATE_FOLDER, f'{MOMENTS_PREFIX}{key}.pickle')
+
+
+def _decay_key(tickers: list, month: str, weight: np.ndarray):
+    """Ключ константы сглаживания - хэш тикеров, месяца и долей активов"""
+    return hashlib.sha256(repr((list(tickers), month, np.round(weight, 6).tolist())).encode()).hexdigest()
+
+
+def _read_decays():
+    """Сохраненные константы сглаживания - словарь ключ: (тикеры, месяц, доли, константа)"""
+    path = storage.make_data_path(EWM_STATE_FOLDER, DECAY_CACHE_FILE)
+    if not path.exists():
+        return OrderedDict()
+    with path.open('rb') as file:
+        return pickle.load(file)
+
+
+def _cached_decay(tickers: list, month: str, weight: np.ndarray):
+    """Сохраненная константа сглаживания для портфеля или ближайшего по долям портфеля с теми же тикерами"""
+    decays = _read_decays()
+    record = decays.get(_decay_key(tickers, month, weight))
+    if record is None:
+        candidates = [record for record in decays.values() if record[0] == list(tickers)]
+        if not candidates:
+            return None
+        # При равном расстоянии выбирается сохраненная последней
+        record = min(reversed(candidates), key=lambda x: np.abs(x[2] - weight).sum())
+    return record[3]
+
+
+def _dump(value, path):
+    """Сохраняет значение во временный файл и атомарно заменяет им файл path
+
+    Имя временного файла уникально для процесса и потока, поэтому параллельные записи не портят друг друга, а
+    читатели видят либо старую, либо новую версию файла
+    """
+    storage.make_folder(path)
+    temp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    with temp_path.open('wb') as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(str(temp_path), str(path))
+
+
+def _save_decay(tickers: list, month: str, weight: np.ndarray, decay: float):
+    """Сохраняет константу сглаживания, вытесняя самые старые при превышении MAX_CACHED_DECAYS
+
+    Чтение, изменение и сохранение файла выполняются под блокировкой, поэтому константы, одновременно сохраняемые
+    разными потоками, не теряются
+    """
+    key = _decay_key(tickers, month, weight)
+    with _LOCK:
+        decays = _read_decays()
+        decays.pop(key, None)
+        decays[key] = list(tickers), month, weight, decay
+        while len(decays) > MAX_CACHED_DECAYS:
+            decays.popitem(last=False)
+        _dump(decays, storage.make_data_path(EWM_STATE_FOLDER, DECAY_CACHE_FILE))
+
+
+def _load_moments(asset_returns: pd.DataFrame, decay: float):
+    """Сохраненное состояние сглаживания с той же константой для начала истории доходностей или новое"""
+    path = _moments_path(asset_returns.columns)
+    if path.exists():
+        # Обновление времени изменения отмечает использование состояния для вытеснения давно не использовавшихся
+        os.utime(str(path))
+        with path.open('rb') as file:
+            moments = pickle.load(file)
+        if moments.decay == decay and moments.matches(asset_returns):
+            return moments
+    return ewm.OnlineMoments(decay, asset_returns.columns)
+
+
+def _save_moments(moments: ewm.OnlineMoments):
+    """Сохраняет состояние сглаживания вместо предыдущего для того же набора тикеров
+
+    При превышении MAX_MOMENTS_FILES удаляются давно не использовавшиеся состояния
+    """
+    path = _moments_path(moments.columns)
+    with _LOCK:
+        _dump(moments, path)
+        files = sorted(path.parent.glob(f'{MOMENTS_PREFIX}*.pickle'), key=lambda x: x.stat().st_mtime)
+        for old_path in files[:-MAX_MOMENTS_FILES]:
+            old_path.unlink()
+
+
+def expected_draw_down(mean: pd.Series, std: pd.Series):
+    """Ожидаемый draw down по ожидаемой доходности и СКО - Series для одной даты или DataFrame с датами в строках"""
+    draw_down = - (T_SCORE * std) ** 2 / (4 * mean)
+    # Если ожидаемая доходность меньше нуля, то потеряется весь капитал
+    draw_down[mean < 0] = -1
+    # Для потери нулевые
+    draw_down[CASH] = 0
+    return draw_down
+
+
+def lower_bound_gradient(mean: pd.Series, std: pd.Series, beta: pd.Series):
+    """Производная нижней границы портфеля по доле актива по ожидаемой доходности, СКО и бете
+
+    Метрики могут быть Series для одной даты или DataFrame с датами в строках
+    """
+    std_p = std[PORTFOLIO]
+    mean_p = mean[PORTFOLIO]
+    # Операции по строкам позволяют рассчитывать градиент и для DataFrame с динамикой метрик по датам
+    spread = mean.sub(mean_p, axis=0).sub((beta - 1).mul(2 * mean_p, axis=0))
+    return spread.mul((T_SCORE / 2) ** 2 * (std_p / mean_p) ** 2, axis=0)
+
+
+def newton_decay(llh_derivatives, decay: float, bounds: tuple):
+    """Минимум -llh по константе сглаживания методом Ньютона или None, если метод не сошелся в интервале bounds
+
+    llh_derivatives возвращает -llh и его первую и вторую производные по константе сглаживания для массива констант
+    """
+    for _ in range(MAX_ITERATIONS):
+        _, gradient, curvature = llh_derivatives(decay)
+        if not curvature[0] > 0:
+            return None
+        step = gradient[0] / curvature[0]
+        decay -= step
+        if not bounds[0] < decay < bounds[1]:
+            return None
+        if abs(step) < NEWTON_TOLERANCE:
+            return decay
+    return None
 
 
 class ReturnsMetrics:
-    """Метрики доходности рассчитываются на дату формирования портфеля для месячных таймфреймов"""
+    """Метрики доходности рассчитываются на дату формирования портфеля для месячных таймфреймов
+
+    Метрики читают текущее состояние портфеля при каждом обращении, поэтому после изменения портфеля методами
+    set_lots, set_cash, add_ticker или remove_ticker пересчитываются только показатели, зависящие от весов. Месячные
+    доходности отдельных активов кэшируются по тикерам и рассчитываются только для новых позиций
+
+    Если константа сглаживания передана при создании, то она не подбирается методом максимального правдоподобия
+
+    Сглаженные средние и ковариации доходностей активов рассчитываются рекурсивно. При persist=True их достаточные
+    статистики сохраняются на диск вместе с последним обработанным месяцем и константой сглаживания, а при следующем
+    расчете с той же константой в них добавляются только новые месячные доходности. Для набора тикеров хранится только
+    последнее состояние, а количество наборов ограничено MAX_MOMENTS_FILES
 
-    def __init__(self, portfolio: Portfolio):
+    При persist=True на диске сохраняются и подобранные константы сглаживания. Константа для того же или ближайшего
+    по долям портфеля с теми же тикерами используется без подбора, если ожидаемый прирост llh от ее уточнения меньше
+    LLH_TOLERANCE, а иначе служит начальной точкой подбора. Флаг refit принудительно подбирает константу заново
+    """
+
+    def __init__(self, portfolio: Portfolio, decay: float = None, persist: bool = False, refit: bool = False):
         self._portfolio = portfolio
-        self._tickers = portfolio.index[:-2]
-        self._decay = None
-        self.fit()
+        self._decay = decay
+        self._persist = persist
+        self._monthly_index = None
+        self._data_version = None
+        self._monthly_dates_cache = None
+        self._asset_returns = dict()
+        self._moments_cache = dict()
+        if decay is None:
+            if persist:
+                self._fit_cached(refit)
+            else:
+                self.fit()
 
     def __str__(self):
         frames = [self.mean,
@@ -29,42 +248,76 @@ class ReturnsMetrics:
                   self.beta,
                   self.draw_down,
                   self.gradient]
-        columns = ['MEAN', 'STD', 'BETA', 'DRAW_DOWN', 'GRADIENT']
         df = pd.concat(frames, axis=1)
-        df.columns = columns
+        df.columns = METRICS
         return (f'\nКЛЮЧЕВЫЕ МЕТРИКИ ДОХОДНОСТИ'
                 f'\n\nКонстанта сглаживания - {self._decay:.4f}:\n\n{df}')
 
+    def input_version(self, name: str):
+        """Версия входа графа метрик - константа сглаживания или версии данных портфеля"""
+        if name == lazy.DECAY:
+            return self._decay
+        return self._portfolio.version(name)
+
     @property
+    def _tickers(self):
+        """Тикеры портфеля"""
+        return self._portfolio.index[:-2]
+
+    def _monthly_dates(self):
+        """Даты с шагом в месяц, заканчивающиеся датой портфеля
+
+        Кэшируются до изменения индекса цен или даты портфеля
+        """
+        index = self._portfolio.prices.index
+        date = self._portfolio.date
+        if self._monthly_dates_cache is not None:
+            cached_index, cached_date, dates = self._monthly_dates_cache
+            if cached_index is index and cached_date == date:
+                return dates
+        dates = index[monthly_positions(index, date)]
+        self._monthly_dates_cache = index, date, dates
+        return dates
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def monthly_prices(self):
         """Формирует DataFrame цен с шагом в месяц
 
         Эти ряды цен служат для расчета всех дальнейших показателей
         """
-        prices = self._portfolio.prices
-        date_tuple = self._portfolio.date.timetuple()[:3]
-        reversed_index = []
-        for date in reversed(prices.index):
-            if date_tuple < date.timetuple()[:3]:
-                continue
-            else:
-                reversed_index.append(date)
-                if date_tuple[1] != 1:
-                    date_tuple = date_tuple[0], date_tuple[1] - 1, date_tuple[2]
-                else:
-                    date_tuple = date_tuple[0] - 1, 12, date_tuple[2]
-        return prices.loc[reversed(reversed_index)]
+        return self._portfolio.prices.loc[self._monthly_dates()]
 
-    @property
+    def _cached_asset_returns(self):
+        """Месячные доходности отдельных активов
+
+        Доходности кэшируются по тикерам и сбрасываются при изменении месячных дат или данных портфеля
+        """
+        monthly_index = self._monthly_dates()
+        data_version = self._portfolio.version(lazy.DATA)
+        if (self._monthly_index is None or not self._monthly_index.equals(monthly_index)
+                or self._data_version != data_version):
+            self._monthly_index = monthly_index
+            self._data_version = data_version
+            self._asset_returns = dict()
+            self._moments_cache = dict()
+        tickers = list(self._tickers)
+        missing = [ticker for ticker in tickers if ticker not in self._asset_returns]
+        if missing:
+            returns = self._portfolio.prices.loc[monthly_index, missing].pct_change()
+            # Для первого периода доходность отсутствует
+            returns = returns.iloc[1:]
+            for ticker in missing:
+                self._asset_returns[ticker] = returns[ticker]
+        return pd.DataFrame({ticker: self._asset_returns[ticker] for ticker in tickers}, columns=tickers)
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
     def returns(self):
         """Доходности составляющих портфеля и самого портфеля
 
         Доходность кэша - ноль
         Доходность портфеля рассчитывается на основе долей на отчетную дату портфеля
         """
-        returns = self.monthly_prices.pct_change()
-        # Для первого периода доходность отсутствует
-        returns = returns.iloc[1:]
+        returns = self._cached_asset_returns()
         returns = returns.reindex(columns=self._portfolio.index)
         returns = returns.fillna(0)
         weight = self._portfolio.weight[self._tickers].transpose()
@@ -72,35 +325,122 @@ class ReturnsMetrics:
         return returns
 
     def fit(self):
-        """Осуществляет поиск константы сглаживания методом максимального правдоподобия"""
-        result = optimize.minimize_scalar(self._llh,
-                                          bracket=BRACKET,
-                                          bounds=BOUNDS,
-                                          method='Bounded')
-        if result.success:
-            decay = result.x
-            if BRACKET[0] < decay < BRACKET[1]:
-                self._decay = decay
-            else:
-                raise ValueError(f'Константа сглаживания {decay} вне интервала {BRACKET}')
+        """Осуществляет поиск константы сглаживания методом максимального правдоподобия
+
+        Используется метод Ньютона с аналитическими производными llh. Если константа сглаживания уже известна, то
+        поиск начинается с нее. Иначе или если метод не сошелся llh рассчитывается сразу для сетки значений, и поиск
+        начинается с лучшего узла сетки в интервале между соседними узлами. В крайнем случае максимум в этом интервале
+        ищется без использования производных
+        """
+        decay = None
+        if self._decay is not None and BOUNDS[0] < self._decay < BOUNDS[1]:
+            decay = self._newton(self._decay, BOUNDS)
+        if decay is None:
+            grid = np.linspace(*BOUNDS, GRID_SIZE + 2)[1:-1]
+            profile = self._llh(grid)
+            if np.isnan(profile).all():
+                raise ValueError('Оптимальная константа сглаживания не найдена')
+            best = np.nanargmin(profile)
+            bounds = (grid[best - 1] if best > 0 else BOUNDS[0],
+                      grid[best + 1] if best < GRID_SIZE - 1 else BOUNDS[1])
+            decay = self._newton(grid[best], bounds)
+            if decay is None:
+                result = optimize.minimize_scalar(lambda value: self._llh(value)[0],
+                                                  bounds=bounds,
+                                                  method='Bounded')
+                if not result.success:
+                    raise ValueError('Оптимальная константа сглаживания не найдена')
+                decay = result.x
+        if BRACKET[0] < decay < BRACKET[1]:
+            self._decay = decay
         else:
-            raise ValueError('Оптимальная константа сглаживания не найдена')
+            raise ValueError(f'Константа сглаживания {decay} вне интервала {BRACKET}')
+
+    def _fit_cached(self, refit: bool):
+        """Использует сохраненную константу сглаживания или подбирает и сохраняет новую"""
+        tickers = list(self._tickers)
+        month = str(self._portfolio.date)[:7]
+        weight = self._portfolio.weight[self._tickers].values
+        if not refit:
+            self._decay = _cached_decay(tickers, month, weight)
+            if self._decay is not None:
+                _, gradient, curvature = self._llh_derivatives(self._decay)
+                # Ожидаемый прирост llh от шага метода Ньютона
+                if curvature[0] > 0 and gradient[0] ** 2 / (2 * curvature[0]) < LLH_TOLERANCE:
+                    return
+        self.fit()
+        _save_decay(tickers, month, weight, self._decay)
+
+    def _newton(self, decay: float, bounds: tuple):
+        """Минимум -llh методом Ньютона или None, если метод не сошелся в интервале bounds"""
+        return newton_decay(self._llh_derivatives, decay, bounds)
 
-    def _llh(self, decay: float):
-        """-llh для портфеля с отброшенными константами
+    def _moments(self, decay: float):
+        """Достаточные статистики экспоненциального сглаживания доходностей активов
+
+        Кэшируются по константе сглаживания и набору тикеров до изменения месячных дат, поэтому не пересчитываются при
+        изменении весов
+        """
+        # Доходность до начала торгов активом, как и в returns, считается нулевой
+        asset_returns = self._cached_asset_returns().fillna(0)
+        key = decay, tuple(asset_returns.columns)
+        if key not in self._moments_cache:
+            if self._persist:
+                moments = _load_moments(asset_returns, decay)
+                last_date = moments.last_date
+                moments.fold(asset_returns)
+                if moments.last_date != last_date:
+                    _save_moments(moments)
+            else:
+                moments = ewm.OnlineMoments(decay, asset_returns.columns)
+                moments.fold(asset_returns)
+            self._moments_cache[key] = moments
+        return self._moments_cache[key]
+
+    def _portfolio_statistics(self, assets: pd.Series, portfolio: float):
+        """Дополняет статистики активов значением для кэша и портфеля"""
+        statistics = assets.reindex(self._portfolio.index).fillna(0)
+        statistics[PORTFOLIO] = portfolio
+        statistics.name = self._monthly_index[-1]
+        return statistics
+
+    def _weighted_metrics(self, weight: pd.Series):
+        """Ожидаемая доходность, СКО и бета отдельных позиций и портфеля с заданными долями активов"""
+        moments = self._moments(self.decay)
+        asset_mean = moments.mean
+        cov = moments.cov
+        cov_p = cov @ weight
+        var_p = weight @ cov_p
+        mean = self._portfolio_statistics(asset_mean, asset_mean @ weight)
+        std = self._portfolio_statistics(pd.Series(np.diag(cov) ** 0.5, index=cov.index), var_p ** 0.5)
+        beta = self._portfolio_statistics(cov_p / var_p, 1.0)
+        return mean, std, beta
+
+    def _llh(self, decays):
+        """-llh для портфеля с отброшенными константами для одного или массива значений константы сглаживания
 
         Используется экспоненциальное сглаживание и предположение нормальности
         """
-        ewm = self.returns[PORTFOLIO].ewm(alpha=1 - decay)
-        std = ewm.std()
-        mean = ewm.mean()
-        x = self.returns[PORTFOLIO].shift(periods=-1)
-        start = int(len(mean) * SAMPLE_DROP_OUT)
-        # Первые значения отбрасываются для стабилизации сглаживания, а для последнего значения нет llh
-        llh = stats.norm.logpdf(x.iloc[start:-1],
-                                mean.iloc[start:-1],
-                                std.iloc[start:-1])
-        return - llh.sum()
+        x = self.returns[PORTFOLIO].values
+        # Первые значения отбрасываются для стабилизации сглаживания
+        start = int(len(x) * SAMPLE_DROP_OUT)
+        return ewm.neg_llh(x, decays, start)
+
+    def _llh_derivatives(self, decays):
+        """-llh для портфеля и его первая и вторая производные по константе сглаживания"""
+        x = self.returns[PORTFOLIO].values
+        start = int(len(x) * SAMPLE_DROP_OUT)
+        return ewm.neg_llh_derivatives(x, decays, start)
+
+    def llh_profile(self, decays=None):
+        """Профиль логарифма функции правдоподобия портфеля по константе сглаживания
+
+        По умолчанию рассчитывается для сетки из GRID_SIZE значений, используемой при подборе константы
+        """
+        if decays is None:
+            decays = np.linspace(*BOUNDS, GRID_SIZE + 2)[1:-1]
+        decays = np.atleast_1d(decays)
+        return pd.Series(-self._llh(decays), index=decays)
 
     @property
     def decay(self):
@@ -111,34 +451,66 @@ class ReturnsMetrics:
         необязательный характер"""
         return self._decay
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def decay_std_error(self):
+        """Стандартная ошибка константы сглаживания
+
+        Оценивается по второй производной llh в точке максимума - наблюдаемой информации Фишера
+        """
+        _, _, curvature = self._llh_derivatives(self.decay)
+        return 1 / np.sqrt(curvature[0])
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def asset_decays(self):
+        """Константы сглаживания, подобранные отдельно для каждого актива, и константа портфеля
+
+        Константы всех активов подбираются одновременно методом максимального правдоподобия. Для каждого актива
+        отбрасывается SAMPLE_DROP_OUT его собственной истории торгов. Если llh актива не определен, например, из-за
+        нулевой доходности, или его максимум на сетке достигается на границе BOUNDS, то значение равно nan.
+        Ограничение BRACKET к активам не применяется
+        """
+        asset_returns = self._cached_asset_returns().fillna(0)
+        x = asset_returns.values
+        # Доходность до начала торгов активом нулевая, поэтому его история начинается с первой ненулевой доходности
+        listed = (x != 0).argmax(axis=0)
+        start = listed + ((len(x) - listed) * SAMPLE_DROP_OUT).astype(int)
+        grid = np.linspace(*BOUNDS, GRID_SIZE + 2)[1:-1]
+        decays = pd.Series(ewm.fit_decays(x, start, grid), index=asset_returns.columns)
+        decays[PORTFOLIO] = self.decay
+        decays.name = self._monthly_index[-1]
+        return decays
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def mean(self):
         """Ожидаемая доходность отдельных позиций и портфеля
 
         Используется простой процесс экспоненциального сглаживания
         """
-        return self.returns.ewm(alpha=1 - self.decay).mean().iloc[-1]
+        mean, _, _ = self._weighted_metrics(self._portfolio.weight[self._tickers])
+        return mean
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def std(self):
         """СКО отдельных позиций и портфеля
 
-        Используется простой процесс экспоненциального сглаживания
+        Используется простой процесс экспоненциального сглаживания. СКО портфеля рассчитывается по ковариационной
+        матрице активов и их долям в портфеле
         """
-        return self.returns.ewm(alpha=1 - self.decay).std().iloc[-1]
+        _, std, _ = self._weighted_metrics(self._portfolio.weight[self._tickers])
+        return std
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def beta(self):
         """Беты отдельных позиций и портфеля
 
         При расчет беты используется классическая формула cov(r,rp) / var(rp), где r и rp - доходность актива и
-        портфеля, соответственно, при этом используется простой процесс экспоненциального сглаживания
+        портфеля, соответственно, при этом используется простой процесс экспоненциального сглаживания. Ковариации с
+        портфелем равны произведению ковариационной матрицы активов на вектор их долей
         """
-        ewm = self.returns.ewm(alpha=1 - self.decay)
-        ewm_cov = ewm.cov(self.returns[PORTFOLIO])
-        return ewm_cov.multiply(1 / ewm_cov[PORTFOLIO], axis='index').iloc[-1]
+        _, _, beta = self._weighted_metrics(self._portfolio.weight[self._tickers])
+        return beta
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def draw_down(self):
         """Ожидаемый draw down
 
@@ -153,16 +525,9 @@ class ReturnsMetrics:
 
         t-статистика берется из файла настроек
         """
-        std = self.std
-        mean = self.mean
-        draw_down = - (T_SCORE * std) ** 2 / (4 * mean)
-        # Если ожидаемая доходность меньше нуля, то потеряется весь капитал
-        draw_down[mean < 0] = -1
-        # Для потери нулевые
-        draw_down[CASH] = 0
-        return draw_down
+        return expected_draw_down(self.mean, self.std)
 
-    @property
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
     def gradient(self):
         """Производная нижней границы портфеля по доле актива в портфеле
 
@@ -175,11 +540,78 @@ class ReturnsMetrics:
         При правильной реализации взвешенный по долям отдельных позиций градиент равен градиенту по портфелю в целом и
         равен 0
         """
-        std_p = self.std[PORTFOLIO]
-        mean = self.mean
-        mean_p = mean[PORTFOLIO]
-        beta = self.beta
-        return (T_SCORE / 2) ** 2 * (std_p / mean_p) ** 2 * (mean - mean_p - 2 * mean_p * (beta - 1))
+        return lower_bound_gradient(self.mean, self.std, self.beta)
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def cov(self):
+        """Экспоненциально сглаженная ковариационная матрица доходностей активов
+
+        Рассчитывается один раз для константы сглаживания и набора тикеров и не зависит от долей активов
+        """
+        return self._moments(self.decay).cov
+
+    def what_if(self, weight: pd.Series):
+        """Метрики доходности для произвольных долей активов в портфеле
+
+        Рассчитываются по сглаженным средним и ковариационной матрице активов без повторного сглаживания
+
+        Parameters
+        ----------
+        weight
+            Доли активов в стоимости портфеля - отсутствующие тикеры имеют нулевую долю, остаток приходится на кэш.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Ожидаемая доходность, СКО, бета, draw down и градиент для отдельных позиций и портфеля.
+        """
+        weight = weight.reindex(self._tickers).fillna(0)
+        mean, std, beta = self._weighted_metrics(weight)
+        frames = [mean, std, beta, expected_draw_down(mean, std), lower_bound_gradient(mean, std, beta)]
+        df = pd.concat(frames, axis=1)
+        df.columns = METRICS
+        return df
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def history(self):
+        """Динамика метрик доходности по месячным датам при текущих долях активов
+
+        Все значения рассчитываются за один проход экспоненциального сглаживания и на последнюю дату совпадают с
+        текущими метриками. Для первой даты СКО, беты и производные от них метрики не определены
+
+        Returns
+        -------
+        pandas.DataFrame
+            Столбцы - MultiIndex из названий метрик METRICS и позиций портфеля, строки - месячные даты.
+        """
+        asset_returns = self._cached_asset_returns().fillna(0)
+        mean, cov = ewm.moments_history(asset_returns.values, self.decay)
+        weight = self._portfolio.weight[self._tickers].values
+        cov_p = cov @ weight
+        var_p = cov_p @ weight
+        zeros = np.zeros(len(asset_returns))
+
+        def frame(assets, portfolio):
+            """Метрика позиций, кэша и портфеля по датам"""
+            return pd.DataFrame(np.column_stack([assets, zeros, portfolio]),
+                                index=asset_returns.index,
+                                columns=self._portfolio.index)
+
+        mean = frame(mean, mean @ weight)
+        std = frame(np.diagonal(cov, axis1=1, axis2=2) ** 0.5, var_p ** 0.5)
+        # Для первой даты дисперсия не определена
+        with np.errstate(invalid='ignore'):
+            beta = frame(cov_p / var_p[:, None], np.ones(len(var_p)))
+        frames = [mean, std, beta, expected_draw_down(mean, std), lower_bound_gradient(mean, std, beta)]
+        return pd.concat(frames, axis=1, keys=METRICS)
+
+    def history_array(self):
+        """Динамика метрик доходности в виде массива формы (метрики, даты, позиции)
+
+        Порядок метрик соответствует METRICS, дат - индексу history, позиций - индексу портфеля
+        """
+        history = self.history
+        return history.values.reshape(len(history), len(METRICS), -1).transpose(1, 0, 2)
 
 
 if __name__ == '__main__':
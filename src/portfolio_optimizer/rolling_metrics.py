@@ -0,0 +1,169 @@
+"""Метрики доходности для скользящего месячного таймфрейма.
+
+Месячная сетка ReturnsMetrics заканчивается датой портфеля, поэтому метрики зависят от того, на какой день месяца она
+приходится. Скользящий таймфрейм использует сетки для всех торговых дней последнего месяца - смещений - и усредняет
+метрики по ним:
+
+    metrics = RollingReturnsMetrics(portfolio)
+    metrics.mean, metrics.std, metrics.beta, metrics.draw_down, metrics.gradient
+
+Доходности всех смещений формируются одним массивом (смещения, месяцы, активы), а экспоненциальное сглаживание и
+функция правдоподобия рассчитываются для него векторизованно, поэтому расчет ненамного дороже одной сетки. Сетки
+разных смещений обрезаются до одинакового количества месяцев.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import optimize
+
+from portfolio_optimizer import ewm, lazy
+from portfolio_optimizer.portfolio import Portfolio
+from portfolio_optimizer.returns_metrics import (BOUNDS, BRACKET, GRID_SIZE, SAMPLE_DROP_OUT, ReturnsMetrics,
+                                                 expected_draw_down, lower_bound_gradient, monthly_positions,
+                                                 newton_decay)
+from portfolio_optimizer.settings import PORTFOLIO
+
+
+class RollingReturnsMetrics:
+    """Усредненные по смещениям месячной сетки метрики доходности
+
+    Константа сглаживания общая для всех смещений. Если она не передана при создании, то используется константа
+    ReturnsMetrics для сетки, заканчивающейся датой портфеля. Метод fit() подбирает ее по суммарной по смещениям
+    функции правдоподобия
+    """
+
+    def __init__(self, portfolio: Portfolio, decay: float = None):
+        self._portfolio = portfolio
+        self._decay = ReturnsMetrics(portfolio).decay if decay is None else decay
+
+    def input_version(self, name: str):
+        """Версия входа графа метрик - константа сглаживания или версии данных портфеля"""
+        if name == lazy.DECAY:
+            return self._decay
+        return self._portfolio.version(name)
+
+    @property
+    def decay(self):
+        """Константа сглаживания"""
+        return self._decay
+
+    @property
+    def _tickers(self):
+        """Тикеры портфеля"""
+        return self._portfolio.index[:-2]
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
+    def offsets(self):
+        """Даты окончания сеток - торговые дни последнего месяца, начиная с даты портфеля"""
+        index = self._portfolio.prices.index
+        date = pd.Timestamp(self._portfolio.date)
+        dates = index[(index > date - pd.DateOffset(months=1)) & (index <= date)]
+        return dates[::-1]
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA)
+    def asset_returns(self):
+        """Месячные доходности активов для всех смещений - массив формы (смещения, месяцы, активы)
+
+        Доходность до начала торгов активом считается нулевой
+        """
+        prices = self._portfolio.prices
+        positions = [monthly_positions(prices.index, date) for date in self.offsets]
+        months = min(len(position) for position in positions)
+        positions = np.stack([position[len(position) - months:] for position in positions])
+        monthly_prices = prices[self._tickers].values[positions]
+        returns = monthly_prices[:, 1:] / monthly_prices[:, :-1] - 1
+        return np.nan_to_num(returns)
+
+    def _portfolio_returns(self):
+        """Месячные доходности портфеля формы (месяцы, смещения)"""
+        weight = self._portfolio.weight[self._tickers].values
+        return (self.asset_returns @ weight).T
+
+    def _llh(self, decays):
+        """Суммарный по смещениям -llh для одного или массива значений константы сглаживания"""
+        x = self._portfolio_returns()
+        start = int(len(x) * SAMPLE_DROP_OUT)
+        return ewm.neg_llh(x, decays, start).sum(axis=1)
+
+    def _llh_derivatives(self, decays):
+        """Суммарный по смещениям -llh и его первая и вторая производные по константе сглаживания"""
+        x = self._portfolio_returns()
+        start = int(len(x) * SAMPLE_DROP_OUT)
+        return tuple(value.sum(axis=1) for value in ewm.neg_llh_derivatives(x, decays, start))
+
+    def fit(self, bracket: tuple = BRACKET):
+        """Осуществляет поиск константы сглаживания методом максимального правдоподобия
+
+        llh рассчитывается для сетки значений, а максимум уточняется методом Ньютона между соседними с лучшим
+        значением узлами. Если метод не сошелся, то максимум ищется без использования производных. Константа должна
+        находиться в интервале bracket
+        """
+        grid = np.linspace(*BOUNDS, GRID_SIZE + 2)[1:-1]
+        profile = self._llh(grid)
+        if np.isnan(profile).all():
+            raise ValueError('Оптимальная константа сглаживания не найдена')
+        best = np.nanargmin(profile)
+        bounds = (grid[best - 1] if best > 0 else BOUNDS[0],
+                  grid[best + 1] if best < GRID_SIZE - 1 else BOUNDS[1])
+        decay = newton_decay(self._llh_derivatives, grid[best], bounds)
+        if decay is None:
+            result = optimize.minimize_scalar(lambda value: self._llh(value)[0],
+                                              bounds=bounds,
+                                              method='Bounded')
+            if not result.success:
+                raise ValueError('Оптимальная константа сглаживания не найдена')
+            decay = result.x
+        if bracket[0] < decay < bracket[1]:
+            self._decay = decay
+        else:
+            raise ValueError(f'Константа сглаживания {decay} вне интервала {bracket}')
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def _moments(self):
+        """Сглаженные средние и ковариационные матрицы активов для всех смещений"""
+        return ewm.last_moments(np.swapaxes(self.asset_returns, 0, 1), self.decay)
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE, lazy.DATA, lazy.DECAY)
+    def offset_metrics(self):
+        """Ожидаемая доходность, СКО и беты для каждого смещения - массивы формы (смещения, позиции и портфель)
+
+        Порядок позиций соответствует индексу портфеля
+        """
+        mean, cov = self._moments
+        weight = self._portfolio.weight[self._tickers].values
+        cov_p = cov @ weight
+        var_p = cov_p @ weight
+        zeros = np.zeros(len(mean))
+        mean = np.column_stack([mean, zeros, mean @ weight])
+        std = np.column_stack([np.diagonal(cov, axis1=1, axis2=2) ** 0.5, zeros, var_p ** 0.5])
+        beta = np.column_stack([cov_p / var_p[:, None], zeros, np.ones(len(var_p))])
+        return mean, std, beta
+
+    def _average(self, values: np.ndarray):
+        """Среднее по смещениям"""
+        return pd.Series(values.mean(axis=0), index=self._portfolio.index)
+
+    @property
+    def mean(self):
+        """Ожидаемая доходность отдельных позиций и портфеля, усредненная по смещениям"""
+        return self._average(self.offset_metrics[0])
+
+    @property
+    def std(self):
+        """СКО отдельных позиций и портфеля, усредненное по смещениям"""
+        return self._average(self.offset_metrics[1])
+
+    @property
+    def beta(self):
+        """Беты отдельных позиций и портфеля, усредненные по смещениям"""
+        return self._average(self.offset_metrics[2])
+
+    @property
+    def draw_down(self):
+        """Ожидаемый draw down по усредненным ожидаемой доходности и СКО"""
+        return expected_draw_down(self.mean, self.std)
+
+    @property
+    def gradient(self):
+        """Производная нижней границы портфеля по доле актива по усредненным метрикам"""
+        return lower_bound_gradient(self.mean, self.std, self.beta)
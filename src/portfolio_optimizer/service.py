@@ -0,0 +1,353 @@
+"""Сервис оптимизации портфеля с рыночными данными в памяти.
+
+Локальный HTTP сервер держит в памяти неизменяемый снимок рыночных данных prefetch.MarketData и подобранные
+константы сглаживания, поэтому запросы не загружают данные и не подбирают константу повторно. Все параллельные
+запросы используют один и тот же снимок. Для новых тикеров из запросов загружаются только их данные, которые
+добавляются к снимку. После окончания каждого торгового дня локальные данные обновляются в фоновом потоке, а снимок
+заменяется новым целиком - в нем остаются тикеры, заданные при запуске, и запрошенные после прошлого обновления:
+
+    python -m portfolio_optimizer.service [--host HOST] [--port PORT] [--no-refresh] [TICKER ...]
+
+Запросы принимаются методом POST с описанием портфеля в JSON:
+
+    {"DATE": "2018-03-19", "CASH": 1000.21, "POSITIONS": {"GAZP": 682, "VSMO": 145}}
+
+/portfolio - стоимость и доли позиций портфеля
+/metrics - метрики доходности и дивидендов
+/optimizer - ключевые метрики оптимизации и рекомендуемая сделка, аналогично batch
+
+GET /status возвращает тикеры и версию текущего снимка данных.
+"""
+
+import argparse
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pandas as pd
+
+from portfolio_optimizer import batch, result_cache
+from portfolio_optimizer.batch import POSITIONS, DECAY, ERROR
+from portfolio_optimizer.dividends_metrics import DividendsMetrics
+from portfolio_optimizer.getter import local_quotes, refresher
+from portfolio_optimizer.getter.legacy_dividends import get_legacy_tickers
+from portfolio_optimizer.portfolio import Portfolio
+from portfolio_optimizer.prefetch import prefetch, MAX_WORKERS
+from portfolio_optimizer.returns_metrics import ReturnsMetrics
+from portfolio_optimizer.settings import CASH, DATE, PORTFOLIO, VALUE
+
+HOST = '127.0.0.1'
+PORT = 8050
+# Количество хранимых в памяти констант сглаживания
+MAX_DECAYS = 1024
+# Ключи ответов сервиса
+TICKERS = 'TICKERS'
+VERSION = 'VERSION'
+RETURNS = 'RETURNS'
+DIVIDENDS = 'DIVIDENDS'
+# Столбцы таблиц метрик
+RETURNS_COLUMNS = ['MEAN', 'STD', 'BETA', 'DRAW_DOWN', 'GRADIENT']
+DIVIDENDS_COLUMNS = ['MEAN', 'STD', 'BETA', 'LOWER_BOUND', 'GRADIENT']
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _check_request(request):
+    """Проверяет структуру описания портфеля в запросе."""
+    if not isinstance(request, dict):
+        raise TypeError('Описание портфеля должно быть JSON объектом')
+    for key in (DATE, CASH, POSITIONS):
+        if key not in request:
+            raise KeyError(key)
+    positions = request[POSITIONS]
+    if not isinstance(positions, dict):
+        raise TypeError(f'{POSITIONS} должен быть JSON объектом с количеством лотов для тикеров')
+    for value in [request[CASH], *positions.values()]:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f'Количество лотов и денежные средства должны быть числами, а не {value!r}')
+
+
+def _tickers(data):
+    """Тикеры снимка данных или пустой список при его отсутствии."""
+    return data.tickers if data is not None else []
+
+
+def _to_json(df: pd.DataFrame):
+    """Преобразует DataFrame в словарь по строкам, пригодный для сериализации в JSON."""
+    return json.loads(df.to_json(orient='index'))
+
+
+class MarketService:
+    """Рыночные данные в памяти и обработка запросов к ним.
+
+    Снимок данных заменяется только целиком, поэтому запросы читают его без блокировок. Данные загружаются без
+    блокировки, а она удерживается лишь при замене снимка расширенным или обновленным.
+
+    Тикеры из запросов проверяются по списку тикеров с legacy dividends, без которых нельзя рассчитать метрики, а
+    тикеры, загрузка которых завершилась ошибкой, запоминаются до следующего обновления данных, чтобы не повторять
+    загрузку при каждом запросе.
+    """
+
+    def __init__(self, tickers: list = (), max_workers: int = MAX_WORKERS):
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._base_tickers = sorted(tickers)
+        self._data = prefetch(self._base_tickers, max_workers) if tickers else None
+        self._requested = set()
+        self._known_tickers = None
+        self._failures = dict()
+        self._decays = OrderedDict()
+        self._decays_lock = threading.Lock()
+
+    @property
+    def data(self):
+        """Текущий снимок рыночных данных"""
+        return self._data
+
+    @property
+    def tickers(self):
+        """Тикеры текущего снимка"""
+        return _tickers(self._data)
+
+    def _check_tickers(self, tickers: list):
+        """Проверяет, что для тикеров есть legacy dividends, и их загрузка ранее не завершалась ошибкой."""
+        if self._known_tickers is None:
+            self._known_tickers = frozenset(get_legacy_tickers())
+        unknown = sorted(set(tickers) - self._known_tickers)
+        if unknown:
+            raise KeyError(f'Нет данных о дивидендах для тикеров {unknown}')
+        failures = self._failures
+        failed = [ticker for ticker in tickers if ticker in failures]
+        if failed:
+            raise OSError(f'Ошибка загрузки данных для {failed} - {failures[failed[0]]}')
+
+    def snapshot(self, tickers: list):
+        """Снимок данных, содержащий все тикеры.
+
+        Для отсутствующих в снимке тикеров загружаются только их данные, которые добавляются к текущему снимку.
+        """
+        data = self._data
+        missing = sorted(set(tickers) - set(_tickers(data)))
+        if not missing:
+            self._requested.update(tickers)
+            return data
+        self._check_tickers(missing)
+        try:
+            extension = prefetch(missing, self._max_workers)
+        except Exception as error:
+            with self._lock:
+                self._failures.update(dict.fromkeys(missing, f'{type(error).__name__}: {error}'))
+            raise
+        with self._lock:
+            data = extension if self._data is None else self._data.extend(extension)
+            self._data = data
+            self._requested.update(tickers)
+        return data
+
+    def refresh(self):
+        """Обновляет локальные данные для всех тикеров и заменяет снимок.
+
+        В новый снимок попадают тикеры, заданные при запуске, и запрошенные после прошлого обновления, поэтому снимок
+        не растет неограниченно. Ошибки загрузки тикеров забываются, чтобы их данные можно было загрузить повторно.
+
+        Блокировка удерживается только при замене снимка, поэтому во время обновления снимок может расширяться.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Отчет об обновлении refresher.refresh.
+        """
+        with self._lock:
+            requested, self._requested = self._requested, set()
+            tickers = sorted(set(self._base_tickers) | requested)
+        report = refresher.refresh(tickers, self._max_workers)
+        data = prefetch(tickers, self._max_workers) if tickers else None
+        while True:
+            with self._lock:
+                # Во время обновления снимок мог быть расширен новыми тикерами - они загружаются из уже обновленных
+                # данных без блокировки, после чего проверка повторяется
+                extra = sorted(self._requested - set(_tickers(data)))
+                if not extra:
+                    self._data = data
+                    self._failures = dict()
+                    break
+            extension = prefetch(extra, self._max_workers)
+            data = extension if data is None else data.extend(extension)
+        with self._decays_lock:
+            self._decays.clear()
+        return report
+
+    def _portfolio(self, request: dict):
+        """Портфель по описанию из запроса на общем снимке данных."""
+        _check_request(request)
+        positions = request[POSITIONS]
+        return Portfolio(date=request[DATE],
+                         cash=request[CASH],
+                         positions=positions,
+                         data=self.snapshot(list(positions)))
+
+    def _decay(self, portfolio: Portfolio):
+        """Константа сглаживания для портфеля из памяти или подобранная методом максимального правдоподобия."""
+        key = result_cache.make_key(portfolio.date, portfolio.lots[CASH],
+                                    dict(zip(portfolio.tickers, portfolio.lots[portfolio.tickers])), portfolio.data)
+        with self._decays_lock:
+            decay = self._decays.get(key)
+            if decay is not None:
+                self._decays.move_to_end(key)
+                return decay
+        decay = ReturnsMetrics(portfolio).decay
+        with self._decays_lock:
+            self._decays[key] = decay
+            while len(self._decays) > MAX_DECAYS:
+                self._decays.popitem(last=False)
+        return decay
+
+    def portfolio(self, request: dict):
+        """Стоимость и доли позиций портфеля."""
+        portfolio = self._portfolio(request)
+        return {VALUE: portfolio.value[PORTFOLIO],
+                POSITIONS: _to_json(portfolio.df)}
+
+    def metrics(self, request: dict):
+        """Метрики доходности и дивидендов портфеля."""
+        portfolio = self._portfolio(request)
+        returns = ReturnsMetrics(portfolio, self._decay(portfolio))
+        dividends = DividendsMetrics(portfolio)
+        returns_df = pd.concat([getattr(returns, name.lower()) for name in RETURNS_COLUMNS], axis=1)
+        returns_df.columns = RETURNS_COLUMNS
+        dividends_df = pd.concat([getattr(dividends, name.lower()) for name in DIVIDENDS_COLUMNS], axis=1)
+        dividends_df.columns = DIVIDENDS_COLUMNS
+        return {DECAY: returns.decay,
+                RETURNS: _to_json(returns_df),
+                DIVIDENDS: _to_json(dividends_df)}
+
+    def optimizer(self, request: dict):
+        """Ключевые метрики оптимизации и рекомендуемая сделка."""
+        portfolio = self._portfolio(request)
+        return batch.evaluate(portfolio, self._decay(portfolio))
+
+    def status(self):
+        """Тикеры и версия текущего снимка данных."""
+        data = self._data
+        return {TICKERS: self.tickers,
+                VERSION: data.version if data is not None else None}
+
+    def handle(self, path: str, request: dict = None):
+        """
+        Обрабатывает запрос к сервису.
+
+        Parameters
+        ----------
+        path
+            Путь запроса - /portfolio, /metrics, /optimizer или /status.
+        request
+            Описание портфеля с ключами DATE, CASH и POSITIONS.
+
+        Returns
+        -------
+        tuple of int and dict
+            HTTP код и результат запроса или сообщение об ошибке.
+        """
+        handlers = {'/portfolio': self.portfolio,
+                    '/metrics': self.metrics,
+                    '/optimizer': self.optimizer}
+        if path == '/status':
+            return 200, self.status()
+        if path not in handlers:
+            return 404, {ERROR: f'Неизвестный запрос {path}'}
+        try:
+            return 200, handlers[path](request)
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {ERROR: f'{type(error).__name__}: {error}'}
+        except OSError as error:
+            return 503, {ERROR: f'Данные недоступны - {type(error).__name__}: {error}'}
+        except Exception as error:
+            LOGGER.exception('Ошибка обработки запроса %s', path)
+            return 500, {ERROR: f'Внутренняя ошибка - {type(error).__name__}: {error}'}
+
+    def run_refresh(self, stop: threading.Event):
+        """Цикл обновления данных после окончания каждого торгового дня до установки события stop.
+
+        Если при обновлении возникли ошибки, то оно повторяется через refresher.RETRY_PERIOD_IN_SECONDS.
+        """
+        refreshed = local_quotes.end_of_last_trading_day()
+        period = refresher.CHECK_PERIOD_IN_SECONDS
+        while not stop.wait(period):
+            end_of_day = local_quotes.end_of_last_trading_day()
+            period = refresher.CHECK_PERIOD_IN_SECONDS
+            if refreshed < end_of_day and self.tickers:
+                report = self.refresh()
+                errors = report[report[refresher.STATUS] == refresher.ERROR]
+                if errors.empty:
+                    refreshed = end_of_day
+                else:
+                    period = refresher.RETRY_PERIOD_IN_SECONDS
+                    LOGGER.warning('Ошибки обновления %s из %s рядов', len(errors), len(report))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Обработчик HTTP запросов с JSON телом и ответом."""
+
+    def _send(self, status, result):
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(*self.server.service.handle(self.path))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as error:
+            self._send(400, {ERROR: f'Некорректный JSON: {error}'})
+        else:
+            self._send(*self.server.service.handle(self.path, request))
+
+    def log_message(self, format, *args):
+        LOGGER.info('%s - %s', self.address_string(), format % args)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """Многопоточный HTTP сервер - каждый запрос обрабатывается в отдельном потоке."""
+    daemon_threads = True
+
+    def __init__(self, service: MarketService, host: str = HOST, port: int = PORT):
+        super().__init__((host, port), _Handler)
+        self.service = service
+
+
+def main(args=None):
+    """Запускает сервис из командной строки."""
+    parser = argparse.ArgumentParser(description='Сервис оптимизации портфеля с рыночными данными в памяти.')
+    parser.add_argument('tickers', nargs='*', help='тикеры, данные для которых загружаются при запуске')
+    parser.add_argument('--host', default=HOST, help='адрес сервера')
+    parser.add_argument('--port', type=int, default=PORT, help='порт сервера')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='количество параллельных загрузок')
+    parser.add_argument('--no-refresh', action='store_true', help='не обновлять данные после окончания торгов')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    service = MarketService(args.tickers, args.workers)
+    stop = threading.Event()
+    if not args.no_refresh:
+        threading.Thread(target=service.run_refresh, args=(stop,), daemon=True).start()
+    server = Server(service, args.host, args.port)
+    LOGGER.info('Сервис запущен на %s:%s', args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,7 @@ CLOSE_PRICE = 'CLOSE_PRICE'
 CPI = 'CPI'
 DATE = 'DATE'
 DIVIDENDS = 'DIVIDENDS'
+LAST_DATE = 'LAST_DATE'
 LAST_PRICE = 'LAST_PRICE'
 LAST_VALUE = 'LAST_VALUE'
 LAST_WEIGHT = 'LAST_WEIGHT'
@@ -23,11 +24,16 @@ COMPANY_NAME = 'COMPANY_NAME'
 PRICE = 'PRICE'
 PORTFOLIO = 'PORTFOLIO'
 REG_NUMBER = 'REG_NUMBER'
+STALE_DAYS = 'STALE_DAYS'
 TICKER = 'TICKER'
 TICKER_ALIASES = 'TICKER_ALIASES'
+TRADING_DATE = 'TRADING_DATE'
 VOLUME = 'VOLUME'
 VALUE = 'VALUE'
 WEIGHT = 'WEIGHT'
 
 # Путь к данным - данные состоящие из нескольких серий хранятся в отдельных директориях внутри базовой директории
 DATA_PATH = Path(__file__).parents[2] / 'data'
+
+# Таймаут сетевых запросов в секундах - ограничивает время ожидания при недоступности серверов
+REQUEST_TIMEOUT = 10
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from portfolio_optimizer import batch
+from portfolio_optimizer.batch import NAME, POSITIONS, DECAY, TRADE, METRICS, ERROR
+from portfolio_optimizer.settings import CASH, DATE, PORTFOLIO, VALUE
+
+PORTFOLIOS = [{NAME: 'returns', DATE: '2018-03-19', CASH: 1_415_988,
+               POSITIONS: dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)},
+              {NAME: 'dividends', DATE: '2018-03-19', CASH: 7_079_940,
+               POSITIONS: dict(MSTT=8650, RTKMP=1826, UPRO=3370, LKOH=2230, MVID=3260)}]
+
+
+def test_read_portfolios(tmpdir):
+    path = Path(tmpdir) / 'portfolios.csv'
+    path.write_text('NAME,DATE,CASH,TICKER,LOTS\n'
+                    'IIS,2018-03-19,1000.21,GAZP,682\n'
+                    'IIS,2018-03-19,1000.21,VSMO,145\n'
+                    'BROKER,2018-03-12,10,TTLK,123\n')
+    portfolios = batch.read_portfolios(path)
+    assert portfolios[0] == {NAME: 'IIS', DATE: '2018-03-19', CASH: 1000.21, POSITIONS: dict(GAZP=682, VSMO=145)}
+    assert portfolios[1][POSITIONS] == dict(TTLK=123)
+
+
+def test_run_loads_data_once(monkeypatch):
+    calls = []
+    prefetch = batch.prefetch
+
+    def counting_prefetch(tickers, max_workers):
+        calls.append(tickers)
+        return prefetch(tickers, max_workers)
+
+    monkeypatch.setattr(batch, 'prefetch', counting_prefetch)
+    results = batch.run(PORTFOLIOS)
+    assert calls == [['AKRN', 'GMKN', 'LKOH', 'LSNGP', 'MSTT', 'MTSS', 'MVID', 'RTKMP', 'UPRO']]
+    assert results[0][DECAY] == pytest.approx(0.8729738915250947)
+    assert results[0][TRADE]['BUY'] == 'MTSS'
+    assert results[0][METRICS][PORTFOLIO][VALUE] == pytest.approx(results[0][VALUE])
+    # Для второго портфеля константа сглаживания выходит за пределы обычного интервала
+    assert 'ValueError' in results[1][ERROR]
+
+
+def test_run_continues_after_errors(monkeypatch):
+    def failing_evaluate(portfolio, decay=None):
+        raise OSError('Нет сети')
+
+    broken = {NAME: 'broken', DATE: '2018-03-19', CASH: 0, POSITIONS: ['MSTT']}
+    monkeypatch.setattr(batch, 'evaluate', failing_evaluate)
+    results = batch.run([broken, PORTFOLIOS[0]])
+    assert [result[NAME] for result in results] == ['broken', 'returns']
+    assert 'AttributeError' in results[0][ERROR]
+    assert results[1][ERROR] == 'OSError: Нет сети'
+    assert results[1][VALUE] > 0
+
+
+def test_main(tmpdir):
+    source = Path(tmpdir) / 'portfolios.json'
+    source.write_text(json.dumps(PORTFOLIOS[:1]))
+    output = Path(tmpdir) / 'results.json'
+    batch.main([str(source), '--output', str(output)])
+    results = json.loads(output.read_text(encoding='utf-8'))
+    assert results[0][NAME] == 'returns'
+    assert ERROR not in results[0]
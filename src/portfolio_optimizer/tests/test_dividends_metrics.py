@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 
 from portfolio_optimizer import dividends_metrics, portfolio
@@ -60,3 +61,19 @@ def test_str(div):
     assert 'BETA' in text
     assert 'LOWER_BOUND' in text
     assert 'GRADIENT' in text
+
+
+def test_incremental_update():
+    positions = dict(MSTT=8650, RTKMP=1826, UPRO=3370, LKOH=2230)
+    port = portfolio.Portfolio(date='2018-03-19', cash=7_079_940, positions=positions)
+    metrics = dividends_metrics.DividendsMetrics(port)
+    assert metrics.mean['LKOH'] > 0
+    port.add_ticker('MVID', 3260)
+    port.set_lots('MSTT', 4000)
+    port.set_cash(1_000_000)
+    positions.update(MVID=3260, MSTT=4000)
+    expected = dividends_metrics.DividendsMetrics(portfolio.Portfolio(date='2018-03-19', cash=1_000_000,
+                                                                      positions=positions))
+    pd.testing.assert_series_equal(metrics.mean, expected.mean)
+    pd.testing.assert_series_equal(metrics.std, expected.std)
+    pd.testing.assert_series_equal(metrics.gradient, expected.gradient)
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import optimize, stats
+
+from portfolio_optimizer import ewm
+
+
+@pytest.fixture(scope='module', name='x')
+def case_returns():
+    return np.random.RandomState(0).normal(0.01, 0.05, size=(120, 3))
+
+
+def test_moments(x):
+    mean, std = ewm.moments(x, [0.5, 0.87, 0.95])
+    assert mean.shape == std.shape == (3, 120, 3)
+    for decay, decay_mean, decay_std in zip([0.5, 0.87, 0.95], mean, std):
+        df = pd.DataFrame(x).ewm(alpha=1 - decay)
+        assert np.allclose(decay_mean, df.mean().values, rtol=1e-12)
+        assert np.allclose(decay_std, df.std().values, rtol=1e-12, equal_nan=True)
+
+
+def test_neg_llh(x):
+    series = pd.Series(x[:, 0])
+    start = 24
+    decays = np.array([0.8, 0.9])
+    result = ewm.neg_llh(series.values, decays, start)
+    for decay, value in zip(decays, result):
+        moments = series.ewm(alpha=1 - decay)
+        llh = stats.norm.logpdf(series.shift(-1).iloc[start:-1],
+                                moments.mean().iloc[start:-1],
+                                moments.std().iloc[start:-1])
+        assert value == pytest.approx(-llh.sum())
+    assert ewm.neg_llh(x, decays, start).shape == (2, 3)
+
+
+def test_neg_llh_start(x):
+    start = np.array([10, 24, 40])
+    result = ewm.neg_llh(x, [0.8, 0.9], start)
+    for column, column_start in enumerate(start):
+        assert np.allclose(result[:, column], ewm.neg_llh(x[:, column], [0.8, 0.9], column_start))
+    decays = np.array([0.8, 0.85, 0.9])
+    result = ewm.neg_llh(x, decays[np.newaxis], start)
+    for column, (decay, column_start) in enumerate(zip(decays, start)):
+        assert result[0, column] == pytest.approx(ewm.neg_llh(x[:, column], decay, column_start)[0])
+
+
+def test_fit_decays(x):
+    x = np.column_stack([x, np.zeros(len(x))])
+    # Волатильность меняется во времени, поэтому оптимальные константы внутри интервала
+    x[:, :3] *= np.repeat([1, 2, 4, 2, 1, 3], 20)[:, np.newaxis]
+    start = np.array([24, 24, 40, 24])
+    grid = np.linspace(0, 1, 101)[1:-1]
+    decays = ewm.fit_decays(x, start, grid)
+    assert np.isnan(decays[3])
+    for column in range(3):
+        profile = ewm.neg_llh(x[:, column], grid, start[column])
+        best = np.argmin(profile)
+        result = optimize.minimize_scalar(lambda decay: ewm.neg_llh(x[:, column], decay, start[column])[0],
+                                          bounds=(grid[best - 1], grid[best + 1]),
+                                          method='Bounded',
+                                          options=dict(xatol=1e-9))
+        assert decays[column] == pytest.approx(result.x, abs=1e-6)
+        # Если минимум за пределами сетки, то лучшим оказывается крайний узел, который не является оптимумом
+        below = grid[grid < decays[column] - 0.05]
+        above = grid[grid > decays[column] + 0.05]
+        assert np.isnan(ewm.fit_decays(x[:, [column]], start[column], below)[0])
+        assert np.isnan(ewm.fit_decays(x[:, [column]], start[column], above)[0])
+
+
+def test_neg_llh_derivatives(x):
+    decays = np.array([0.5, 0.87, 0.95])
+    step = 1e-5
+    value, gradient, curvature = ewm.neg_llh_derivatives(x, decays, 24)
+    assert np.allclose(value, ewm.neg_llh(x, decays, 24))
+    numeric = (ewm.neg_llh(x, decays + step, 24) - ewm.neg_llh(x, decays - step, 24)) / (2 * step)
+    assert np.allclose(gradient, numeric, rtol=1e-6)
+    numeric = (ewm.neg_llh_derivatives(x, decays + step, 24)[1]
+               - ewm.neg_llh_derivatives(x, decays - step, 24)[1]) / (2 * step)
+    assert np.allclose(curvature, numeric, rtol=1e-6)
+
+
+def _matrix_moments_derivatives(x, decays):
+    """Исходный расчет производных через явные матрицы весов формы (константы, время, время)"""
+    time = np.arange(len(x))
+    lags = time[:, None] - time[None, :]
+    mask = lags >= 0
+    lags = np.where(mask, lags, 0)
+    decays = decays[:, None, None]
+    weights = mask * decays ** lags
+    weights_1 = mask * lags * decays ** np.maximum(lags - 1, 0)
+    weights_2 = mask * lags * (lags - 1) * decays ** np.maximum(lags - 2, 0)
+    sums = [weights.sum(axis=2),
+            weights_1.sum(axis=2),
+            weights_2.sum(axis=2),
+            (weights ** 2).sum(axis=2),
+            2 * (weights * weights_1).sum(axis=2),
+            2 * (weights_1 ** 2 + weights * weights_2).sum(axis=2)]
+    # Дополнительные оси данных после оси времени
+    extra = (1,) * (x.ndim - 1)
+    weights, weights_1, weights_2 = [value.reshape(value.shape + extra) for value in (weights, weights_1, weights_2)]
+    sum_wt, sum_wt_1, sum_wt_2, sum_wt2, sum_wt2_1, sum_wt2_2 = [value.reshape(value.shape + extra) for value in sums]
+    # Среднее - отношение взвешенной суммы к сумме весов
+    mean = (weights * x).sum(axis=2) / sum_wt
+    mean_1 = ((weights_1 * x).sum(axis=2) - mean * sum_wt_1) / sum_wt
+    mean_2 = ((weights_2 * x).sum(axis=2) - 2 * mean_1 * sum_wt_1 - mean * sum_wt_2) / sum_wt
+    # Смещенная дисперсия - взвешенная сумма квадратов отклонений, производная которой по среднему равна нулю
+    error = x[None, None] - mean[:, :, None]
+    var = (weights * error ** 2).sum(axis=2) / sum_wt
+    numerator_1 = (weights_1 * error ** 2).sum(axis=2)
+    numerator_2 = (weights_2 * error ** 2).sum(axis=2) - 2 * mean_1 * (weights_1 * error).sum(axis=2)
+    var_1 = (numerator_1 - var * sum_wt_1) / sum_wt
+    var_2 = (numerator_2 - 2 * var_1 * sum_wt_1 - var * sum_wt_2) / sum_wt
+    # Поправка на смещение sum_wt ** 2 / (sum_wt ** 2 - sum_wt2)
+    square, square_1, square_2 = sum_wt ** 2, 2 * sum_wt * sum_wt_1, 2 * sum_wt_1 ** 2 + 2 * sum_wt * sum_wt_2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1 / (square - sum_wt2)
+        denominator_1 = square_1 - sum_wt2_1
+        denominator_2 = square_2 - sum_wt2_2
+        inverse_1 = -denominator_1 * inverse ** 2
+        inverse_2 = (2 * denominator_1 ** 2 * inverse - denominator_2) * inverse ** 2
+        bias = square * inverse
+        bias_1 = square_1 * inverse + square * inverse_1
+        bias_2 = square_2 * inverse + 2 * square_1 * inverse_1 + square * inverse_2
+        # Для первого периода поправка и дисперсия не определены
+        return dict(mean=mean,
+                    mean_1=mean_1,
+                    mean_2=mean_2,
+                    var=var * bias,
+                    var_1=var_1 * bias + var * bias_1,
+                    var_2=var_2 * bias + 2 * var_1 * bias_1 + var * bias_2)
+
+
+def test_moments_derivatives(x):
+    decays = np.array([0.5, 0.87, 0.95])
+    result = ewm._moments_derivatives(x, decays)
+    expected = _matrix_moments_derivatives(x, decays)
+    for name, value in expected.items():
+        assert result[name].shape == value.shape
+        assert np.allclose(result[name][:, 1:], value[:, 1:], rtol=1e-9, atol=1e-12)
+    assert np.allclose(result['mean'][:, 0], x[0])
+
+
+def test_online_moments(x):
+    df = pd.DataFrame(x, index=pd.date_range('2008-01-31', periods=120, freq='M'), columns=['A', 'B', 'C'])
+    moments = ewm.OnlineMoments(0.87, df.columns)
+    moments.fold(df.iloc[:100])
+    moments.fold(df)
+    assert moments.last_date == df.index[-1]
+    expected = df.ewm(alpha=1 - 0.87)
+    pd.testing.assert_series_equal(moments.mean, expected.mean().iloc[-1], check_names=False)
+    pd.testing.assert_frame_equal(moments.cov, expected.cov().loc[df.index[-1]], check_names=False)
+    assert moments.matches(pd.concat([df, df.iloc[-1:].shift(1, freq='M')]))
+    changed = df.copy()
+    changed.iloc[-1, 0] += 0.01
+    assert not moments.matches(changed)
+    with pytest.raises(ValueError):
+        moments.fold(changed)
+    assert not moments.matches(df.drop(df.index[50]))
+    assert not moments.matches(df.iloc[:, ::-1])
+
+
+def test_moments_history(x):
+    mean, cov = ewm.moments_history(x, 0.87)
+    expected = pd.DataFrame(x).ewm(alpha=1 - 0.87)
+    assert mean == pytest.approx(expected.mean().values)
+    assert cov[60] == pytest.approx(expected.cov().loc[60].values)
+    assert np.isnan(cov[0]).all()
+    last_mean, last_cov = ewm.last_moments(x, 0.87)
+    assert last_cov == pytest.approx(cov[-1])
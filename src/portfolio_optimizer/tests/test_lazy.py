@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from portfolio_optimizer import lazy, portfolio
+from portfolio_optimizer.dividends_metrics import DividendsMetrics
+from portfolio_optimizer.getter import local_quotes, storage
+
+
+class Metrics:
+    def __init__(self):
+        self.versions = {lazy.DATE: 0, lazy.POSITIONS: 0}
+        self.calls = []
+
+    def input_version(self, name):
+        return self.versions[name]
+
+    @lazy.node(lazy.POSITIONS)
+    def amount(self):
+        """Количество"""
+        self.calls.append('amount')
+        return 2
+
+    @lazy.node(lazy.POSITIONS, lazy.DATE)
+    def value(self):
+        self.calls.append('value')
+        return self.amount * 10
+
+
+def test_node():
+    metrics = Metrics()
+    assert Metrics.amount.__doc__ == 'Количество'
+    assert metrics.value == 20
+    assert metrics.value == 20
+    assert metrics.calls == ['value', 'amount']
+    metrics.versions[lazy.DATE] += 1
+    assert metrics.value == 20
+    assert metrics.calls == ['value', 'amount', 'value']
+    metrics.versions[lazy.POSITIONS] += 1
+    assert metrics.amount == 2
+    assert metrics.calls == ['value', 'amount', 'value', 'amount']
+
+
+def test_dividends_metrics_invalidation():
+    port = portfolio.Portfolio(date='2018-03-19',
+                               cash=7_079_940,
+                               positions=dict(MSTT=8650, RTKMP=1826, UPRO=3370, LKOH=2230, MVID=3260))
+    metrics = DividendsMetrics(port)
+    gradient = metrics.gradient
+    real_after_tax = metrics.real_after_tax
+    assert metrics.gradient is gradient
+    port.change_date('2018-03-12')
+    assert metrics.real_after_tax is real_after_tax
+    assert metrics.gradient is not gradient
+    port.set_lots('MSTT', 0)
+    assert metrics.real_after_tax is not real_after_tax
+    assert metrics.mean['MSTT'] == pytest.approx(DividendsMetrics(port).mean['MSTT'])
+
+
+def test_data_files_invalidation():
+    port = portfolio.Portfolio(date='2018-03-19',
+                               cash=7_079_940,
+                               positions=dict(MSTT=8650, RTKMP=1826, UPRO=3370, LKOH=2230, MVID=3260))
+    metrics = DividendsMetrics(port)
+    version = port.version(lazy.DATA)
+    mean = metrics.mean
+    assert port.version(lazy.DATA) == version
+    assert metrics.mean is mean
+    path = storage.make_data_path(local_quotes.QUOTES_FOLDER, 'MSTT.csv')
+    stat = os.stat(str(path))
+    try:
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        # Состояние данных зафиксировано при создании портфеля и меняется только явной перезагрузкой
+        assert port.version(lazy.DATA) == version
+        assert metrics.mean is mean
+        assert port.reload()
+        assert port.version(lazy.DATA) != version
+        assert metrics.mean is not mean
+        assert metrics.mean.equals(mean)
+        assert not port.reload()
+    finally:
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
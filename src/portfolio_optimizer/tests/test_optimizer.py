@@ -0,0 +1,48 @@
+import pytest
+
+from portfolio_optimizer import optimizer, portfolio
+from portfolio_optimizer.dividends_metrics import DividendsMetrics
+
+UNIVERSE = ['MSTT', 'UPRO', 'LKOH', 'MVID', 'RTKMP', 'CHMF']
+
+
+@pytest.fixture(scope='module', name='opt')
+def case_optimizer():
+    positions = dict(MSTT=4650,
+                     LSNGP=162,
+                     MTSS=749,
+                     AKRN=795,
+                     GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19',
+                               cash=1_415_988,
+                               positions=positions)
+    return optimizer.Optimizer(port)
+
+
+def test_scan(opt):
+    df = opt.scan(UNIVERSE)
+    assert list(df.columns) == ['D_GRADIENT', 'R_GRADIENT', 'DOMINATES']
+    assert sorted(df.index) == ['CHMF', 'LKOH', 'MVID', 'RTKMP', 'UPRO']
+    assert list(df['DOMINATES']) == sorted(df['DOMINATES'], reverse=True)
+    # Кандидат с нулевым весом не меняет градиент дивидендов портфеля
+    port = opt.portfolio
+    positions = dict(zip(port.tickers, port.lots[port.tickers]), UPRO=0)
+    expected = DividendsMetrics(portfolio.Portfolio(date=port.date, cash=port.lots['CASH'], positions=positions))
+    assert df.loc['UPRO', 'D_GRADIENT'] == pytest.approx(expected.gradient['UPRO'])
+    best = df.index[0]
+    holdings = port.index[port.weight.values != 0]
+    dominated = ((opt.dividends.gradient[holdings] < df.loc[best, 'D_GRADIENT']) &
+                 (opt.returns.gradient[holdings] < df.loc[best, 'R_GRADIENT']))
+    assert df.loc[best, 'DOMINATES'] == dominated.sum()
+
+
+def test_scan_without_candidates(opt):
+    assert opt.scan(['MSTT', 'GMKN']).empty
+
+
+def test_scan_skips_tickers_without_dividends(opt):
+    with pytest.warns(UserWarning, match='SBER'):
+        df = opt.scan(['SBER', 'UPRO'])
+    assert list(df.index) == ['UPRO']
+    with pytest.warns(UserWarning, match='SBER'):
+        assert opt.scan(['SBER']).empty
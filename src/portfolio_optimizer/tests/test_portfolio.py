@@ -13,8 +13,8 @@ def test_portfolio():
     date = pd.to_datetime('2018-03-19').date()
     assert port.date == date
     assert f'Дата портфеля - {date}' in port.__str__()
-    assert port._df.loc[PORTFOLIO, VALUE] == 3_699_111.41
-    assert port._df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
+    assert port.df.loc[PORTFOLIO, VALUE] == 3_699_111.41
+    assert port.df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
 
 
 def test_portfolio_warnings():
@@ -27,8 +27,8 @@ def test_portfolio_warnings():
     date = pd.to_datetime('2018-03-19').date()
     assert port.date == date
     assert f'Дата портфеля - {date}' in port.__str__()
-    assert port._df.loc[PORTFOLIO, VALUE] == 3_699_111.41
-    assert port._df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
+    assert port.df.loc[PORTFOLIO, VALUE] == 3_699_111.41
+    assert port.df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
 
 
 def test_portfolio_without_value():
@@ -38,5 +38,97 @@ def test_portfolio_without_value():
     date = pd.to_datetime('2018-03-19').date()
     assert port.date == date
     assert f'Дата портфеля - {date}' in port.__str__()
-    assert port._df.loc[PORTFOLIO, VALUE] == 3_699_111.41
-    assert port._df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
+    assert port.df.loc[PORTFOLIO, VALUE] == 3_699_111.41
+    assert port.df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
+
+
+def test_value_history():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    values = port.value_history('2018-03-01', '2018-03-19')
+    assert values.index[-1] == pd.Timestamp('2018-03-19')
+    assert list(values.columns) == list(port.index)
+    assert values.loc['2018-03-19', PORTFOLIO] == pytest.approx(3_699_111.41)
+    assert (values['CASH'] == 1000.21).all()
+    pd.testing.assert_series_equal(values.iloc[-1], port.value, check_names=False)
+    for date in ['2018-03-01', '2018-03-12']:
+        port.change_date(date)
+        assert values.loc[date, PORTFOLIO] == pytest.approx(port.value[PORTFOLIO])
+        assert values.loc[date, 'GAZP'] == pytest.approx(port.value['GAZP'])
+
+
+def test_weight_history():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    weights = port.weight_history(end='2018-03-19')
+    assert weights.loc['2018-03-19', 'VSMO'] == pytest.approx(0.691071)
+    assert weights.loc['2018-03-19', PORTFOLIO] == 1
+    assert weights.iloc[-100:].drop(columns=PORTFOLIO).sum(axis=1).values == pytest.approx(1)
+
+
+def test_prices_at():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    prices, report = port.prices_at(['2018-03-19', '2018-03-25', '2018-03-12'])
+    assert list(prices.columns) == port.tickers
+    assert list(prices.index) == list(pd.to_datetime(['2018-03-19', '2018-03-25', '2018-03-12']))
+    assert len(report) == 1
+    assert report.iloc[0] == pd.Timestamp('2018-03-23')
+    with pytest.warns(UserWarning):
+        port.change_date('2018-03-25')
+    assert (prices.iloc[1] == port.price[port.tickers]).all()
+    port.change_date('2018-03-12')
+    assert prices.iloc[2]['GAZP'] == port.price['GAZP']
+
+
+def test_prices_at_before_history():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    with pytest.raises(KeyError):
+        port.prices_at(['1990-01-01', '2018-03-19'])
+
+
+def test_set_lots_and_cash():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    port.set_lots('VSMO', 0)
+    port.set_cash(2000)
+    expected = Portfolio(date='2018-03-19',
+                         cash=2000,
+                         positions=dict(GAZP=682, VSMO=0, TTLK=123))
+    pd.testing.assert_frame_equal(port.df, expected.df)
+    with pytest.raises(ValueError):
+        port.set_lots('AKRN', 1)
+
+
+def test_add_and_remove_ticker():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145))
+    port.add_ticker('TTLK', 123)
+    assert port.tickers == ['GAZP', 'TTLK', 'VSMO']
+    assert port.df.loc[PORTFOLIO, VALUE] == pytest.approx(3_699_111.41)
+    assert port.df.loc['VSMO', WEIGHT] == pytest.approx(0.691071)
+    with pytest.raises(ValueError):
+        port.add_ticker('TTLK')
+    port.remove_ticker('GAZP')
+    expected = Portfolio(date='2018-03-19',
+                         cash=1000.21,
+                         positions=dict(VSMO=145, TTLK=123))
+    pd.testing.assert_frame_equal(port.df, expected.df)
+    assert list(port.prices.columns) == ['TTLK', 'VSMO']
+
+
+def test_remove_ticker_keeps_dates():
+    port = Portfolio(date='2018-03-19',
+                     cash=1000.21,
+                     positions=dict(GAZP=682, VSMO=145, TTLK=123))
+    prices = port.prices
+    port.remove_ticker('GAZP')
+    pd.testing.assert_index_equal(port.prices.index, prices.index)
+    pd.testing.assert_frame_equal(port.prices, prices[['TTLK', 'VSMO']])
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import getter, prefetch
+from portfolio_optimizer.dividends_metrics import DividendsMetrics
+from portfolio_optimizer.portfolio import Portfolio
+from portfolio_optimizer.returns_metrics import ReturnsMetrics
+from portfolio_optimizer.settings import PORTFOLIO, VALUE
+
+POSITIONS = dict(MSTT=8650, RTKMP=1826, UPRO=3370, LKOH=2230, MVID=3260)
+
+
+def test_plan():
+    tasks = prefetch.plan(POSITIONS)
+    datasets = [(dataset, ticker) for dataset, ticker, _, _ in tasks]
+    assert len(datasets) == 3 + len(POSITIONS)
+    assert (prefetch.SECURITY_INFO, None) in datasets
+    assert (prefetch.LEGACY_DIVIDENDS, None) in datasets
+    assert (prefetch.CPI, None) in datasets
+    assert (prefetch.QUOTES, 'MSTT') in datasets
+
+
+@pytest.fixture(scope='module', name='data')
+def make_data():
+    return prefetch.prefetch(POSITIONS)
+
+
+def test_market_data(data):
+    tickers = ['LKOH', 'MSTT']
+    assert data.tickers == sorted(POSITIONS)
+    assert data.prices_history(tickers).equals(getter.prices_history(tickers))
+    assert data.legacy_dividends(tickers).equals(getter.legacy_dividends(tickers))
+    assert data.cpi().equals(getter.cpi())
+    assert data.security_info(tickers).equals(getter.security_info(tickers))
+
+
+def test_extend(data):
+    extended = prefetch.prefetch(['MSTT', 'GMKN']).extend(data)
+    assert extended.tickers == sorted(set(POSITIONS) | {'GMKN'})
+    tickers = ['GMKN', 'LKOH', 'MSTT']
+    pd.testing.assert_frame_equal(extended.security_info(tickers), getter.security_info(tickers))
+    pd.testing.assert_frame_equal(extended.prices_history(tickers), getter.prices_history(tickers))
+    pd.testing.assert_frame_equal(extended.legacy_dividends(tickers), getter.legacy_dividends(tickers))
+    assert extended.version != data.version
+
+
+def test_prefetched_portfolio(data):
+    port = Portfolio(date='2018-03-19', cash=7_079_940, positions=POSITIONS, data=data)
+    assert port.data is data
+    expected = Portfolio(date='2018-03-19', cash=7_079_940, positions=POSITIONS)
+    assert port.df.loc[PORTFOLIO, VALUE] == expected.df.loc[PORTFOLIO, VALUE]
+    pd.testing.assert_series_equal(DividendsMetrics(port).mean, DividendsMetrics(expected).mean)
+
+
+def test_replace_data(data):
+    tickers = data.tickers
+    changed = prefetch.MarketData(data.security_info(tickers),
+                                  {ticker: data.prices_history([ticker])[ticker] * 1.5 for ticker in tickers},
+                                  data.legacy_dividends(tickers) * 2,
+                                  data.cpi())
+    port = Portfolio(date='2018-03-19', cash=7_079_940, positions=POSITIONS, data=data)
+    dividends = DividendsMetrics(port)
+    returns = ReturnsMetrics(port, 0.87)
+    assert dividends.mean['LKOH'] == pytest.approx(0.0382, abs=1e-4)
+    old_returns = returns.returns
+    port.data = changed
+    expected = Portfolio(date='2018-03-19', cash=7_079_940, positions=POSITIONS, data=changed)
+    pd.testing.assert_frame_equal(port.prices, expected.prices)
+    assert port.value[PORTFOLIO] == pytest.approx(expected.value[PORTFOLIO])
+    assert dividends.mean['LKOH'] == pytest.approx(DividendsMetrics(expected).mean['LKOH'])
+    assert dividends.mean['LKOH'] != pytest.approx(0.0382, abs=1e-4)
+    assert returns.returns is not old_returns
+    pd.testing.assert_series_equal(returns.std, ReturnsMetrics(expected, 0.87).std)
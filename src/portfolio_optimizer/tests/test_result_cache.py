@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import result_cache, settings
+from portfolio_optimizer.getter import local_quotes, storage
+from portfolio_optimizer.prefetch import prefetch
+
+POSITIONS = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+CASH = 1_415_988
+DATE = '2018-03-19'
+
+
+@pytest.fixture(scope='module', name='data')
+def make_data():
+    return prefetch(list(POSITIONS))
+
+
+@pytest.fixture(name='cache_path')
+def tmp_cache(data, tmpdir, monkeypatch):
+    # Данные загружены заранее, поэтому директорию данных можно заменить на временную
+    path = Path(tmpdir)
+    monkeypatch.setattr(storage.settings, 'DATA_PATH', path)
+    return path / result_cache.CACHE_FOLDER
+
+
+def test_make_key():
+    key = result_cache.make_key(DATE, CASH, POSITIONS)
+    assert key == result_cache.make_key(pd.Timestamp(DATE), float(CASH), dict(reversed(list(POSITIONS.items()))))
+    assert key != result_cache.make_key(DATE, CASH + 1, POSITIONS)
+    assert key != result_cache.make_key('2018-03-20', CASH, POSITIONS)
+    assert key != result_cache.make_key(DATE, CASH, dict(POSITIONS, MSTT=1))
+
+
+def test_key_changes_with_data(monkeypatch):
+    key = result_cache.make_key(DATE, CASH, POSITIONS)
+    monkeypatch.setattr(settings, 'T_SCORE', 3.0)
+    assert result_cache.make_key(DATE, CASH, POSITIONS) != key
+    monkeypatch.undo()
+    path = storage.make_data_path(local_quotes.QUOTES_FOLDER, 'MSTT.csv')
+    stat = os.stat(str(path))
+    try:
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert result_cache.make_key(DATE, CASH, POSITIONS) != key
+    finally:
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_get_optimizer(data, cache_path):
+    optimizer = result_cache.get_optimizer(DATE, CASH, POSITIONS, data)
+    files = list(cache_path.glob('*.pickle'))
+    assert len(files) == 1
+    cached = result_cache.get_optimizer(DATE, CASH, POSITIONS, data)
+    assert cached is not optimizer
+    assert cached.portfolio.data is data
+    assert cached.returns.decay == optimizer.returns.decay
+    assert str(cached) == str(optimizer)
+    pd.testing.assert_series_equal(cached.dividends.gradient, optimizer.dividends.gradient)
+    # Результаты загружаются из кэша без повторных расчетов
+    assert cached.dividends.gradient is cached.dividends.gradient
+    assert cached.returns.__dict__['_graph_cache']['gradient'][1] is cached.returns.gradient
+
+
+def test_key_after_data_load(data, cache_path, monkeypatch):
+    # Загрузка данных при создании портфеля обновляет локальные файлы и меняет версию данных
+    versions = ['before']
+    portfolio = result_cache.Portfolio
+
+    def loading_portfolio(*args, **kwargs):
+        versions.append('after')
+        return portfolio(*args, **kwargs)
+
+    monkeypatch.setattr(result_cache, 'data_version', lambda *args: versions[-1])
+    monkeypatch.setattr(result_cache, 'Portfolio', loading_portfolio)
+    result_cache.get_optimizer(DATE, CASH, POSITIONS, data)
+    files = list(cache_path.glob('*.pickle'))
+    assert [path.stem for path in files] == [result_cache.make_key(DATE, CASH, POSITIONS, data)]
+    result_cache.get_optimizer(DATE, CASH, POSITIONS, data)
+    assert versions == ['before', 'after']
+
+
+def test_lru_trim(data, cache_path):
+    result_cache.get_optimizer(DATE, CASH, POSITIONS, data)
+    size = next(cache_path.glob('*.pickle')).stat().st_size
+    result_cache.get_optimizer(DATE, CASH, POSITIONS, data, max_size=size)
+    result_cache.get_optimizer(DATE, CASH + 1000, POSITIONS, data, max_size=size)
+    files = list(cache_path.glob('*.pickle'))
+    assert len(files) == 1
+    assert files[0].name == result_cache.make_key(DATE, CASH + 1000, POSITIONS, data) + '.pickle'
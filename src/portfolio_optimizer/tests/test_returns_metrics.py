@@ -1,6 +1,12 @@
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
 import pytest
 
-from portfolio_optimizer import returns_metrics, portfolio
+from portfolio_optimizer import ewm, returns_metrics, portfolio, settings
+from portfolio_optimizer.prefetch import prefetch
 from portfolio_optimizer.settings import CASH, PORTFOLIO
 
 
@@ -18,7 +24,21 @@ def case_metrics():
 
 
 def test_decay(returns):
-    assert returns.decay == pytest.approx(0.87297494460045133)
+    # Метод Ньютона находит точку с нулевой производной llh - прежний поиск без производных останавливался на
+    # 0.87297494460045133 из-за допустимой погрешности по константе сглаживания
+    assert returns.decay == pytest.approx(0.8729738915250947)
+
+
+def test_asset_decays(returns):
+    decays = returns.asset_decays
+    assert decays[PORTFOLIO] == returns.decay
+    assert decays['AKRN'] == pytest.approx(0.928219, abs=1e-5)
+    # llh MTSS растет до самой границы сетки, поэтому внутреннего оптимума нет
+    assert np.isnan(decays['MTSS'])
+    x = returns.returns['GMKN'].values
+    listed = (x != 0).argmax()
+    start = listed + int((len(x) - listed) * returns_metrics.SAMPLE_DROP_OUT)
+    assert ewm.fit_decays(x[:, None], start, [0.94, 0.95, 0.96])[0] == pytest.approx(decays['GMKN'], abs=1e-5)
 
 
 def test_mean(returns):
@@ -77,3 +97,213 @@ def test_str(returns):
     assert 'BETA' in text
     assert 'DRAW_DOWN' in text
     assert 'GRADIENT' in text
+
+
+def test_incremental_update():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port)
+    port.remove_ticker('LSNGP')
+    port.set_lots('GMKN', 200)
+    expected = returns_metrics.ReturnsMetrics(port)
+    expected._decay = metrics.decay
+    pd.testing.assert_frame_equal(metrics.returns, expected.returns)
+    pd.testing.assert_series_equal(metrics.beta, expected.beta)
+    pd.testing.assert_series_equal(metrics.gradient, expected.gradient)
+    # История цен оставшихся позиций не обрезается, поэтому в начале есть месяцы до начала их торгов
+    positions.pop('LSNGP')
+    positions.update(GMKN=200)
+    fresh = returns_metrics.ReturnsMetrics(portfolio.Portfolio(date='2018-03-19', cash=1_415_988,
+                                                               positions=positions))
+    pd.testing.assert_frame_equal(metrics.returns.loc[fresh.returns.index], fresh.returns)
+    assert (metrics.returns.loc[:fresh.returns.index[0]].iloc[:-1] == 0).all().all()
+
+
+def _loop_monthly_dates(index, date):
+    """Исходный перебор дат с конца индекса"""
+    date_tuple = date.timetuple()[:3]
+    reversed_index = []
+    for day in reversed(index):
+        if date_tuple < day.timetuple()[:3]:
+            continue
+        reversed_index.append(day)
+        if date_tuple[1] != 1:
+            date_tuple = date_tuple[0], date_tuple[1] - 1, date_tuple[2]
+        else:
+            date_tuple = date_tuple[0] - 1, 12, date_tuple[2]
+    return pd.DatetimeIndex(list(reversed(reversed_index)))
+
+
+def test_monthly_positions(returns):
+    index = returns._portfolio.prices.index
+    for date in ['2018-03-19', '2018-03-31', '2017-12-31', '2016-02-29', '2018-01-01', '2010-05-15']:
+        date = pd.Timestamp(date)
+        assert index[returns_metrics.monthly_positions(index, date)].equals(_loop_monthly_dates(index, date))
+
+
+def test_monthly_positions_gaps():
+    index = pd.DatetimeIndex(['2017-01-10', '2017-01-30', '2017-02-28', '2017-05-31', '2017-06-02', '2017-07-01'])
+    for date in ['2017-07-31', '2017-06-30', '2017-06-01', '2017-01-31', '2016-12-31']:
+        date = pd.Timestamp(date)
+        assert index[returns_metrics.monthly_positions(index, date)].equals(_loop_monthly_dates(index, date))
+
+
+def test_monthly_dates_cache(returns):
+    dates = returns._monthly_dates()
+    assert returns._monthly_dates() is dates
+    assert dates[-1] == pd.Timestamp('2018-03-19')
+
+
+def test_moments_cache():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port)
+    ewm = metrics.returns.ewm(alpha=1 - metrics.decay)
+    pd.testing.assert_series_equal(metrics.mean, ewm.mean().iloc[-1])
+    pd.testing.assert_series_equal(metrics.std, ewm.std().iloc[-1])
+    beta = ewm.cov(metrics.returns[PORTFOLIO]).iloc[-1]
+    pd.testing.assert_series_equal(metrics.beta, beta / beta[PORTFOLIO])
+    moments = metrics._moments(metrics.decay)
+    port.set_cash(1_000_000)
+    assert metrics._moments(metrics.decay) is moments
+
+
+def test_persisted_moments(tmp_path, monkeypatch):
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    # Данные загружаются заранее, поэтому каталог данных можно заменить на временный
+    port = portfolio.Portfolio(date='2018-02-19', cash=1_415_988, positions=positions, data=prefetch(positions))
+    monkeypatch.setattr(settings, 'DATA_PATH', tmp_path)
+    previous = returns_metrics.ReturnsMetrics(port, 0.87, persist=True)
+    std = previous.std
+    assert len(list((tmp_path / returns_metrics.EWM_STATE_FOLDER).iterdir())) == 1
+    folded = []
+    monkeypatch.setattr(ewm.OnlineMoments, 'update', lambda self, x, update=ewm.OnlineMoments.update: (
+        folded.append(x), update(self, x)))
+    port.change_date('2018-03-19')
+    metrics = returns_metrics.ReturnsMetrics(port, 0.87, persist=True)
+    expected = metrics.returns.ewm(alpha=1 - 0.87).std().iloc[-1]
+    pd.testing.assert_series_equal(metrics.std, expected)
+    assert len(folded) == 1
+    assert not metrics.std.equals(std)
+
+
+def test_persisted_moments_bounded(tmp_path, monkeypatch):
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions, data=prefetch(positions))
+    monkeypatch.setattr(settings, 'DATA_PATH', tmp_path)
+    folder = tmp_path / returns_metrics.EWM_STATE_FOLDER
+    for decay in (0.87, 0.871, 0.87):
+        metrics = returns_metrics.ReturnsMetrics(port, decay, persist=True)
+        metrics.std
+        # Состояние для другой константы сглаживания заменяет предыдущее
+        assert len(list(folder.iterdir())) == 1
+    monkeypatch.setattr(returns_metrics, 'MAX_MOMENTS_FILES', 2)
+    for ticker in ('MSTT', 'LSNGP', 'MTSS'):
+        port.remove_ticker(ticker)
+        returns_metrics.ReturnsMetrics(port, 0.87, persist=True).std
+    assert len(list(folder.iterdir())) == 2
+    path = returns_metrics._moments_path(['AKRN', 'GMKN'])
+    assert path.exists()
+    with path.open('rb') as file:
+        assert pickle.load(file).decay == 0.87
+
+
+def test_llh_profile():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port)
+    profile = metrics.llh_profile()
+    assert len(profile) == returns_metrics.GRID_SIZE
+    assert profile.idxmax() == pytest.approx(0.87)
+    decay = metrics.decay
+    assert metrics.llh_profile([decay - 0.001, decay, decay + 0.001]).idxmax() == decay
+
+
+def test_newton_fit():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port)
+    _, gradient, curvature = metrics._llh_derivatives(metrics.decay)
+    assert gradient[0] == pytest.approx(0, abs=1e-6)
+    assert metrics.decay_std_error == pytest.approx(1 / curvature[0] ** 0.5)
+    assert 0 < metrics.decay_std_error < 0.1
+    decay = metrics.decay
+    metrics._decay = 0.86
+    metrics.fit()
+    assert metrics.decay == pytest.approx(decay, abs=1e-9)
+
+
+def test_what_if():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port, 0.87)
+    current = metrics.what_if(port.weight)
+    pd.testing.assert_series_equal(current['GRADIENT'], metrics.gradient, check_names=False)
+    pd.testing.assert_series_equal(current['DRAW_DOWN'], metrics.draw_down, check_names=False)
+    assert metrics.cov.shape == (5, 5)
+    cov = metrics.cov
+    port.set_lots('GMKN', 100)
+    changed = metrics.what_if(port.weight)
+    expected = returns_metrics.ReturnsMetrics(portfolio.Portfolio(date='2018-03-19', cash=1_415_988,
+                                                                  positions=dict(positions, GMKN=100)), 0.87)
+    pd.testing.assert_series_equal(changed['BETA'], expected.beta, check_names=False)
+    pd.testing.assert_series_equal(changed['GRADIENT'], expected.gradient, check_names=False)
+    pd.testing.assert_frame_equal(metrics.cov, cov)
+
+
+def test_history():
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions)
+    metrics = returns_metrics.ReturnsMetrics(port, 0.87)
+    history = metrics.history
+    assert history.index.equals(metrics.returns.index)
+    last = history.iloc[-1]
+    for name, values in zip(returns_metrics.METRICS, [metrics.mean, metrics.std, metrics.beta,
+                                                      metrics.draw_down, metrics.gradient]):
+        assert last[name].values == pytest.approx(values.values)
+    ewm = metrics.returns.ewm(alpha=1 - 0.87)
+    pd.testing.assert_frame_equal(history['STD'].iloc[1:], ewm.std().iloc[1:], check_names=False)
+    array = metrics.history_array()
+    assert array.shape == (5, len(history), 7)
+    assert array[4, -1] == pytest.approx(metrics.gradient.values)
+
+
+def test_decay_cache(tmp_path, monkeypatch):
+    positions = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+    port = portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=positions, data=prefetch(positions))
+    monkeypatch.setattr(settings, 'DATA_PATH', tmp_path)
+    decay = returns_metrics.ReturnsMetrics(port, persist=True).decay
+    assert (tmp_path / returns_metrics.EWM_STATE_FOLDER / returns_metrics.DECAY_CACHE_FILE).exists()
+    starts = []
+    fit = returns_metrics.ReturnsMetrics.fit
+
+    def logged_fit(self):
+        starts.append(self._decay)
+        fit(self)
+
+    monkeypatch.setattr(returns_metrics.ReturnsMetrics, 'fit', logged_fit)
+    port.set_lots('GMKN', 224)
+    assert returns_metrics.ReturnsMetrics(port, persist=True).decay == decay
+    assert starts == []
+    refitted = returns_metrics.ReturnsMetrics(port, persist=True, refit=True).decay
+    assert refitted == pytest.approx(decay, abs=1e-4)
+    assert starts == [None]
+    port.set_lots('LSNGP', 0)
+    metrics = returns_metrics.ReturnsMetrics(port, persist=True)
+    assert starts[1] == refitted
+    assert metrics.decay == pytest.approx(returns_metrics.ReturnsMetrics(port).decay, abs=1e-9)
+
+
+def test_concurrent_decay_saves(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'DATA_PATH', tmp_path)
+    weight = np.array([0.5, 0.5])
+    threads = [threading.Thread(target=returns_metrics._save_decay,
+                                args=(['AKRN', f'T{i}'], '2018-03', weight, i / 100))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decays = returns_metrics._read_decays()
+    assert sorted(record[3] for record in decays.values()) == [i / 100 for i in range(20)]
+    assert list((tmp_path / returns_metrics.EWM_STATE_FOLDER).glob('*.tmp')) == []
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import ewm, portfolio, returns_metrics, rolling_metrics
+from portfolio_optimizer.settings import PORTFOLIO
+
+POSITIONS = dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)
+
+
+@pytest.fixture(scope='module', name='port')
+def case_portfolio():
+    return portfolio.Portfolio(date='2018-03-19', cash=1_415_988, positions=POSITIONS)
+
+
+@pytest.fixture(scope='module', name='rolling')
+def case_rolling(port):
+    return rolling_metrics.RollingReturnsMetrics(port, 0.87)
+
+
+def test_offsets(rolling):
+    offsets = rolling.offsets
+    assert offsets[0] == pd.Timestamp('2018-03-19')
+    assert offsets[-1] == pd.Timestamp('2018-02-20')
+    assert rolling.asset_returns.shape[0] == len(offsets)
+    assert rolling.asset_returns.shape[2] == 5
+
+
+def test_first_offset_matches_returns_metrics(port, rolling):
+    single = returns_metrics.ReturnsMetrics(port, 0.87)
+    mean, std, beta = rolling.offset_metrics
+    assert mean[0] == pytest.approx(single.mean.values, rel=1e-6)
+    assert std[0] == pytest.approx(single.std.values, rel=1e-6)
+    assert beta[0] == pytest.approx(single.beta.values, rel=1e-6)
+
+
+def test_average_matches_separate_grids(port, rolling):
+    prices = port.prices
+    months = rolling.asset_returns.shape[1] + 1
+    weight = port.weight[port.index[:-2]]
+    expected = []
+    for date in rolling.offsets:
+        dates = prices.index[returns_metrics.monthly_positions(prices.index, date)][-months:]
+        returns = prices.loc[dates].pct_change().iloc[1:].fillna(0)
+        returns[PORTFOLIO] = returns.multiply(weight).sum(axis=1)
+        expected.append(returns.ewm(alpha=1 - 0.87).mean().iloc[-1][PORTFOLIO])
+    assert rolling.mean[PORTFOLIO] == pytest.approx(np.mean(expected))
+    assert rolling.beta[PORTFOLIO] == pytest.approx(1)
+
+
+def test_default_decay(port):
+    rolling = rolling_metrics.RollingReturnsMetrics(port)
+    assert rolling.decay == pytest.approx(returns_metrics.ReturnsMetrics(port).decay)
+    assert rolling.gradient.index.equals(port.index)
+
+
+def test_fit(port):
+    rolling = rolling_metrics.RollingReturnsMetrics(port)
+    decay = rolling.decay
+    # Суммарная по смещениям функция правдоподобия достигает максимума вне обычного интервала
+    with pytest.raises(ValueError):
+        rolling.fit()
+    assert rolling.decay == decay
+    rolling.fit((0.85, 0.9))
+    assert rolling.decay == pytest.approx(0.889, abs=1e-3)
+    _, gradient, _ = rolling._llh_derivatives(rolling.decay)
+    assert gradient[0] == pytest.approx(0, abs=1e-6)
+    profile = rolling._llh(np.array([rolling.decay - 0.001, rolling.decay, rolling.decay + 0.001]))
+    assert profile.argmin() == 1
+
+
+def test_last_moments():
+    x = np.random.RandomState(0).normal(size=(50, 2, 3))
+    mean, cov = ewm.last_moments(x, 0.9)
+    df = pd.DataFrame(x[:, 1])
+    expected = df.ewm(alpha=0.1)
+    assert mean[1] == pytest.approx(expected.mean().iloc[-1].values)
+    assert cov[1] == pytest.approx(expected.cov().loc[49].values)
@@ -0,0 +1,155 @@
+import json
+import threading
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from portfolio_optimizer import service
+from portfolio_optimizer.batch import POSITIONS, DECAY, TRADE, ERROR
+from portfolio_optimizer.prefetch import prefetch
+from portfolio_optimizer.settings import CASH, DATE, PORTFOLIO, VALUE
+
+REQUEST = {DATE: '2018-03-19', CASH: 1_415_988, POSITIONS: dict(MSTT=4650, LSNGP=162, MTSS=749, AKRN=795, GMKN=223)}
+
+
+@pytest.fixture(scope='module', name='market')
+def make_service():
+    return service.MarketService(['MSTT', 'LSNGP', 'MTSS', 'AKRN', 'GMKN'])
+
+
+def test_portfolio(market):
+    status, result = market.handle('/portfolio', REQUEST)
+    assert status == 200
+    assert result[VALUE] == pytest.approx(result[POSITIONS][PORTFOLIO][VALUE])
+
+
+def test_metrics_and_optimizer_share_decay(market, monkeypatch):
+    status, metrics = market.handle('/metrics', REQUEST)
+    assert status == 200
+    assert metrics[DECAY] == pytest.approx(0.8729738915250947)
+    assert metrics[service.RETURNS][PORTFOLIO]['BETA'] == pytest.approx(1.0)
+    assert metrics[service.DIVIDENDS][PORTFOLIO]['BETA'] == pytest.approx(1.0)
+
+    def fail_fit(self):
+        raise AssertionError('Константа сглаживания должна браться из памяти')
+
+    monkeypatch.setattr(service.ReturnsMetrics, 'fit', fail_fit)
+    status, result = market.handle('/optimizer', REQUEST)
+    assert status == 200
+    assert result[DECAY] == metrics[DECAY]
+    assert result[TRADE]['BUY'] == 'MTSS'
+
+
+def test_snapshot_shared_and_extended(market):
+    data = market.data
+    assert market.snapshot(['MSTT', 'GMKN']) is data
+    extended = market.snapshot(['MSTT', 'UPRO'])
+    assert extended is not data
+    assert 'UPRO' in extended.tickers
+    assert set(data.tickers) <= set(extended.tickers)
+
+
+def test_snapshot_loads_only_missing_tickers(monkeypatch):
+    market = service.MarketService(['MSTT'])
+    loaded = []
+
+    def logged_prefetch(tickers, max_workers):
+        loaded.append(list(tickers))
+        return prefetch(tickers, max_workers)
+
+    monkeypatch.setattr(service, 'prefetch', logged_prefetch)
+    data = market.snapshot(['MSTT', 'GMKN'])
+    assert loaded == [['GMKN']]
+    assert data.tickers == ['GMKN', 'MSTT']
+
+
+def test_snapshot_rejects_unknown_and_failed_tickers(market, monkeypatch):
+    loaded = []
+
+    def failed_prefetch(tickers, max_workers):
+        loaded.append(list(tickers))
+        raise ConnectionError('Сервер недоступен')
+
+    monkeypatch.setattr(service, 'prefetch', failed_prefetch)
+    status, result = market.handle('/portfolio', dict(REQUEST, **{POSITIONS: dict(MSTT=1, NOTEXIST=1)}))
+    assert status == 400
+    assert 'NOTEXIST' in result[ERROR]
+    assert loaded == []
+    data = market.data
+    for _ in range(2):
+        status, result = market.handle('/portfolio', dict(REQUEST, **{POSITIONS: dict(MSTT=1, PHOR=1)}))
+        assert status == 503
+        assert 'Сервер недоступен' in result[ERROR]
+    # Повторный запрос не загружает данные и сообщает о запомненной ошибке
+    assert 'PHOR' in result[ERROR]
+    assert loaded == [['PHOR']]
+    assert market.data is data
+
+
+def test_refresh_drops_unused_tickers(monkeypatch):
+    market = service.MarketService(['MSTT'])
+    monkeypatch.setattr(service.refresher, 'refresh', lambda tickers, max_workers: pd.DataFrame())
+    market.snapshot(['GMKN'])
+    market.refresh()
+    assert market.tickers == ['GMKN', 'MSTT']
+    market.refresh()
+    assert market.tickers == ['MSTT']
+
+
+def test_errors(market):
+    assert market.handle('/unknown', REQUEST)[0] == 404
+    status, result = market.handle('/portfolio', {DATE: '2018-03-19'})
+    assert status == 400
+    assert 'KeyError' in result[ERROR]
+
+
+def test_malformed_requests(market, monkeypatch):
+    status, result = market.handle('/portfolio', dict(REQUEST, **{POSITIONS: ['MSTT']}))
+    assert status == 400
+    assert 'TypeError' in result[ERROR]
+    status, result = market.handle('/metrics', dict(REQUEST, **{CASH: 'много'}))
+    assert status == 400
+    assert market.handle('/optimizer', ['MSTT'])[0] == 400
+
+    def broken_portfolio(request):
+        raise AttributeError('Ошибка')
+
+    monkeypatch.setattr(market, 'portfolio', broken_portfolio)
+    status, result = market.handle('/portfolio', REQUEST)
+    assert status == 500
+    assert 'AttributeError: Ошибка' in result[ERROR]
+
+
+def test_refresh_does_not_block_snapshot(monkeypatch):
+    market = service.MarketService(['MSTT'])
+
+    def slow_refresh(tickers, max_workers):
+        # Во время обновления снимок расширяется из другого потока
+        thread = threading.Thread(target=market.snapshot, args=(['GMKN'],))
+        thread.start()
+        thread.join(30)
+        assert not thread.is_alive()
+        return pd.DataFrame()
+
+    monkeypatch.setattr(service.refresher, 'refresh', slow_refresh)
+    market.refresh()
+    assert market.tickers == ['GMKN', 'MSTT']
+
+
+def test_server(market):
+    server = service.Server(market, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://{server.server_address[0]}:{server.server_address[1]}'
+    try:
+        request = urllib.request.Request(f'{url}/portfolio', data=json.dumps(REQUEST).encode(), method='POST')
+        with urllib.request.urlopen(request) as response:
+            result = json.loads(response.read().decode('utf-8'))
+        assert result[POSITIONS]['MSTT']['LOTS'] == 4650
+        with urllib.request.urlopen(f'{url}/status') as response:
+            status = json.loads(response.read().decode('utf-8'))
+        assert status[service.VERSION] == market.data.version
+    finally:
+        server.shutdown()
+        server.server_close()